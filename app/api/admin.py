@@ -4,7 +4,8 @@ from sqlalchemy import func
 from datetime import datetime, timedelta
 import uuid, json
 from app.db.session import get_db
-from app.core.auth import get_current_user, hash_password
+from app.core.auth import Principal, get_current_user, get_current_principal, hash_password, revoke_user_tokens
+from app.core.http_cache import cache_static
 from app.models.models import (User, UserProfile, OrgMember, Org, RoleName,
     OrgInvite, AuditLog, Project, Task, Crew, CrewMember)
 
@@ -179,6 +180,8 @@ def update_user(
             raise HTTPException(status_code=400, detail=f"Invalid role: {data['role']}")
 
     target_user.updated_at = datetime.utcnow()
+    if "is_active" in data or "role" in data or "email" in data or "full_name" in data:
+        revoke_user_tokens(db, user_id, "update_user", include_refresh=not target_user.is_active)
 
     db.add(AuditLog(
         user_id=user.id, action="update_user", entity_type="user",
@@ -386,6 +389,7 @@ def deactivate_user(
 
     target_user.is_active = False
     target_user.updated_at = datetime.utcnow()
+    revoke_user_tokens(db, user_id, "deactivate_user", include_refresh=True)
 
     db.add(AuditLog(
         user_id=user.id, action="deactivate_user", entity_type="user",
@@ -396,8 +400,8 @@ def deactivate_user(
     return {"ok": True, "message": f"User {target_user.email} has been deactivated"}
 
 
-@router.get("/roles")
-def list_roles(user: User = Depends(get_current_user)):
+@router.get("/roles", dependencies=[Depends(cache_static(ROLE_DESCRIPTIONS))])
+def list_roles(user: Principal = Depends(get_current_principal)):
     return [
         {"role": role, "description": desc}
         for role, desc in ROLE_DESCRIPTIONS.items()
@@ -428,6 +432,7 @@ def change_user_role(
         target_member.role = RoleName(data["role"])
     except ValueError:
         raise HTTPException(status_code=400, detail=f"Invalid role: {data['role']}")
+    revoke_user_tokens(db, user_id, "change_role")
 
     db.add(AuditLog(
         user_id=user.id, action="change_role", entity_type="user",
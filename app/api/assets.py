@@ -1,7 +1,7 @@
 import json
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import func, desc
 from app.db.session import get_db
 from app.core.auth import get_current_user
@@ -93,7 +93,15 @@ def list_assets(
     db: Session = Depends(get_db)
 ):
     org_id = _get_user_org(db, user)
-    q = db.query(Asset).filter(Asset.org_id == org_id)
+    q = db.query(Asset).options(
+        joinedload(Asset.category),
+        joinedload(Asset.assigned_user),
+        joinedload(Asset.assigned_crew),
+        joinedload(Asset.assigned_project),
+        selectinload(Asset.allocations),
+        selectinload(Asset.incidents),
+        selectinload(Asset.maintenance_records),
+    ).filter(Asset.org_id == org_id)
     if status:
         q = q.filter(Asset.status == status)
     if category_id:
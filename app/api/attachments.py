@@ -1,16 +1,18 @@
 import os
 import re
-import uuid
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from app.db.session import get_db
 from app.core.auth import get_current_user, require_project_access
 from app.models.models import Attachment, Task, FieldEntry, User, Project
 from app.schemas.schemas import AttachmentResponse
+from app.services import blob_store
+from app.services.thumbnails import generate_for_attachments, thumbnail_urls
+from app.services.upload_service import save_uploads
 
 router = APIRouter(prefix="/api", tags=["attachments"])
 
-UPLOAD_DIR = os.path.join("app", "static", "uploads")
 MAX_FILE_SIZE = 10 * 1024 * 1024
 ALLOWED_TYPES = {"image/jpeg", "image/png", "image/webp", "application/pdf"}
 
@@ -22,48 +24,63 @@ def secure_filename(filename: str) -> str:
     return filename or "file"
 
 
-def _save_file(task_id: str, upload: UploadFile, user: User, db: Session, field_entry_id: str = None) -> Attachment:
+def _check_type(upload: UploadFile):
     if upload.content_type not in ALLOWED_TYPES:
         raise HTTPException(status_code=400, detail=f"File type '{upload.content_type}' not allowed. Accepted: jpeg, png, webp, pdf")
 
-    content = upload.file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File size exceeds 10MB limit")
 
-    safe_name = secure_filename(upload.filename or "file")
-    unique_name = f"{uuid.uuid4().hex[:8]}_{safe_name}"
+async def _save_files(task_id: str, uploads: list[UploadFile], user: User, db: Session, background_tasks: BackgroundTasks, field_entry_id: str = None) -> list[AttachmentResponse]:
+    for upload in uploads:
+        _check_type(upload)
 
-    task_dir = os.path.join(UPLOAD_DIR, task_id)
-    os.makedirs(task_dir, exist_ok=True)
-
-    file_path = os.path.join(task_dir, unique_name)
-    with open(file_path, "wb") as f:
-        f.write(content)
-
-    relative_url = f"/static/uploads/{task_id}/{unique_name}"
-
-    attachment = Attachment(
-        task_id=task_id,
-        field_entry_id=field_entry_id,
-        filename=safe_name,
-        file_path=relative_url,
-        file_type=upload.content_type,
-        file_size=len(content),
-        uploaded_by=user.id,
+    stored = await save_uploads(
+        [(upload, blob_store.temp_path()) for upload in uploads],
+        MAX_FILE_SIZE, "File size exceeds 10MB limit",
     )
-    db.add(attachment)
-    db.commit()
-    db.refresh(attachment)
-    return attachment
+
+    def _record():
+        keys = {}
+        try:
+            # Hash order keeps concurrent requests from deadlocking on shared blob rows.
+            for i in sorted(range(len(stored)), key=lambda i: stored[i].sha256):
+                keys[i] = blob_store.claim(db, stored[i], uploads[i].content_type)
+        finally:
+            for i, saved in enumerate(stored):
+                if i not in keys and os.path.exists(saved.path):
+                    os.remove(saved.path)
+
+        attachments = [
+            Attachment(
+                task_id=task_id,
+                field_entry_id=field_entry_id,
+                filename=secure_filename(upload.filename or "file"),
+                file_path=blob_store.blob_ref(keys[i]),
+                file_type=upload.content_type,
+                file_size=saved.size,
+                content_hash=saved.sha256,
+                uploaded_by=user.id,
+            )
+            for i, (upload, saved) in enumerate(zip(uploads, stored))
+        ]
+        db.add_all(attachments)
+        db.flush()
+        results = [_attachment_response(a) for a in attachments]
+        db.commit()
+        return results
+
+    results = await run_in_threadpool(_record)
+    background_tasks.add_task(generate_for_attachments, [a.id for a in results])
+    return results
 
 
 def _attachment_response(a: Attachment) -> AttachmentResponse:
     return AttachmentResponse(
         id=a.id,
         filename=a.filename,
-        file_path=a.file_path,
+        file_path=blob_store.file_url(a.file_path),
         file_type=a.file_type,
         file_size=a.file_size,
+        thumbnails=thumbnail_urls(a),
         created_at=a.created_at,
     )
 
@@ -71,51 +88,50 @@ def _attachment_response(a: Attachment) -> AttachmentResponse:
 @router.post("/tasks/{task_id}/attachments", response_model=list[AttachmentResponse])
 async def upload_task_attachments(
     task_id: str,
+    background_tasks: BackgroundTasks,
     files: list[UploadFile] = File(...),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    task = db.query(Task).filter(Task.id == task_id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    project = db.query(Project).filter(Project.id == task.project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    require_project_access(user, project, db)
+    def _check_access():
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
 
-    results = []
-    for f in files:
-        att = _save_file(task_id, f, user, db)
-        results.append(_attachment_response(att))
-    return results
+        project = db.query(Project).filter(Project.id == task.project_id).first()
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        require_project_access(user, project, db)
+
+    await run_in_threadpool(_check_access)
+    return await _save_files(task_id, files, user, db, background_tasks)
 
 
 @router.post("/field-entries/{entry_id}/attachments", response_model=list[AttachmentResponse])
 async def upload_field_entry_attachments(
     entry_id: str,
+    background_tasks: BackgroundTasks,
     files: list[UploadFile] = File(...),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    entry = db.query(FieldEntry).filter(FieldEntry.id == entry_id).first()
-    if not entry:
-        raise HTTPException(status_code=404, detail="Field entry not found")
-    
-    task = db.query(Task).filter(Task.id == entry.task_id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    project = db.query(Project).filter(Project.id == task.project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    require_project_access(user, project, db)
+    def _check_access():
+        entry = db.query(FieldEntry).filter(FieldEntry.id == entry_id).first()
+        if not entry:
+            raise HTTPException(status_code=404, detail="Field entry not found")
 
-    results = []
-    for f in files:
-        att = _save_file(entry.task_id, f, user, db, field_entry_id=entry_id)
-        results.append(_attachment_response(att))
-    return results
+        task = db.query(Task).filter(Task.id == entry.task_id).first()
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+
+        project = db.query(Project).filter(Project.id == task.project_id).first()
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        require_project_access(user, project, db)
+        return entry.task_id
+
+    task_id = await run_in_threadpool(_check_access)
+    return await _save_files(task_id, files, user, db, background_tasks, field_entry_id=entry_id)
 
 
 @router.get("/tasks/{task_id}/attachments", response_model=list[AttachmentResponse])
@@ -173,6 +189,7 @@ def list_field_entry_attachments(
 @router.delete("/attachments/{attachment_id}")
 def delete_attachment(
     attachment_id: str,
+    background_tasks: BackgroundTasks,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -196,14 +213,17 @@ def delete_attachment(
         raise HTTPException(status_code=404, detail="Project not found")
     require_project_access(user, project, db)
 
-    full_path = os.path.join("app", "static", attachment.file_path.lstrip("/static/"))
-    if attachment.file_path.startswith("/static/uploads/"):
-        full_path = os.path.join("app", attachment.file_path.lstrip("/"))
-    try:
-        if os.path.exists(full_path):
-            os.remove(full_path)
-    except OSError:
-        pass
+    if blob_store.release(db, attachment.content_hash):
+        background_tasks.add_task(blob_store.collect_garbage_soon)
+    else:
+        full_path = os.path.join("app", "static", attachment.file_path.lstrip("/static/"))
+        if attachment.file_path.startswith("/static/uploads/"):
+            full_path = os.path.join("app", attachment.file_path.lstrip("/"))
+        try:
+            if os.path.exists(full_path):
+                os.remove(full_path)
+        except OSError:
+            pass
 
     db.delete(attachment)
     db.commit()
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.core.auth import hash_password, verify_password, create_access_token, get_current_user
+from app.core.auth import (
+    hash_password, hash_password_async, verify_password_async, password_needs_rehash,
+    issue_tokens, rotate_refresh_token, revoke_refresh_token, get_current_user,
+)
+from app.core.rate_limit import client_ip, login_throttle
 from app.models.models import User, OrgMember, Org
-from app.schemas.schemas import LoginRequest, TokenResponse, UserCreate, UserResponse, UserWithRole
+from app.schemas.schemas import LoginRequest, RefreshRequest, TokenResponse, UserCreate, UserResponse, UserWithRole
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -26,15 +31,37 @@ def register(data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(data: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == data.email).first()
-    if not user or not verify_password(data.password, user.hashed_password):
+async def login(data: LoginRequest, request: Request, db: Session = Depends(get_db)):
+    login_throttle.check(data.email, client_ip(request))
+
+    user = await run_in_threadpool(lambda: db.query(User).filter(User.email == data.email).first())
+    valid = await verify_password_async(data.password, user.hashed_password if user else None)
+    if not user or not valid:
+        login_throttle.record_failure(data.email)
         raise HTTPException(status_code=401, detail="Invalid credentials")
     if not user.is_active:
         raise HTTPException(status_code=401, detail="Account disabled")
+    login_throttle.record_success(data.email)
+
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password_async(data.password)
+
+    def _issue():
+        tokens = issue_tokens(user, db)
+        db.commit()
+        return tokens
+    return await run_in_threadpool(_issue)
+
+
+@router.post("/refresh", response_model=TokenResponse)
+def refresh(data: RefreshRequest, db: Session = Depends(get_db)):
+    return rotate_refresh_token(data.refresh_token, db)
+
 
-    token = create_access_token({"sub": user.id})
-    return {"access_token": token, "token_type": "bearer"}
+@router.post("/logout")
+def logout(data: RefreshRequest, db: Session = Depends(get_db)):
+    revoke_refresh_token(data.refresh_token, db)
+    return {"ok": True}
 
 
 @router.get("/me", response_model=UserWithRole)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.db.session import get_db
-from app.core.auth import get_current_user
+from app.core.auth import Principal, get_current_principal
 from app.models.models import Project, Task, TaskStatus, User
 from app.schemas.schemas import DashboardStats
 
@@ -10,7 +10,7 @@ router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
 
 
 @router.get("/stats", response_model=DashboardStats)
-def get_stats(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_stats(user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     org_ids = [m.org_id for m in user.memberships]
     projects = db.query(Project).filter(
         (Project.executing_org_id.in_(org_ids)) | (Project.owner_org_id.in_(org_ids))
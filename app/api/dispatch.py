@@ -1,39 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_
-from datetime import datetime, timedelta
-import uuid, json, asyncio
+from starlette.concurrency import run_in_threadpool
+from datetime import date, datetime, timedelta
+import uuid
 from app.db.session import get_db
-from app.core.auth import get_current_user
+from app.core.auth import Principal, get_current_principal
+from app.core.config import DISPATCH_WORKDAY
+from app.core.responses import FastJSONResponse
 from app.models.models import (User, Crew, CrewMember, DispatchJob, DispatchJobStatus,
     Project, Task, OrgMember)
+from app.services.dispatch_conflicts import check_booking, conflicts_in_range, describe, live_jobs
+from app.services.dispatch_scheduler import CrewSpec, Placement, Stop, job_spec, parse_skills, parse_workday, solve
+from app.services.dispatch_sockets import DispatchConnectionManager
+from app.services.dispatch_stats import StatsCache, compute_stats
+from app.services.route_optimizer import RouteStop, evaluate, optimize
+from app.services.travel import crew_start_points
 
 router = APIRouter(prefix="/api/dispatch", tags=["dispatch"])
 
 
-class DispatchConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                disconnected.append(connection)
-        for conn in disconnected:
-            self.disconnect(conn)
-
 manager = DispatchConnectionManager()
+stats_cache = StatsCache()
+manager.listeners.append(stats_cache.on_event)
 
 
 def serialize_job(job, db: Session) -> dict:
@@ -90,15 +79,55 @@ def serialize_job(job, db: Session) -> dict:
     }
 
 
-def _get_user_org(user: User, db: Session):
-    membership = db.query(OrgMember).filter(OrgMember.user_id == user.id).first()
-    if not membership:
+def _get_user_org(user: Principal, db: Session):
+    if not user.memberships:
         raise HTTPException(status_code=400, detail="User has no organization")
-    return membership.org_id
+    return user.memberships[0].org_id
+
+
+def _project_orgs(db: Session, project_ids) -> dict[str, set[str]]:
+    """The orgs whose boards show each project's jobs: its owner and its executing org."""
+    rows = db.query(Project.id, Project.owner_org_id, Project.executing_org_id).filter(
+        Project.id.in_({p for p in project_ids if p})).all()
+    return {project_id: {org_id for org_id in orgs if org_id} for project_id, *orgs in rows}
+
+
+async def _broadcast(db: Session, project_ids, message: dict, crew_ids=()):
+    """Publish a single-job event to every org that sees the job's project(s)."""
+    orgs_by_project = await run_in_threadpool(_project_orgs, db, project_ids)
+    project_id = next(iter(project_ids))
+    await manager.broadcast_many(db, [(org_id, message, project_id, crew_ids)
+                                      for org_id in sorted(set().union(*orgs_by_project.values()))])
+
+
+async def _broadcast_jobs(db: Session, jobs: list[dict], build):
+    """Publish a many-job event to each org that sees any of ``jobs``, with only the jobs it sees.
+
+    ``jobs`` are dicts with at least ``id`` and ``project_id``, taken before
+    the commit so nothing is reloaded here. ``build(visible_jobs)`` returns
+    the event and its crew ids.
+    """
+    orgs_by_project = await run_in_threadpool(_project_orgs, db, {j["project_id"] for j in jobs})
+    events = []
+    for org_id in sorted(set().union(*orgs_by_project.values())):
+        visible = [j for j in jobs if org_id in orgs_by_project.get(j["project_id"], ())]
+        project_ids = {j["project_id"] for j in visible}
+        message, crew_ids = build(visible)
+        events.append((org_id, message, project_ids.pop() if len(project_ids) == 1 else None, crew_ids))
+    await manager.broadcast_many(db, events)
+
+
+def _check_conflicts(db: Session, job: DispatchJob, data: dict):
+    """409 if the job's crew and times clash with the crew's other jobs, unless ``force`` is set."""
+    if not job.crew_id or data.get("force"):
+        return
+    conflicts = check_booking(db, job.crew_id, job.id, job.scheduled_start, job.scheduled_end)
+    if conflicts:
+        raise HTTPException(status_code=409, detail={"message": describe(conflicts), "conflicts": conflicts})
 
 
 @router.get("/crews")
-def list_crews(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_crews(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     org_id = _get_user_org(current_user, db)
     crews = db.query(Crew).options(
         joinedload(Crew.members).joinedload(CrewMember.user)
@@ -129,7 +158,7 @@ def list_crews(db: Session = Depends(get_db), current_user: User = Depends(get_c
 
 
 @router.post("/crews")
-def create_crew(data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_crew(data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     org_ids = [m.org_id for m in current_user.memberships]
     if not org_ids:
         raise HTTPException(status_code=400, detail="User has no organization")
@@ -160,7 +189,7 @@ def create_crew(data: dict, db: Session = Depends(get_db), current_user: User =
 
 
 @router.put("/crews/{crew_id}")
-def update_crew(crew_id: str, data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def update_crew(crew_id: str, data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     crew = db.query(Crew).filter(Crew.id == crew_id).first()
     if not crew:
         raise HTTPException(status_code=404, detail="Crew not found")
@@ -184,7 +213,7 @@ def update_crew(crew_id: str, data: dict, db: Session = Depends(get_db), current
 
 
 @router.delete("/crews/{crew_id}")
-def deactivate_crew(crew_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def deactivate_crew(crew_id: str, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     crew = db.query(Crew).filter(Crew.id == crew_id).first()
     if not crew:
         raise HTTPException(status_code=404, detail="Crew not found")
@@ -194,7 +223,7 @@ def deactivate_crew(crew_id: str, db: Session = Depends(get_db), current_user: U
 
 
 @router.post("/crews/{crew_id}/members")
-def add_crew_member(crew_id: str, data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def add_crew_member(crew_id: str, data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     crew = db.query(Crew).filter(Crew.id == crew_id).first()
     if not crew:
         raise HTTPException(status_code=404, detail="Crew not found")
@@ -223,7 +252,7 @@ def add_crew_member(crew_id: str, data: dict, db: Session = Depends(get_db), cur
 
 
 @router.delete("/crews/{crew_id}/members/{user_id}")
-def remove_crew_member(crew_id: str, user_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def remove_crew_member(crew_id: str, user_id: str, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     member = db.query(CrewMember).filter(
         CrewMember.crew_id == crew_id,
         CrewMember.user_id == user_id
@@ -243,7 +272,7 @@ def list_jobs(
     date_from: str = Query(None),
     date_to: str = Query(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     org_id = _get_user_org(current_user, db)
     org_project_ids = [p.id for p in db.query(Project.id).filter(
@@ -268,11 +297,12 @@ def list_jobs(
         query = query.filter(DispatchJob.scheduled_end <= datetime.fromisoformat(date_to))
 
     jobs = query.order_by(DispatchJob.scheduled_start.asc().nullslast()).all()
-    return [serialize_job(j, db) for j in jobs]
+    return FastJSONResponse([serialize_job(j, db) for j in jobs])
 
 
 @router.post("/jobs")
-async def create_job(data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_job(data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    _get_user_org(current_user, db)  # members only; events go to the job's project orgs
     project = db.query(Project).filter(Project.id == data.get("project_id")).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -304,6 +334,7 @@ async def create_job(data: dict, db: Session = Depends(get_db), current_user: Us
         created_by=current_user.id,
         assigned_at=assigned_at,
     )
+    _check_conflicts(db, job, data)
     db.add(job)
     db.commit()
     db.refresh(job)
@@ -315,17 +346,18 @@ async def create_job(data: dict, db: Session = Depends(get_db), current_user: Us
     ).filter(DispatchJob.id == job.id).first()
 
     job_data = serialize_job(job, db)
-    await manager.broadcast({"type": "job_created", "job": job_data})
+    await _broadcast(db, [job.project_id], {"type": "job_created", "job": job_data}, crew_ids=[job.crew_id])
     return job_data
 
 
 @router.put("/jobs/{job_id}")
-async def update_job(job_id: str, data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def update_job(job_id: str, data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    _get_user_org(current_user, db)
     job = db.query(DispatchJob).filter(DispatchJob.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    old_crew_id = job.crew_id
+    old_crew_id, old_project_id = job.crew_id, job.project_id
 
     for field in ["title", "description", "priority", "job_type", "estimated_duration_hrs",
                    "location_address", "location_lat", "location_lng", "notes", "color",
@@ -342,6 +374,8 @@ async def update_job(job_id: str, data: dict, db: Session = Depends(get_db), cur
         job.assigned_at = datetime.utcnow()
         job.status = DispatchJobStatus.SCHEDULED
 
+    if {"crew_id", "scheduled_start", "scheduled_end"} & data.keys():
+        _check_conflicts(db, job, data)
     db.commit()
     db.refresh(job)
 
@@ -352,23 +386,28 @@ async def update_job(job_id: str, data: dict, db: Session = Depends(get_db), cur
     ).filter(DispatchJob.id == job.id).first()
 
     job_data = serialize_job(job, db)
-    await manager.broadcast({"type": "job_updated", "job": job_data})
+    # A job moved to another project leaves the old project's boards too.
+    await _broadcast(db, list(dict.fromkeys([job.project_id, old_project_id])),
+                     {"type": "job_updated", "job": job_data}, crew_ids=[job.crew_id, old_crew_id])
     return job_data
 
 
 @router.delete("/jobs/{job_id}")
-async def delete_job(job_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def delete_job(job_id: str, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    _get_user_org(current_user, db)
     job = db.query(DispatchJob).filter(DispatchJob.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
+    project_id, crew_id = job.project_id, job.crew_id
     db.delete(job)
     db.commit()
-    await manager.broadcast({"type": "job_deleted", "job_id": job_id})
+    await _broadcast(db, [project_id], {"type": "job_deleted", "job_id": job_id}, crew_ids=[crew_id])
     return {"message": "Job deleted"}
 
 
 @router.put("/jobs/{job_id}/status")
-async def update_job_status(job_id: str, data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def update_job_status(job_id: str, data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    _get_user_org(current_user, db)
     job = db.query(DispatchJob).filter(DispatchJob.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -387,17 +426,18 @@ async def update_job_status(job_id: str, data: dict, db: Session = Depends(get_d
     db.commit()
     db.refresh(job)
 
-    await manager.broadcast({
+    await _broadcast(db, [job.project_id], {
         "type": "job_status_changed",
         "job_id": job.id,
         "status": job.status.value,
         "updated_at": job.updated_at.isoformat() if job.updated_at else None,
-    })
+    }, crew_ids=[job.crew_id])
     return {"id": job.id, "status": job.status.value}
 
 
 @router.put("/jobs/{job_id}/assign")
-async def assign_job(job_id: str, data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def assign_job(job_id: str, data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    _get_user_org(current_user, db)
     job = db.query(DispatchJob).filter(DispatchJob.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -406,6 +446,7 @@ async def assign_job(job_id: str, data: dict, db: Session = Depends(get_db), cur
     if not crew_id:
         raise HTTPException(status_code=400, detail="crew_id is required")
 
+    old_crew_id = job.crew_id
     job.crew_id = crew_id
     job.assigned_at = datetime.utcnow()
     if data.get("scheduled_start"):
@@ -416,25 +457,28 @@ async def assign_job(job_id: str, data: dict, db: Session = Depends(get_db), cur
     if job.status == DispatchJobStatus.UNASSIGNED:
         job.status = DispatchJobStatus.SCHEDULED
 
+    _check_conflicts(db, job, data)
     db.commit()
     db.refresh(job)
 
-    await manager.broadcast({
+    await _broadcast(db, [job.project_id], {
         "type": "job_assigned",
         "job_id": job.id,
         "crew_id": job.crew_id,
         "scheduled_start": job.scheduled_start.isoformat() if job.scheduled_start else None,
         "scheduled_end": job.scheduled_end.isoformat() if job.scheduled_end else None,
-    })
+    }, crew_ids=[job.crew_id, old_crew_id])
     return serialize_job(job, db)
 
 
 @router.put("/jobs/{job_id}/reschedule")
-async def reschedule_job(job_id: str, data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def reschedule_job(job_id: str, data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    _get_user_org(current_user, db)
     job = db.query(DispatchJob).filter(DispatchJob.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
+    old_crew_id = job.crew_id
     if data.get("scheduled_start"):
         job.scheduled_start = datetime.fromisoformat(data["scheduled_start"])
     if data.get("scheduled_end"):
@@ -442,27 +486,439 @@ async def reschedule_job(job_id: str, data: dict, db: Session = Depends(get_db),
     if data.get("crew_id"):
         job.crew_id = data["crew_id"]
 
+    _check_conflicts(db, job, data)
     db.commit()
     db.refresh(job)
 
-    await manager.broadcast({
+    await _broadcast(db, [job.project_id], {
         "type": "job_rescheduled",
         "job_id": job.id,
         "crew_id": job.crew_id,
         "scheduled_start": job.scheduled_start.isoformat() if job.scheduled_start else None,
         "scheduled_end": job.scheduled_end.isoformat() if job.scheduled_end else None,
-    })
+    }, crew_ids=[job.crew_id, old_crew_id])
     return serialize_job(job, db)
 
 
+BULK_MAX_OPERATIONS = 500
+
+
+def _compact_job(job: DispatchJob) -> dict:
+    return {
+        "id": job.id,
+        "project_id": job.project_id,
+        "crew_id": job.crew_id,
+        "status": job.status.value if job.status else None,
+        "scheduled_start": job.scheduled_start.isoformat() if job.scheduled_start else None,
+        "scheduled_end": job.scheduled_end.isoformat() if job.scheduled_end else None,
+    }
+
+
+@router.post("/jobs/bulk")
+async def bulk_update_jobs(data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """Apply many assignments, reschedules and status changes in one transaction.
+
+    Each operation names a ``job_id`` and any of ``crew_id`` (null
+    unassigns), ``scheduled_start``, ``scheduled_end`` and ``status``.
+    Either every operation is saved or none is. Conflicts fail the whole
+    batch with 409 unless ``force`` is set. One ``jobs_updated`` event
+    carries the new state of every job.
+    """
+    org_id = _get_user_org(current_user, db)
+    operations = data.get("operations") or []
+    if not isinstance(operations, list) or not all(isinstance(op, dict) and op.get("job_id") for op in operations):
+        raise HTTPException(status_code=400, detail="operations must be a list of objects with a job_id")
+    if len(operations) > BULK_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_OPERATIONS} operations per request")
+    if not operations:
+        return {"updated": 0, "jobs": []}
+
+    # The row locks may wait on another transaction; that wait must not hold up the event loop.
+    results, old_crews = await run_in_threadpool(_apply_bulk, db, org_id, operations, bool(data.get("force")))
+    await _broadcast_jobs(db, results, lambda visible: (
+        {"type": "jobs_updated", "jobs": visible},
+        [*(j["crew_id"] for j in visible), *(old_crews[j["id"]] for j in visible)],
+    ))
+    return {"updated": len(results), "jobs": results}
+
+
+def _apply_bulk(db: Session, org_id: str, operations: list[dict], force: bool) -> tuple[list[dict], dict]:
+    """Lock, change, check and commit the jobs; returns their compact state and previous crews."""
+    job_ids = list(dict.fromkeys(op["job_id"] for op in operations))
+    org_projects = db.query(Project.id).filter(
+        (Project.owner_org_id == org_id) | (Project.executing_org_id == org_id)
+    )
+    jobs = {j.id: j for j in db.query(DispatchJob).filter(
+        DispatchJob.id.in_(job_ids), DispatchJob.project_id.in_(org_projects),
+    ).order_by(DispatchJob.id).with_for_update()}
+    missing = [job_id for job_id in job_ids if job_id not in jobs]
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Jobs not found", "job_ids": missing})
+
+    old_crews = {job_id: job.crew_id for job_id, job in jobs.items()}
+    new_crews = {op["crew_id"] for op in operations if op.get("crew_id")}
+    # Locked like single bookings, so a bulk move and a one-off assignment can't interleave.
+    crews = dict(db.query(Crew.id, Crew.max_jobs_per_day).filter(
+        Crew.id.in_(new_crews | {c for c in old_crews.values() if c}), Crew.org_id == org_id,
+    ).order_by(Crew.id).with_for_update().all())
+    unknown = sorted(new_crews - crews.keys())
+    if unknown:
+        raise HTTPException(status_code=404, detail={"message": "Crews not found", "crew_ids": unknown})
+
+    now = datetime.utcnow()
+    try:
+        for op in operations:
+            job = jobs[op["job_id"]]
+            if "crew_id" in op:
+                if job.crew_id is None and op["crew_id"]:
+                    job.assigned_at = now
+                    if job.status == DispatchJobStatus.UNASSIGNED:
+                        job.status = DispatchJobStatus.SCHEDULED
+                elif not op["crew_id"] and job.status == DispatchJobStatus.SCHEDULED:
+                    job.status = DispatchJobStatus.UNASSIGNED
+                job.crew_id = op["crew_id"] or None
+            for field in ("scheduled_start", "scheduled_end"):
+                if field in op:
+                    setattr(job, field, datetime.fromisoformat(op[field]) if op[field] else None)
+            if op.get("status"):
+                job.status = DispatchJobStatus(op["status"])
+                if job.status == DispatchJobStatus.COMPLETED:
+                    job.completed_at = now
+                if job.status == DispatchJobStatus.IN_PROGRESS:
+                    job.actual_start = now
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid operation: {e}")
+
+    if not force:
+        touched = [j for j in jobs.values() if j.crew_id and j.scheduled_start]
+        if touched:
+            db.flush()
+            first = min(j.scheduled_start for j in touched).replace(hour=0, minute=0, second=0, microsecond=0)
+            last = max(j.scheduled_end or j.scheduled_start for j in touched)
+            conflicts = [c for c in conflicts_in_range(db, org_id, first, last + timedelta(days=1),
+                                                       list({j.crew_id for j in touched}))
+                         if c["type"] == "overlap" and not jobs.keys().isdisjoint(c["job_ids"])]
+            if conflicts:
+                raise HTTPException(status_code=409, detail={"message": describe(conflicts), "conflicts": conflicts})
+
+    results = [_compact_job(jobs[job_id]) for job_id in job_ids]
+    db.commit()
+    return results, old_crews
+
+
+@router.post("/auto-schedule")
+async def auto_schedule(data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """Fit unassigned jobs onto crews' free time (see ``dispatch_scheduler``).
+
+    A preview by default; with ``"commit": true`` the assignments are saved
+    and announced in a single ``jobs_scheduled`` event.
+    """
+    org_id = _get_user_org(current_user, db)
+    try:
+        first_day = date.fromisoformat(data["date_from"]) if data.get("date_from") else datetime.utcnow().date()
+        last_day = date.fromisoformat(data["date_to"]) if data.get("date_to") else first_day
+        workday = parse_workday(data.get("workday") or DISPATCH_WORKDAY)
+        budget_ms = min(max(int(data.get("time_budget_ms") or 2000), 50), 10000)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid date_from, date_to, workday or time_budget_ms")
+    if last_day < first_day or (last_day - first_day).days > 31:
+        raise HTTPException(status_code=400, detail="date_to must be within 31 days after date_from")
+    days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    range_start = datetime.combine(first_day, workday[0])
+    range_end = datetime.combine(last_day, workday[1])
+    commit = bool(data.get("commit"))
+
+    org_projects = db.query(Project.id).filter(
+        (Project.owner_org_id == org_id) | (Project.executing_org_id == org_id)
+    )
+    jobs_query = db.query(DispatchJob).filter(
+        DispatchJob.project_id.in_(org_projects),
+        DispatchJob.crew_id.is_(None),
+        DispatchJob.status == DispatchJobStatus.UNASSIGNED,
+    )
+    if data.get("job_ids"):
+        jobs_query = jobs_query.filter(DispatchJob.id.in_(data["job_ids"]))
+    jobs = jobs_query.all()
+
+    crews_query = db.query(Crew).filter(Crew.is_active == True, Crew.org_id == org_id)
+    if data.get("crew_ids"):
+        crews_query = crews_query.filter(Crew.id.in_(data["crew_ids"]))
+    crews = crews_query.all()
+    crew_ids = [c.id for c in crews]
+
+    busy: dict[str, list[Stop]] = {}
+    # Counted as the conflict checks count them, so _commit_schedule keeps what the preview placed.
+    booked = live_jobs(db.query(DispatchJob)).filter(
+        DispatchJob.crew_id.in_(crew_ids),
+        DispatchJob.scheduled_start.isnot(None),
+        DispatchJob.scheduled_start < range_end,
+        DispatchJob.scheduled_start >= range_start - timedelta(days=1),
+    ).all() if crew_ids else []
+    for b in booked:
+        spec = job_spec(b)
+        end = b.scheduled_end or b.scheduled_start + timedelta(minutes=spec.duration_min)
+        busy.setdefault(b.crew_id, []).append(Stop(b.id, b.scheduled_start, end, spec.location, fixed=True))
+
+    origins = crew_start_points(db, crew_ids)
+    crew_specs = [CrewSpec(c.id, parse_skills(c.skills), c.max_jobs_per_day, origins.get(c.id), busy.get(c.id, []))
+                  for c in crews]
+    schedule = await run_in_threadpool(solve, [job_spec(j) for j in jobs], crew_specs, days, workday,
+                                       budget_ms / 1000)
+
+    placements = schedule.placements
+    if commit and placements:
+        # Nothing is locked while solving; the commit re-checks against what changed meanwhile.
+        placements, dropped, scheduled = await run_in_threadpool(_commit_schedule, db, org_id, placements)
+        schedule.unassigned.update(dropped)
+        await _broadcast_jobs(db, scheduled, lambda visible: (
+            {"type": "jobs_scheduled", "job_ids": [j["id"] for j in visible]}, [j["crew_id"] for j in visible]))
+
+    return {
+        "mode": "commit" if commit else "preview",
+        "assignments": [{
+            "job_id": p.job_id,
+            "crew_id": p.crew_id,
+            "scheduled_start": p.start.isoformat(),
+            "scheduled_end": p.end.isoformat(),
+            "travel_minutes": p.travel_minutes,
+        } for p in placements],
+        "unassigned": [{"job_id": job_id, "reason": reason} for job_id, reason in schedule.unassigned.items()],
+        "total_travel_minutes": schedule.travel_minutes,
+        "elapsed_ms": schedule.elapsed_ms,
+    }
+
+
+def _commit_schedule(db: Session, org_id: str, placements: list[Placement]):
+    """Save the placements that still hold; returns them, the dropped ones' reasons, and the event's jobs.
+
+    The crews are locked, as for single bookings, so nothing else can book
+    them until the commit. A job that was assigned or changed while the plan
+    was being solved is dropped. So is a placement that now conflicts with
+    the crew's other jobs.
+    """
+    db.rollback()  # start from current data, not the snapshot the plan was solved on
+    crew_ids = sorted({p.crew_id for p in placements})
+    db.query(Crew.id).filter(Crew.id.in_(crew_ids)).order_by(Crew.id).with_for_update().all()
+    jobs = {j.id: j for j in db.query(DispatchJob).filter(
+        DispatchJob.id.in_([p.job_id for p in placements]),
+        DispatchJob.crew_id.is_(None),
+        DispatchJob.status == DispatchJobStatus.UNASSIGNED,
+    ).order_by(DispatchJob.id).with_for_update(skip_locked=True)}
+    dropped = {p.job_id: "Changed by someone else while planning" for p in placements if p.job_id not in jobs}
+    placements = [p for p in placements if p.job_id in jobs]
+    if not placements:
+        db.rollback()
+        return [], dropped, []
+
+    # Unassigned jobs may carry a requested window; a dropped placement puts it back.
+    windows = {job_id: (job.scheduled_start, job.scheduled_end) for job_id, job in jobs.items()}
+    now = datetime.utcnow()
+    for p in placements:
+        job = jobs[p.job_id]
+        job.crew_id, job.scheduled_start, job.scheduled_end = p.crew_id, p.start, p.end
+        job.assigned_at = now
+        job.status = DispatchJobStatus.SCHEDULED
+    db.flush()
+    first = min(p.start for p in placements).replace(hour=0, minute=0, second=0, microsecond=0)
+    last = max(p.end for p in placements)
+    placed = {p.job_id for p in placements}
+    clashing = {job_id for c in conflicts_in_range(db, org_id, first, last + timedelta(days=1), crew_ids)
+                for job_id in c["job_ids"] if job_id in placed}
+    for job_id in clashing:
+        job = jobs[job_id]
+        job.crew_id = job.assigned_at = None
+        job.scheduled_start, job.scheduled_end = windows[job_id]
+        job.status = DispatchJobStatus.UNASSIGNED
+        dropped[job_id] = "Conflicts with a booking made while planning"
+    placements = [p for p in placements if p.job_id not in clashing]
+    scheduled = [{"id": p.job_id, "project_id": jobs[p.job_id].project_id, "crew_id": p.crew_id} for p in placements]
+    db.commit()
+    return placements, dropped, scheduled
+
+
+@router.post("/crews/{crew_id}/route")
+async def optimize_crew_route(crew_id: str, data: dict, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """Best visiting order for a crew's scheduled jobs on one day (see ``route_optimizer``).
+
+    Jobs already underway stay first. With ``"apply": true`` the new times
+    are saved and announced in a single ``jobs_scheduled`` event; applying
+    is refused while any of the day's jobs has no location.
+    """
+    org_id = _get_user_org(current_user, db)
+    crew = db.query(Crew).filter(Crew.id == crew_id, Crew.org_id == org_id).first()
+    if not crew:
+        raise HTTPException(status_code=404, detail="Crew not found")
+    try:
+        day = date.fromisoformat(data["date"]) if data.get("date") else datetime.utcnow().date()
+        workday = parse_workday(data.get("workday") or DISPATCH_WORKDAY)
+        windows = {job_id: (datetime.fromisoformat(w["earliest"]) if w.get("earliest") else None,
+                            datetime.fromisoformat(w["latest"]) if w.get("latest") else None)
+                   for job_id, w in (data.get("time_windows") or {}).items()}
+    except (AttributeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid date, workday or time_windows")
+    day_start = datetime.combine(day, workday[0])
+    day_end = datetime.combine(day, workday[1])
+
+    jobs = db.query(DispatchJob).filter(
+        DispatchJob.crew_id == crew_id,
+        DispatchJob.scheduled_start >= datetime.combine(day, datetime.min.time()),
+        DispatchJob.scheduled_start < datetime.combine(day + timedelta(days=1), datetime.min.time()),
+        DispatchJob.status.notin_([DispatchJobStatus.CANCELLED, DispatchJobStatus.COMPLETED]),
+    ).order_by(DispatchJob.scheduled_start).all()
+    underway = [j for j in jobs if j.status != DispatchJobStatus.SCHEDULED]
+    movable = [j for j in jobs if j.status == DispatchJobStatus.SCHEDULED and j.location_lat is not None
+               and j.location_lng is not None]
+    unlocated = [j for j in jobs if j.status == DispatchJobStatus.SCHEDULED and j not in movable]
+    if data.get("apply") and unlocated:
+        # They would keep their times while the rest is packed around them.
+        raise HTTPException(status_code=409, detail={
+            "message": "Some jobs have no location; give them coordinates or move them before applying a route",
+            "job_ids": [j.id for j in unlocated],
+        })
+
+    if underway:
+        last = underway[-1]
+        origin = (last.location_lat, last.location_lng) if last.location_lat is not None else None
+        begin = max(last.scheduled_end or last.scheduled_start, day_start)
+    else:
+        origin = crew_start_points(db, [crew_id]).get(crew_id)
+        begin = min([day_start, *(j.scheduled_start for j in movable)])
+
+    def stop(job):
+        earliest, latest = windows.get(job.id, (None, day_end))
+        minutes = ((job.scheduled_end - job.scheduled_start).total_seconds() / 60 if job.scheduled_end
+                   else job_spec(job).duration_min)
+        return RouteStop(job.id, (job.location_lat, job.location_lng), minutes, earliest, latest or day_end)
+
+    stops = [stop(j) for j in movable]
+    underway_ids, unlocated_ids = [j.id for j in underway], [j.id for j in unlocated]
+    planned_from = {j.id: j.scheduled_start for j in movable}
+    before = evaluate(origin, stops, begin)
+    route = await run_in_threadpool(optimize, origin, stops, begin)
+
+    applied = False
+    if data.get("apply") and route.visits:
+        moved = await run_in_threadpool(_apply_route, db, org_id, crew_id, day, route.visits, planned_from,
+                                        bool(data.get("force")))
+        applied = True
+        await _broadcast_jobs(db, moved, lambda visible: (
+            {"type": "jobs_scheduled", "job_ids": [j["id"] for j in visible]}, [crew_id]))
+
+    return {
+        "crew_id": crew_id,
+        "date": day.isoformat(),
+        "start": {"lat": origin[0], "lng": origin[1]} if origin else None,
+        "underway_job_ids": underway_ids,
+        "stops": [{
+            "job_id": v.stop.id,
+            "order": i + 1,
+            "travel_minutes": v.travel_minutes,
+            "arrival": v.arrival.isoformat(),
+            "scheduled_start": v.start.isoformat(),
+            "scheduled_end": v.end.isoformat(),
+        } for i, v in enumerate(route.visits)],
+        "unlocated_job_ids": unlocated_ids,
+        "total_travel_minutes": route.travel_minutes,
+        "current_travel_minutes": before.travel_minutes,
+        "late_minutes": route.late_minutes,
+        "applied": applied,
+    }
+
+
+def _apply_route(db: Session, org_id: str, crew_id: str, day: date, visits, planned_from: dict,
+                 force: bool) -> list[dict]:
+    """Save a route's times under the crew lock; returns the moved jobs for the event.
+
+    409 if a job changed while the route was being optimized, or, unless
+    ``force`` is set, if the new times clash with the crew's other jobs.
+    """
+    db.rollback()  # re-read the jobs as they are now
+    db.query(Crew.id).filter(Crew.id == crew_id).with_for_update().first()
+    jobs = {j.id: j for j in db.query(DispatchJob).filter(
+        DispatchJob.id.in_([v.stop.id for v in visits])
+    ).order_by(DispatchJob.id).with_for_update()}
+    stale = [job_id for job_id, start in planned_from.items()
+             if job_id not in jobs or jobs[job_id].crew_id != crew_id
+             or jobs[job_id].status != DispatchJobStatus.SCHEDULED or jobs[job_id].scheduled_start != start]
+    if stale:
+        raise HTTPException(status_code=409, detail={"message": "Jobs changed while the route was being optimized",
+                                                     "job_ids": stale})
+    for visit in visits:
+        jobs[visit.stop.id].scheduled_start, jobs[visit.stop.id].scheduled_end = visit.start, visit.end
+    if not force:
+        db.flush()
+        midnight = datetime.combine(day, datetime.min.time())
+        conflicts = [c for c in conflicts_in_range(db, org_id, midnight, midnight + timedelta(days=1), [crew_id])
+                     if c["type"] == "overlap" and not jobs.keys().isdisjoint(c["job_ids"])]
+        if conflicts:
+            raise HTTPException(status_code=409, detail={"message": describe(conflicts), "conflicts": conflicts})
+    moved = [{"id": v.stop.id, "project_id": jobs[v.stop.id].project_id} for v in visits]
+    db.commit()
+    return moved
+
+
+@router.get("/conflicts")
+def list_conflicts(
+    date_from: str = Query(...),
+    date_to: str = Query(...),
+    crew_id: list[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Every double booking and over-full crew day among the org's crews in the range."""
+    org_id = _get_user_org(current_user, db)
+    conflicts = conflicts_in_range(db, org_id, datetime.fromisoformat(date_from), datetime.fromisoformat(date_to),
+                                   crew_id)
+    return {"count": len(conflicts), "conflicts": conflicts}
+
+
+TIMELINE_STATUSES = [s.value for s in DispatchJobStatus]
+_STATUS_CODES = {s: i for i, s in enumerate(DispatchJobStatus)}
+
+
+def _minutes(dt: datetime | None, origin: datetime) -> int | None:
+    return None if dt is None else round((dt - origin).total_seconds() / 60)
+
+
+def _columnar_jobs(rows, origin: datetime, crew_index: dict[str, int] | None = None) -> dict:
+    """Jobs as parallel arrays; times are minutes from ``origin``, statuses index ``statuses``."""
+    columns = {"id": [], "title": [], "status": [], "priority": [], "job_type": [], "color": [],
+               "project_id": [], "start": [], "end": []}
+    if crew_index is not None:
+        columns["crew"] = []
+    for row in rows:
+        columns["id"].append(row.id)
+        columns["title"].append(row.title)
+        columns["status"].append(_STATUS_CODES.get(row.status))
+        columns["priority"].append(row.priority)
+        columns["job_type"].append(row.job_type)
+        columns["color"].append(row.color)
+        columns["project_id"].append(row.project_id)
+        columns["start"].append(_minutes(row.scheduled_start, origin))
+        columns["end"].append(_minutes(row.scheduled_end, origin))
+        if crew_index is not None:
+            columns["crew"].append(crew_index[row.crew_id])
+    return columns
+
+
 @router.get("/timeline")
 def get_timeline(
     date_from: str = Query(None),
     date_to: str = Query(None),
     project_id: str = Query(None),
+    crew_offset: int = Query(0, ge=0),
+    crew_limit: int = Query(50, ge=1, le=200),
+    unassigned_limit: int = Query(200, ge=0, le=1000),
+    format: str = Query("json", pattern="^(json|columnar)$"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
+    """One viewport of the board: a page of the org's crews, their jobs in the window, and unassigned jobs.
+
+    ``format=columnar`` returns each list as parallel arrays, with job
+    times in minutes from ``origin`` (``date_from``) and each job's crew as
+    an index into ``crews``.
+    """
     if date_from:
         start_date = datetime.fromisoformat(date_from)
     else:
@@ -476,9 +932,58 @@ def get_timeline(
         end_date = start_date + timedelta(days=7)
 
     org_id = _get_user_org(current_user, db)
-    crews = db.query(Crew).options(
-        joinedload(Crew.members).joinedload(CrewMember.user)
-    ).filter(Crew.is_active == True, Crew.org_id == org_id).all()
+    columnar = format == "columnar"
+    crew_total = func.count().over().label("crew_total")
+    crews_query = db.query(Crew, crew_total).filter(Crew.is_active == True, Crew.org_id == org_id)
+    if columnar:
+        member_count = db.query(func.count(CrewMember.id)).filter(
+            CrewMember.crew_id == Crew.id).correlate(Crew).scalar_subquery()
+        crews_query = crews_query.add_columns(member_count)
+    else:
+        crews_query = crews_query.options(joinedload(Crew.members).joinedload(CrewMember.user))
+    crew_rows = crews_query.order_by(Crew.name, Crew.id).offset(crew_offset).limit(crew_limit).all()
+    crews = [row[0] for row in crew_rows]
+    total = crew_rows[0][1] if crew_rows else 0
+    crew_ids = [c.id for c in crews]
+
+    # Served by idx_dispatch_crew_window: per crew, a range scan from the window start
+    # over scheduled_end, with scheduled_start checked in the index.
+    window = [
+        DispatchJob.crew_id.in_(crew_ids),
+        DispatchJob.scheduled_end > start_date,
+        DispatchJob.scheduled_start < end_date,
+    ]
+    unassigned_filter = [
+        DispatchJob.crew_id.is_(None),
+        DispatchJob.project_id.in_(db.query(Project.id).filter(
+            (Project.owner_org_id == org_id) | (Project.executing_org_id == org_id))),
+    ]
+    if project_id:
+        window.append(DispatchJob.project_id == project_id)
+        unassigned_filter.append(DispatchJob.project_id == project_id)
+
+    if columnar:
+        fields = (DispatchJob.id, DispatchJob.crew_id, DispatchJob.title, DispatchJob.status, DispatchJob.priority,
+                  DispatchJob.job_type, DispatchJob.color, DispatchJob.project_id,
+                  DispatchJob.scheduled_start, DispatchJob.scheduled_end)
+        jobs = db.query(*fields).filter(*window).order_by(DispatchJob.crew_id, DispatchJob.scheduled_start).all() \
+            if crew_ids else []
+        unassigned = db.query(*fields).filter(*unassigned_filter).order_by(
+            DispatchJob.created_at.desc()).limit(unassigned_limit).all()
+        return FastJSONResponse({
+            "origin": start_date.isoformat(),
+            "crew_total": total,
+            "crew_offset": crew_offset,
+            "statuses": TIMELINE_STATUSES,
+            "crews": {
+                "id": crew_ids,
+                "name": [c.name for c in crews],
+                "color": [c.color for c in crews],
+                "member_count": [row[2] for row in crew_rows],
+            },
+            "jobs": _columnar_jobs(jobs, start_date, {cid: i for i, cid in enumerate(crew_ids)}),
+            "unassigned": _columnar_jobs(unassigned, start_date),
+        })
 
     crews_data = []
     for crew in crews:
@@ -490,105 +995,38 @@ def get_timeline(
             "members": members,
         })
 
-    jobs_query = db.query(DispatchJob).options(
+    jobs = db.query(DispatchJob).options(
         joinedload(DispatchJob.crew),
         joinedload(DispatchJob.project),
         joinedload(DispatchJob.task),
-    ).filter(
-        DispatchJob.crew_id.isnot(None),
-        DispatchJob.scheduled_start < end_date,
-        DispatchJob.scheduled_end > start_date,
-    )
-    if project_id:
-        jobs_query = jobs_query.filter(DispatchJob.project_id == project_id)
-
-    jobs = jobs_query.all()
+    ).filter(*window).all() if crew_ids else []
     jobs_data = [serialize_job(j, db) for j in jobs]
 
-    unassigned_query = db.query(DispatchJob).options(
+    unassigned = db.query(DispatchJob).options(
         joinedload(DispatchJob.project),
         joinedload(DispatchJob.task),
-    ).filter(DispatchJob.crew_id.is_(None))
-    if project_id:
-        unassigned_query = unassigned_query.filter(DispatchJob.project_id == project_id)
-    unassigned = unassigned_query.all()
+    ).filter(*unassigned_filter).order_by(DispatchJob.created_at.desc()).limit(unassigned_limit).all()
     unassigned_data = [serialize_job(j, db) for j in unassigned]
 
-    return {
+    return FastJSONResponse({
         "crews": crews_data,
+        "crew_total": total,
+        "crew_offset": crew_offset,
         "jobs": jobs_data,
         "unassigned": unassigned_data,
-    }
+    })
 
 
 @router.get("/stats")
-def get_stats(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    total_jobs = db.query(func.count(DispatchJob.id)).scalar()
-
-    by_status = {}
-    status_counts = db.query(DispatchJob.status, func.count(DispatchJob.id)).group_by(DispatchJob.status).all()
-    for s, c in status_counts:
-        by_status[s.value if hasattr(s, 'value') else str(s)] = c
-
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    tomorrow = today + timedelta(days=1)
-    jobs_today = db.query(func.count(DispatchJob.id)).filter(
-        DispatchJob.scheduled_start >= today,
-        DispatchJob.scheduled_start < tomorrow,
-    ).scalar()
-
-    week_start = today - timedelta(days=today.weekday())
-    week_end = week_start + timedelta(days=7)
-    jobs_this_week = db.query(func.count(DispatchJob.id)).filter(
-        DispatchJob.scheduled_start >= week_start,
-        DispatchJob.scheduled_start < week_end,
-    ).scalar()
-
-    crew_utilization = []
-    crew_jobs = db.query(
-        Crew.id, Crew.name, func.count(DispatchJob.id)
-    ).outerjoin(DispatchJob, DispatchJob.crew_id == Crew.id).filter(
-        Crew.is_active == True
-    ).group_by(Crew.id, Crew.name).all()
-    for cid, cname, ccount in crew_jobs:
-        crew_utilization.append({"crew_id": cid, "crew_name": cname, "job_count": ccount})
-
-    completed_jobs = db.query(DispatchJob).filter(
-        DispatchJob.status == DispatchJobStatus.COMPLETED,
-        DispatchJob.completed_at.isnot(None),
-        DispatchJob.actual_start.isnot(None),
-    ).all()
-    avg_completion_time = None
-    if completed_jobs:
-        total_hours = sum(
-            (j.completed_at - j.actual_start).total_seconds() / 3600
-            for j in completed_jobs
-        )
-        avg_completion_time = round(total_hours / len(completed_jobs), 2)
-
-    return {
-        "total_jobs": total_jobs,
-        "by_status": by_status,
-        "jobs_today": jobs_today,
-        "jobs_this_week": jobs_this_week,
-        "crew_utilization": crew_utilization,
-        "avg_completion_time": avg_completion_time,
-    }
+def get_stats(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    org_id = _get_user_org(current_user, db)
+    stats = stats_cache.get(org_id)
+    if stats is None:
+        stats = compute_stats(db, org_id)
+        stats_cache.put(org_id, stats)
+    return stats
 
 
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
-    try:
-        while True:
-            data = await websocket.receive_text()
-            try:
-                msg = json.loads(data)
-                if msg.get("type") == "ping":
-                    await websocket.send_json({"type": "pong"})
-            except json.JSONDecodeError:
-                pass
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
-    except Exception:
-        manager.disconnect(websocket)
+    await manager.serve(websocket)
@@ -1,18 +1,38 @@
 import os
-import shutil
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query, File, UploadFile, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, File, UploadFile, Form, Request
+from fastapi.responses import RedirectResponse
+from sqlalchemy import and_, func
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from app.db.session import get_db
-from app.core.auth import get_current_user, require_project_access
-from app.models.models import Document, DocumentVersion, Project, User, Activity
+from app.core.auth import Principal, get_current_principal, get_current_user, require_project_access
+from app.core.compression import skip_compression
+from app.core.file_delivery import file_response
+from app.models.models import Blob, Document, DocumentVersion, Project, User, Activity
 from app.schemas.schemas import DocumentCreate, DocumentResponse, DocumentVersionResponse
+from app.services import blob_store
+from app.services.upload_service import StoredUpload, save_upload
 
 router = APIRouter(prefix="/api", tags=["documents"])
 
-UPLOAD_DIR = "app/static/uploads/documents"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+MAX_DOCUMENT_SIZE = 50 * 1024 * 1024
+
+
+async def _save(upload: UploadFile) -> StoredUpload:
+    return await save_upload(upload, blob_store.temp_path(), MAX_DOCUMENT_SIZE, "File too large (max 50MB)")
+
+
+def _claim(db: Session, stored: StoredUpload, content_type: str | None) -> str:
+    return blob_store.blob_ref(blob_store.claim(db, stored, content_type))
+
+
+def _remove_legacy_file(file_path: str):
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
 
 def doc_to_response(doc, db):
     uploader = db.query(User).filter(User.id == doc.uploaded_by).first()
@@ -48,7 +68,7 @@ def list_documents(
     return [doc_to_response(d, db) for d in docs]
 
 @router.post("/projects/{project_id}/documents", response_model=DocumentResponse, status_code=201)
-def upload_document(
+async def upload_document(
     project_id: str,
     file: UploadFile = File(...),
     name: str = Form(None),
@@ -57,121 +77,125 @@ def upload_document(
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    def _check_access():
+        project = db.query(Project).filter(Project.id == project_id).first()
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        require_project_access(user, project)
+
+    def _record(stored):
+        file_path = _claim(db, stored, file.content_type)
+        doc = Document(
+            project_id=project_id,
+            name=name or file.filename or "Untitled",
+            description=description,
+            category=category,
+            file_path=file_path,
+            file_type=file.content_type,
+            file_size=stored.size,
+            uploaded_by=user.id,
+            current_version=1
+        )
+        db.add(doc)
+        db.flush()
+
+        version = DocumentVersion(
+            document_id=doc.id,
+            version_number=1,
+            file_path=file_path,
+            file_size=stored.size,
+            content_hash=stored.sha256,
+            change_notes="Initial upload",
+            uploaded_by=user.id
+        )
+        db.add(version)
+
+        activity = Activity(
+            project_id=project_id, user_id=user.id,
+            action="document_uploaded", entity_type="document",
+            entity_id=doc.id, entity_name=doc.name
+        )
+        db.add(activity)
+        db.commit()
+        db.refresh(doc)
+        return doc_to_response(doc, db)
+
+    await run_in_threadpool(_check_access)
+    stored = await _save(file)
+    return await run_in_threadpool(_record, stored)
+
+def _lockable_document(db: Session, document_id: str, user: User, for_update: bool = False) -> Document:
+    query = db.query(Document).filter(Document.id == document_id)
+    doc = (query.with_for_update() if for_update else query).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    project = db.query(Project).filter(Project.id == doc.project_id).first()
     require_project_access(user, project)
-    
-    if file.size and file.size > 50 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large (max 50MB)")
-    
-    import uuid
-    file_ext = os.path.splitext(file.filename)[1] if file.filename else ''
-    stored_name = f"{uuid.uuid4()}{file_ext}"
-    file_path = os.path.join(UPLOAD_DIR, stored_name)
-    
-    content = file.file.read()
-    with open(file_path, 'wb') as f:
-        f.write(content)
-    
-    doc = Document(
-        project_id=project_id,
-        name=name or file.filename or "Untitled",
-        description=description,
-        category=category,
-        file_path=file_path,
-        file_type=file.content_type,
-        file_size=len(content),
-        uploaded_by=user.id,
-        current_version=1
-    )
-    db.add(doc)
-    db.flush()
-    
-    version = DocumentVersion(
-        document_id=doc.id,
-        version_number=1,
-        file_path=file_path,
-        file_size=len(content),
-        change_notes="Initial upload",
-        uploaded_by=user.id
-    )
-    db.add(version)
-    
-    activity = Activity(
-        project_id=project_id, user_id=user.id,
-        action="document_uploaded", entity_type="document",
-        entity_id=doc.id, entity_name=doc.name
-    )
-    db.add(activity)
-    db.commit()
-    db.refresh(doc)
-    return doc_to_response(doc, db)
+
+    if doc.locked_by and doc.locked_by != user.id:
+        locker = db.query(User).filter(User.id == doc.locked_by).first()
+        raise HTTPException(status_code=409, detail=f"Document is locked by {locker.full_name if locker else 'another user'}")
+    return doc
 
 @router.post("/documents/{document_id}/versions", response_model=DocumentVersionResponse, status_code=201)
-def upload_new_version(
+async def upload_new_version(
     document_id: str,
     file: UploadFile = File(...),
     change_notes: str = Form(None),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    doc = db.query(Document).filter(Document.id == document_id).first()
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-    project = db.query(Project).filter(Project.id == doc.project_id).first()
-    require_project_access(user, project)
-    
-    if doc.locked_by and doc.locked_by != user.id:
-        locker = db.query(User).filter(User.id == doc.locked_by).first()
-        raise HTTPException(status_code=409, detail=f"Document is locked by {locker.full_name if locker else 'another user'}")
-    
-    import uuid
-    file_ext = os.path.splitext(file.filename)[1] if file.filename else ''
-    stored_name = f"{uuid.uuid4()}{file_ext}"
-    file_path = os.path.join(UPLOAD_DIR, stored_name)
-    
-    content = file.file.read()
-    with open(file_path, 'wb') as f:
-        f.write(content)
-    
-    new_version = doc.current_version + 1
-    version = DocumentVersion(
-        document_id=doc.id,
-        version_number=new_version,
-        file_path=file_path,
-        file_size=len(content),
-        change_notes=change_notes,
-        uploaded_by=user.id
-    )
-    db.add(version)
-    
-    doc.current_version = new_version
-    doc.file_path = file_path
-    doc.file_size = len(content)
-    doc.file_type = file.content_type
-    doc.updated_at = datetime.utcnow()
-    if doc.locked_by == user.id:
-        doc.locked_by = None
-        doc.locked_at = None
-    
-    activity = Activity(
-        project_id=doc.project_id, user_id=user.id,
-        action="document_version_uploaded", entity_type="document",
-        entity_id=doc.id, entity_name=f"{doc.name} v{new_version}"
-    )
-    db.add(activity)
-    db.commit()
-    db.refresh(version)
-    
-    uploader = db.query(User).filter(User.id == version.uploaded_by).first()
-    return DocumentVersionResponse(
-        id=version.id, document_id=version.document_id,
-        version_number=version.version_number, file_size=version.file_size,
-        change_notes=version.change_notes, uploaded_by=version.uploaded_by,
-        uploader_name=uploader.full_name if uploader else None,
-        created_at=version.created_at
-    )
+    def _record(stored):
+        try:
+            # Checked again under the row lock: the file took a while to arrive.
+            doc = _lockable_document(db, document_id, user, for_update=True)
+        except BaseException:
+            os.remove(stored.path)
+            raise
+        file_path = _claim(db, stored, file.content_type)
+
+        new_version = doc.current_version + 1
+        version = DocumentVersion(
+            document_id=doc.id,
+            version_number=new_version,
+            file_path=file_path,
+            file_size=stored.size,
+            content_hash=stored.sha256,
+            change_notes=change_notes,
+            uploaded_by=user.id
+        )
+        db.add(version)
+
+        doc.current_version = new_version
+        doc.file_path = file_path
+        doc.file_size = stored.size
+        doc.file_type = file.content_type
+        doc.updated_at = datetime.utcnow()
+        if doc.locked_by == user.id:
+            doc.locked_by = None
+            doc.locked_at = None
+
+        activity = Activity(
+            project_id=doc.project_id, user_id=user.id,
+            action="document_version_uploaded", entity_type="document",
+            entity_id=doc.id, entity_name=f"{doc.name} v{new_version}"
+        )
+        db.add(activity)
+        db.commit()
+        db.refresh(version)
+
+        uploader = db.query(User).filter(User.id == version.uploaded_by).first()
+        return DocumentVersionResponse(
+            id=version.id, document_id=version.document_id,
+            version_number=version.version_number, file_size=version.file_size,
+            change_notes=version.change_notes, uploaded_by=version.uploaded_by,
+            uploader_name=uploader.full_name if uploader else None,
+            created_at=version.created_at
+        )
+
+    await run_in_threadpool(_lockable_document, db, document_id, user)
+    stored = await _save(file)
+    return await run_in_threadpool(_record, stored)
 
 @router.get("/documents/{document_id}/versions", response_model=list[DocumentVersionResponse])
 def list_versions(
@@ -201,35 +225,47 @@ def list_versions(
         ))
     return result
 
-@router.get("/documents/{document_id}/download")
+@router.get("/documents/{document_id}/download", dependencies=[Depends(skip_compression)])
 def download_document(
     document_id: str,
+    request: Request,
     version: int = Query(None),
     token: str = Query(None),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    doc = db.query(Document).filter(Document.id == document_id).first()
-    if not doc:
+    # Document, project, requested (or current) version and its blob in one round trip.
+    row = (
+        db.query(Document, Project, DocumentVersion, Blob)
+        .join(Project, Project.id == Document.project_id)
+        .outerjoin(DocumentVersion, and_(
+            DocumentVersion.document_id == Document.id,
+            DocumentVersion.version_number == func.coalesce(version, Document.current_version),
+        ))
+        .outerjoin(Blob, Blob.sha256 == DocumentVersion.content_hash)
+        .filter(Document.id == document_id)
+        .first()
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Document not found")
-    project = db.query(Project).filter(Project.id == doc.project_id).first()
+    doc, project, ver, blob = row
     require_project_access(user, project)
+    if version and not ver:
+        raise HTTPException(status_code=404, detail="Version not found")
     
-    if version:
-        ver = db.query(DocumentVersion).filter(
-            DocumentVersion.document_id == document_id,
-            DocumentVersion.version_number == version
-        ).first()
-        if not ver:
-            raise HTTPException(status_code=404, detail="Version not found")
-        file_path = ver.file_path
+    if blob:
+        etag = f'"{blob.sha256}"'
+        file_path = blob_store.backend.local_path(blob.key)
+        if file_path is None:
+            return RedirectResponse(blob_store.backend.url(blob.key))
     else:
-        file_path = doc.file_path
+        etag = f'"{doc.id}-v{ver.version_number if ver else doc.current_version}"'
+        file_path = ver.file_path if ver else doc.file_path
     
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found on disk")
     
-    return FileResponse(file_path, filename=doc.name, media_type=doc.file_type or "application/octet-stream")
+    return file_response(request, file_path, etag, doc.name, doc.file_type)
 
 @router.post("/documents/{document_id}/lock")
 def lock_document(
@@ -282,6 +318,7 @@ def unlock_document(
 @router.delete("/documents/{document_id}", status_code=204)
 def delete_document(
     document_id: str,
+    background_tasks: BackgroundTasks,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -292,17 +329,16 @@ def delete_document(
     require_project_access(user, project)
     
     versions = db.query(DocumentVersion).filter(DocumentVersion.document_id == document_id).all()
+    released = False
     for v in versions:
-        if os.path.exists(v.file_path):
-            try:
-                os.remove(v.file_path)
-            except OSError:
-                pass
-    if os.path.exists(doc.file_path):
-        try:
-            os.remove(doc.file_path)
-        except OSError:
-            pass
+        if blob_store.release(db, v.content_hash):
+            released = True
+        else:
+            _remove_legacy_file(v.file_path)
+    if not released:
+        _remove_legacy_file(doc.file_path)
+    else:
+        background_tasks.add_task(blob_store.collect_garbage_soon)
     
     db.delete(doc)
     db.commit()
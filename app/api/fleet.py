@@ -1,6 +1,6 @@
 import json
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, WebSocket
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from app.db.session import get_db
@@ -10,8 +10,10 @@ from app.models.models import (
     TechnicianLocation, TelematicsIntegration,
     User, OrgMember, Crew, Asset
 )
+from app.services.live_positions import PositionHub, checked_out, tech_position, vehicle_position
 
 router = APIRouter(prefix="/api/fleet", tags=["fleet"])
+positions = PositionHub()
 
 
 def _get_user_org(db: Session, user: User):
@@ -218,7 +220,9 @@ def update_vehicle_location(vehicle_id: str, data: dict = Body(...), user: User
         event_type=data.get("event_type", "location_update"),
     )
     db.add(telemetry)
+    position = vehicle_position(v)
     db.commit()
+    positions.publish_from_thread(db, org_id, [position])
     return {"ok": True}
 
 
@@ -270,10 +274,14 @@ def tech_checkin(data: dict = Body(...), user: User = Depends(get_current_user),
         device_info=data.get("device_info"),
         battery_level=float(data.get("battery_level")) if data.get("battery_level") else None,
         is_active=True,
+        event_time=datetime.utcnow(),
     )
     db.add(loc)
+    db.flush()
+    location_id, position = loc.id, tech_position(loc, user.full_name)
     db.commit()
-    return {"ok": True, "location_id": loc.id}
+    positions.publish_from_thread(db, org_id, [position])
+    return {"ok": True, "location_id": location_id}
 
 
 @router.post("/tech/checkout")
@@ -284,6 +292,7 @@ def tech_checkout(user: User = Depends(get_current_user), db: Session = Depends(
     for loc in active:
         loc.is_active = False
     db.commit()
+    positions.publish_from_thread(db, org_id, [checked_out(user.id)])
     return {"ok": True}
 
 
@@ -412,6 +421,7 @@ def sync_integration(integ_id: str, user: User = Depends(get_current_user), db:
     if not integ:
         raise HTTPException(status_code=404, detail="Integration not found")
 
+    started = datetime.utcnow()
     try:
         if integ.provider == "samsara":
             result = _sync_samsara(db, integ, org_id)
@@ -427,13 +437,21 @@ def sync_integration(integ_id: str, user: User = Depends(get_current_user), db:
         integ.vehicle_count = result.get("synced", 0)
         integ.error_message = None
         db.commit()
-        return {"ok": True, "result": result}
     except Exception as e:
         integ.status = "error"
         integ.error_message = str(e)[:500]
         db.commit()
         return {"ok": False, "error": str(e)}
 
+    moved = db.query(FleetVehicle).filter(
+        FleetVehicle.org_id == org_id,
+        FleetVehicle.last_location_update >= started,
+        FleetVehicle.current_lat.isnot(None),
+        FleetVehicle.current_lng.isnot(None),
+    ).all()
+    positions.publish_from_thread(db, org_id, [vehicle_position(v) for v in moved])
+    return {"ok": True, "result": result}
+
 
 def _sync_samsara(db: Session, integ: TelematicsIntegration, org_id: str) -> dict:
     import httpx
@@ -653,6 +671,11 @@ def get_fleet_ai_insights(user: User = Depends(get_current_user), db: Session =
     return {"insights": insights}
 
 
+@router.websocket("/positions/ws")
+async def positions_websocket(websocket: WebSocket):
+    await positions.serve(websocket)
+
+
 @router.get("/map/all")
 def get_all_map_data(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     org_id = _get_user_org(db, user)
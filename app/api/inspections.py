@@ -2,7 +2,8 @@ import json
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.core.auth import get_current_user, require_project_access, require_role
+from app.core.auth import Principal, get_current_principal, get_current_user, require_project_access, require_role
+from app.core.http_cache import cache_tables
 from app.models.models import (
     Inspection, InspectionTemplate, InspectionStatus,
     Task, TaskStatus, User, AuditLog, Project
@@ -32,8 +33,9 @@ def _inspection_to_response(insp: Inspection) -> InspectionResponse:
     )
 
 
-@router.get("/inspection-templates", response_model=list[InspectionTemplateResponse])
-def list_templates(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/inspection-templates", response_model=list[InspectionTemplateResponse],
+            dependencies=[Depends(cache_tables("inspection_templates"))])
+def list_templates(user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     templates = db.query(InspectionTemplate).order_by(InspectionTemplate.created_at.desc()).all()
     return [InspectionTemplateResponse(
         id=t.id, name=t.name, task_type_id=t.task_type_id,
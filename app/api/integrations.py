@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse, JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, defer, joinedload
 from sqlalchemy import func
 import json, csv, io, zipfile, tempfile
 from geoalchemy2.functions import ST_AsGeoJSON
 from app.db.session import get_db
-from app.core.auth import get_current_user, require_project_access
+from app.core.auth import Principal, get_current_principal, require_project_access
+from app.core.http_cache import cache_static
+from app.core.responses import FastJSONResponse, raw_json
 from app.models.models import Task, TaskStatus, Project, User, TaskType, Material, ProjectBudget, Activity
 
 router = APIRouter(prefix="/api/integrations", tags=["integrations"])
@@ -89,23 +91,35 @@ PLATFORMS = [
 PLATFORM_IDS = {p["id"] for p in PLATFORMS}
 
 
-def _get_project_tasks_with_geometry(project_id: str, user: User, db: Session):
+def _get_project_tasks_with_geometry(project_id: str, user: Principal, db: Session):
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     require_project_access(user, project)
-    tasks = db.query(Task).filter(
+    rows = db.query(Task, ST_AsGeoJSON(Task.geometry)).options(
+        joinedload(Task.task_type), defer(Task.geometry)
+    ).filter(
         Task.project_id == project_id,
         Task.geometry.isnot(None)
     ).all()
+    tasks = []
+    for task, raw in rows:
+        # Exporters read the PostGIS GeoJSON text off the task; see _task_to_geojson_feature.
+        task.geojson = raw
+        tasks.append(task)
     return project, tasks
 
 
-def _task_to_geojson_feature(task, db):
-    raw = db.execute(ST_AsGeoJSON(task.geometry)).scalar()
+def _task_to_geojson_feature(task, parse: bool = False):
+    """(geometry, task type name) for a task from _get_project_tasks_with_geometry.
+
+    The geometry is embedded verbatim in the encoded response unless ``parse``
+    is set (the KML builder needs the coordinates).
+    """
+    raw = task.geojson
     if not raw:
         return None
-    geom = json.loads(raw)
+    geom = json.loads(raw) if parse else raw_json(raw)
     tt_name = task.task_type.name if task.task_type else None
     return geom, tt_name
 
@@ -113,7 +127,7 @@ def _task_to_geojson_feature(task, db):
 def _build_vetro_export(project, tasks, db):
     features = []
     for i, t in enumerate(tasks):
-        result = _task_to_geojson_feature(t, db)
+        result = _task_to_geojson_feature(t)
         if not result:
             continue
         geom, tt_name = result
@@ -157,7 +171,7 @@ def _build_vetro_export(project, tasks, db):
 def _build_esri_export(project, tasks, db):
     features = []
     for i, t in enumerate(tasks):
-        result = _task_to_geojson_feature(t, db)
+        result = _task_to_geojson_feature(t)
         if not result:
             continue
         geom, tt_name = result
@@ -188,7 +202,7 @@ def _build_esri_export(project, tasks, db):
 def _build_threegis_export(project, tasks, db):
     features = []
     for t in tasks:
-        result = _task_to_geojson_feature(t, db)
+        result = _task_to_geojson_feature(t)
         if not result:
             continue
         geom, tt_name = result
@@ -243,7 +257,7 @@ def _build_powerbi_export(project, tasks, db):
     type_counts = {}
     timeline_data = []
 
-    all_tasks = db.query(Task).filter(Task.project_id == project.id).all()
+    all_tasks = db.query(Task).options(joinedload(Task.task_type), defer(Task.geometry)).filter(Task.project_id == project.id).all()
 
     for t in all_tasks:
         tt_name = t.task_type.name if t.task_type else "Untyped"
@@ -307,7 +321,7 @@ def _build_deepup_export(project, tasks, db):
         if not is_underground:
             continue
 
-        result = _task_to_geojson_feature(t, db)
+        result = _task_to_geojson_feature(t)
         if not result:
             continue
         geom, _ = result
@@ -338,7 +352,7 @@ def _build_deepup_export(project, tasks, db):
 def _build_qgis_export(project, tasks, db):
     features = []
     for t in tasks:
-        result = _task_to_geojson_feature(t, db)
+        result = _task_to_geojson_feature(t)
         if not result:
             continue
         geom, tt_name = result
@@ -400,7 +414,7 @@ def _build_kml_export(project, tasks, db):
 
     placemarks = ""
     for t in tasks:
-        result = _task_to_geojson_feature(t, db)
+        result = _task_to_geojson_feature(t, parse=True)
         if not result:
             continue
         geom, tt_name = result
@@ -515,8 +529,8 @@ PLATFORM_CONFIGS = {
 }
 
 
-@router.get("/platforms")
-def list_platforms(user: User = Depends(get_current_user)):
+@router.get("/platforms", dependencies=[Depends(cache_static(PLATFORMS))])
+def list_platforms(user: Principal = Depends(get_current_principal)):
     return {"platforms": PLATFORMS}
 
 
@@ -525,7 +539,7 @@ def export_platform_data(
     platform: str,
     project_id: str = Query(..., description="Project ID to export"),
     format: str = Query(None, description="Export format override"),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     if platform not in PLATFORM_IDS:
@@ -535,27 +549,27 @@ def export_platform_data(
 
     if platform == "vetro":
         data = _build_vetro_export(project, tasks, db)
-        return JSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=vetro_export_{project.id[:8]}.geojson"})
+        return FastJSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=vetro_export_{project.id[:8]}.geojson"})
 
     elif platform == "esri":
         data = _build_esri_export(project, tasks, db)
-        return JSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=esri_export_{project.id[:8]}.geojson"})
+        return FastJSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=esri_export_{project.id[:8]}.geojson"})
 
     elif platform == "threegis":
         data = _build_threegis_export(project, tasks, db)
-        return JSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=threegis_export_{project.id[:8]}.geojson"})
+        return FastJSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=threegis_export_{project.id[:8]}.geojson"})
 
     elif platform == "powerbi":
         data = _build_powerbi_export(project, tasks, db)
-        return JSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=powerbi_export_{project.id[:8]}.json"})
+        return FastJSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=powerbi_export_{project.id[:8]}.json"})
 
     elif platform == "deepup":
         data = _build_deepup_export(project, tasks, db)
-        return JSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=deepup_export_{project.id[:8]}.geojson"})
+        return FastJSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=deepup_export_{project.id[:8]}.geojson"})
 
     elif platform == "qgis":
         data = _build_qgis_export(project, tasks, db)
-        return JSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=qgis_export_{project.id[:8]}.geojson"})
+        return FastJSONResponse(content=data, headers={"Content-Disposition": f"attachment; filename=qgis_export_{project.id[:8]}.geojson"})
 
     elif platform == "googleearth":
         kml_content = _build_kml_export(project, tasks, db)
@@ -566,10 +580,10 @@ def export_platform_data(
         )
 
 
-@router.get("/{platform}/config")
+@router.get("/{platform}/config", dependencies=[Depends(cache_static(PLATFORM_CONFIGS))])
 def get_platform_config(
     platform: str,
-    user: User = Depends(get_current_user)
+    user: Principal = Depends(get_current_principal)
 ):
     if platform not in PLATFORM_CONFIGS:
         raise HTTPException(status_code=404, detail=f"Platform '{platform}' not supported. Available: {', '.join(sorted(PLATFORM_CONFIGS.keys()))}")
@@ -577,7 +591,7 @@ def get_platform_config(
 
 
 @router.post("/webhook-test")
-def webhook_test(user: User = Depends(get_current_user)):
+def webhook_test(user: Principal = Depends(get_current_principal)):
     return {
         "status": "success",
         "message": "Webhook connection test successful",
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, desc, case
 from app.db.session import get_db
 from app.core.auth import get_current_user
 from app.models.models import (
@@ -425,7 +425,11 @@ def list_instances(
     db: Session = Depends(get_db)
 ):
     org_id = _get_user_org(db, user)
-    q = db.query(OnboardingWorkflowInstance).filter(
+    q = db.query(OnboardingWorkflowInstance).options(
+        joinedload(OnboardingWorkflowInstance.template),
+        joinedload(OnboardingWorkflowInstance.employee),
+        joinedload(OnboardingWorkflowInstance.manager),
+    ).filter(
         OnboardingWorkflowInstance.org_id == org_id
     )
     if status:
@@ -435,15 +439,20 @@ def list_instances(
 
     instances = q.order_by(desc(OnboardingWorkflowInstance.created_at)).all()
 
+    step_counts = {}
+    if instances:
+        rows = db.query(
+            OnboardingWorkflowStepInstance.instance_id,
+            func.count(OnboardingWorkflowStepInstance.id),
+            func.sum(case((OnboardingWorkflowStepInstance.status == "completed", 1), else_=0)),
+        ).filter(
+            OnboardingWorkflowStepInstance.instance_id.in_([inst.id for inst in instances])
+        ).group_by(OnboardingWorkflowStepInstance.instance_id).all()
+        step_counts = {iid: (total or 0, int(done or 0)) for iid, total, done in rows}
+
     result = []
     for inst in instances:
-        total_steps = db.query(func.count(OnboardingWorkflowStepInstance.id)).filter(
-            OnboardingWorkflowStepInstance.instance_id == inst.id
-        ).scalar() or 0
-        completed_steps = db.query(func.count(OnboardingWorkflowStepInstance.id)).filter(
-            OnboardingWorkflowStepInstance.instance_id == inst.id,
-            OnboardingWorkflowStepInstance.status == "completed"
-        ).scalar() or 0
+        total_steps, completed_steps = step_counts.get(inst.id, (0, 0))
 
         result.append({
             "id": inst.id,
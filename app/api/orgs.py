@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.core.auth import get_current_user, require_org_membership
+from app.core.auth import get_current_user, require_org_membership, revoke_user_tokens
 from app.models.models import Org, OrgMember, User, AuditLog
 from app.schemas.schemas import OrgCreate, OrgResponse, OrgMemberCreate, OrgMemberResponse
 
@@ -21,6 +21,7 @@ def create_org(data: OrgCreate, user: User = Depends(get_current_user), db: Sess
     db.flush()
     member = OrgMember(org_id=org.id, user_id=user.id, role="org_admin")
     db.add(member)
+    revoke_user_tokens(db, user.id, "create_org")
     db.add(AuditLog(user_id=user.id, action="create", entity_type="org", entity_id=org.id))
     db.commit()
     db.refresh(org)
@@ -45,6 +46,7 @@ def add_member(org_id: str, data: OrgMemberCreate, user: User = Depends(get_curr
         raise HTTPException(status_code=400, detail="User already a member")
     member = OrgMember(org_id=org_id, user_id=data.user_id, role=data.role)
     db.add(member)
+    revoke_user_tokens(db, data.user_id, "add_member")
     db.add(AuditLog(user_id=user.id, action="add_member", entity_type="org", entity_id=org_id))
     db.commit()
     db.refresh(member)
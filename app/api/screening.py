@@ -4,7 +4,8 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Body
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from app.db.session import get_db
-from app.core.auth import get_current_user
+from app.core.auth import Principal, get_current_principal, get_current_user
+from app.core.http_cache import cache_static
 from app.models.models import (
     ScreeningRequest, ScreeningProvider, ScreeningStatus,
     DrugScreenFacility, DrugScreenAppointment,
@@ -352,8 +353,8 @@ def update_screening_status(request_id: str, data: dict = Body(...), user: User
     }
 
 
-@router.get("/providers")
-def list_providers(user: User = Depends(get_current_user)):
+@router.get("/providers", dependencies=[Depends(cache_static(PROVIDER_INFO))])
+def list_providers(user: Principal = Depends(get_current_principal)):
     return PROVIDER_INFO
 
 
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.db.session import get_db
+from app.core.auth import Principal, get_current_principal, require_project_access
+from app.core.responses import FastJSONResponse
+from app.models.models import Project
+from app.services.change_feed import CursorExpired, changes_since
+
+router = APIRouter(prefix="/api", tags=["sync"])
+
+
+@router.get("/projects/{project_id}/changes")
+def get_changes(
+    project_id: str,
+    cursor: str = Query(None, description="Cursor from the previous page; omit for a full sync"),
+    limit: int = Query(500, ge=1, le=2000),
+    user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Tasks, field entries, dispatch jobs, inspections and attachments changed since ``cursor``.
+
+    Rows are grouped per entity as ``{"columns": [...], "rows": [[...], ...]}``,
+    deletes are listed by id under ``deleted``. Keep requesting with the
+    returned cursor while ``has_more`` is true. A ``410`` means the cursor
+    is older than the tombstone retention and the client must resync from
+    scratch.
+    """
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    require_project_access(user, project)
+    try:
+        return FastJSONResponse(changes_since(db, project_id, cursor, limit))
+    except CursorExpired:
+        raise HTTPException(status_code=410, detail="Sync cursor expired; run a full sync")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
@@ -1,21 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.core.auth import get_current_user
+from app.core.auth import Principal, get_current_principal
+from app.core.http_cache import cache_tables
 from app.models.models import TaskType, User, AuditLog
-from app.schemas.schemas import TaskTypeCreate, TaskTypeResponse
+from app.schemas.schemas import TaskTypeCreate, TaskTypeResponse, TaskTypeUpdate
 
 router = APIRouter(prefix="/api/task-types", tags=["task-types"])
 
 
-@router.get("", response_model=list[TaskTypeResponse])
-def list_task_types(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("", response_model=list[TaskTypeResponse], dependencies=[Depends(cache_tables("task_types"))])
+def list_task_types(user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     return db.query(TaskType).order_by(TaskType.name).all()
 
 
 @router.post("", response_model=TaskTypeResponse)
-def create_task_type(data: TaskTypeCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    tt = TaskType(name=data.name, description=data.description, unit=data.unit, color=data.color)
+def create_task_type(data: TaskTypeCreate, user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    tt = TaskType(name=data.name, description=data.description, unit=data.unit, color=data.color,
+                  gps_deviation_m=data.gps_deviation_m)
     db.add(tt)
     db.add(AuditLog(user_id=user.id, action="create", entity_type="task_type", entity_id=tt.id))
     db.commit()
@@ -24,15 +26,37 @@ def create_task_type(data: TaskTypeCreate, user: User = Depends(get_current_user
 
 
 @router.get("/{tt_id}", response_model=TaskTypeResponse)
-def get_task_type(tt_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_task_type(tt_id: str, user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     tt = db.query(TaskType).filter(TaskType.id == tt_id).first()
     if not tt:
         raise HTTPException(status_code=404, detail="Task type not found")
     return tt
 
 
+@router.put("/{tt_id}", response_model=TaskTypeResponse)
+def update_task_type(tt_id: str, data: TaskTypeUpdate, user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    tt = db.query(TaskType).filter(TaskType.id == tt_id).first()
+    if not tt:
+        raise HTTPException(status_code=404, detail="Task type not found")
+    if data.name is not None:
+        tt.name = data.name
+    if data.description is not None:
+        tt.description = data.description
+    if data.unit is not None:
+        tt.unit = data.unit
+    if data.color is not None:
+        tt.color = data.color
+    if "gps_deviation_m" in data.model_fields_set:
+        # An explicit null goes back to the GPS_DEVIATION_METERS default.
+        tt.gps_deviation_m = data.gps_deviation_m
+    db.add(AuditLog(user_id=user.id, action="update", entity_type="task_type", entity_id=tt.id))
+    db.commit()
+    db.refresh(tt)
+    return tt
+
+
 @router.delete("/{tt_id}")
-def delete_task_type(tt_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_task_type(tt_id: str, user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     tt = db.query(TaskType).filter(TaskType.id == tt_id).first()
     if not tt:
         raise HTTPException(status_code=404, detail="Task type not found")
@@ -1,28 +1,35 @@
 import json
 import csv
 import io
+import uuid
 from fastapi import APIRouter, Depends, HTTPException, Query, File, UploadFile
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, defer, joinedload
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from geoalchemy2.functions import ST_AsGeoJSON, ST_GeomFromGeoJSON, ST_MakeEnvelope, ST_Intersects
 from app.db.session import get_db
-from app.core.auth import get_current_user, require_project_access
+from app.core.auth import Principal, get_current_principal, require_project_access
+from app.core.responses import FastJSONResponse, raw_json
 from app.models.models import Task, TaskStatus, Project, User, AuditLog, FieldEntry, TaskType, ImportBatch, Activity
 from app.schemas.schemas import (
     TaskCreate, TaskUpdate, TaskResponse,
     FieldEntryCreate, FieldEntryResponse,
+    FieldEntrySyncRequest, FieldEntrySyncResponse, FieldEntrySyncResult,
     ImportResult, ImportError as ImportErrorSchema,
     BulkTaskUpdate, ImportBatchResponse
 )
+from app.services import gps_deviation
 from app.services.import_service import detect_format, parse_file
 
 router = APIRouter(prefix="/api", tags=["tasks"])
 
 VALID_TASK_STATUSES = [s.value for s in TaskStatus]
+QTY_DEVIATION_RATIO = 1.1
+MAX_SYNC_ENTRIES = 500
 
 
-def _get_project_or_404(project_id: str, user: User, db: Session) -> Project:
+def _get_project_or_404(project_id: str, user: Principal, db: Session) -> Project:
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -66,7 +73,7 @@ def list_tasks(
     task_type_id: str = Query(None),
     work_package_id: str = Query(None),
     bbox: str = Query(None, description="minlon,minlat,maxlon,maxlat"),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     _get_project_or_404(project_id, user, db)
@@ -109,6 +116,14 @@ CATEGORY_MAP = {
     "Handhole/Vault": "node",
 }
 
+GEOMETRY_CATEGORIES = {
+    "ST_LineString": "span",
+    "ST_MultiLineString": "span",
+    "ST_Polygon": "zone",
+    "ST_MultiPolygon": "zone",
+    "ST_Point": "node",
+}
+
 
 def _classify_feature(task):
     tt_name = task.task_type.name if task.task_type else ""
@@ -128,11 +143,16 @@ def get_map_layer(
     bbox: str = Query(None),
     status: str = Query(None),
     task_type_id: str = Query(None),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     _get_project_or_404(project_id, user, db)
-    q = db.query(Task).filter(
+    # Geometry is serialized by PostGIS in the same query and embedded verbatim
+    # in the response, instead of one ST_AsGeoJSON round trip plus a
+    # json.loads/json.dumps per feature.
+    q = db.query(Task, ST_AsGeoJSON(Task.geometry), func.ST_GeometryType(Task.geometry)).options(
+        joinedload(Task.task_type), defer(Task.geometry)
+    ).filter(
         Task.project_id == project_id,
         Task.geometry.isnot(None)
     )
@@ -148,12 +168,9 @@ def get_map_layer(
         except (ValueError, IndexError):
             pass
 
-    tasks = q.all()
     features = []
-    for t in tasks:
-        raw = db.execute(ST_AsGeoJSON(t.geometry)).scalar()
+    for t, raw, geom_type in q.all():
         if raw:
-            geom = json.loads(raw)
             tt_name = t.task_type.name if t.task_type else None
             tt_color = t.task_type.color if t.task_type else "#3B82F6"
             status_val = t.status.value
@@ -165,19 +182,14 @@ def get_map_layer(
                     cat = c
                     break
             if cat == "other":
-                if geom["type"] == "LineString" or geom["type"] == "MultiLineString":
-                    cat = "span"
-                elif geom["type"] == "Polygon" or geom["type"] == "MultiPolygon":
-                    cat = "zone"
-                elif geom["type"] == "Point":
-                    cat = "node"
+                cat = GEOMETRY_CATEGORIES.get(geom_type, "other")
 
             remaining = (t.planned_qty or 0) - (t.actual_qty or 0)
             pct = round(((t.actual_qty or 0) / t.planned_qty * 100)) if t.planned_qty else 0
 
             features.append({
                 "type": "Feature",
-                "geometry": geom,
+                "geometry": raw_json(raw),
                 "properties": {
                     "id": t.id,
                     "name": t.name,
@@ -201,11 +213,11 @@ def get_map_layer(
                     "style_icon": t.style_icon,
                 }
             })
-    return {"type": "FeatureCollection", "features": features}
+    return FastJSONResponse({"type": "FeatureCollection", "features": features})
 
 
 @router.get("/tasks/import-template")
-def download_import_template(user: User = Depends(get_current_user)):
+def download_import_template(user: Principal = Depends(get_current_principal)):
     output = io.StringIO()
     writer = csv.writer(output)
     writer.writerow(["name", "description", "task_type", "planned_qty", "unit", "status", "longitude", "latitude", "geometry_wkt"])
@@ -223,7 +235,7 @@ def download_import_template(user: User = Depends(get_current_user)):
 @router.post("/tasks", response_model=TaskResponse)
 def create_task(
     data: TaskCreate,
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     _get_project_or_404(data.project_id, user, db)
@@ -244,7 +256,7 @@ def create_task(
 
 
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
-def get_task(task_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_task(task_id: str, user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -255,7 +267,7 @@ def get_task(task_id: str, user: User = Depends(get_current_user), db: Session =
 @router.put("/tasks/{task_id}", response_model=TaskResponse)
 def update_task(
     task_id: str, data: TaskUpdate,
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     task = db.query(Task).filter(Task.id == task_id).first()
@@ -290,7 +302,7 @@ def update_task(
 
 
 @router.delete("/tasks/{task_id}")
-def delete_task(task_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_task(task_id: str, user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -301,13 +313,49 @@ def delete_task(task_id: str, user: User = Depends(get_current_user), db: Sessio
     return {"ok": True}
 
 
+def _field_entry_response(e: FieldEntry) -> FieldEntryResponse:
+    return FieldEntryResponse(
+        id=e.id, task_id=e.task_id, user_id=e.user_id,
+        qty_delta=e.qty_delta, labor_hours=e.labor_hours,
+        notes=e.notes, deviation_flags=e.deviation_flags,
+        deviation_details=e.deviation_details, created_at=e.created_at
+    )
+
+
+def _flag_deviations(entry: FieldEntry, task: Task, distance_m: float | None):
+    """Flag GPS and quantity deviations; ``task.actual_qty`` must already include this entry."""
+    deviation_flags = []
+    deviation_details = {}
+    if gps_deviation.exceeds_threshold(task, distance_m, entry.gps_accuracy):
+        deviation_flags.append("gps_distance_exceeded")
+        deviation_details["gps_distance_ft"] = round(distance_m * 3.28084)
+
+    new_actual = task.actual_qty or 0
+    if task.planned_qty and task.planned_qty > 0 and new_actual > task.planned_qty * QTY_DEVIATION_RATIO:
+        pct_over = round(((new_actual - task.planned_qty) / task.planned_qty) * 100)
+        deviation_flags.append("qty_threshold_exceeded")
+        deviation_details["qty_pct_over"] = pct_over
+
+    if deviation_flags:
+        entry.deviation_flags = json.dumps(deviation_flags)
+        entry.deviation_details = json.dumps(deviation_details)
+
+
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
 @router.post("/tasks/{task_id}/field-entries", response_model=FieldEntryResponse)
 def create_field_entry(
     task_id: str, data: FieldEntryCreate,
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).options(joinedload(Task.task_type)).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     _get_project_or_404(task.project_id, user, db)
@@ -332,62 +380,138 @@ def create_field_entry(
     if data.qty_delta:
         task.actual_qty = (task.actual_qty or 0) + data.qty_delta
 
-    deviation_flags = []
-    deviation_details = {}
-
-    if data.gps_lat is not None and data.gps_lon is not None and task.geometry is not None:
-        try:
-            from geoalchemy2.functions import ST_Distance, ST_GeomFromText, ST_Transform
-            from sqlalchemy import text as sa_text
-            point_wkt = f"POINT({data.gps_lon} {data.gps_lat})"
-            dist_query = sa_text(
-                "SELECT ST_Distance("
-                "ST_Transform(ST_SetSRID(ST_GeomFromText(:point), 4326), 3857), "
-                "ST_Transform(:geom::geometry, 3857)"
-                ")"
-            )
-            distance_m = db.execute(dist_query, {"point": point_wkt, "geom": task.geometry}).scalar()
-            if distance_m is not None and distance_m > 100:
-                deviation_flags.append("gps_distance_exceeded")
-                deviation_details["gps_distance_ft"] = round(distance_m * 3.28084)
-        except Exception:
-            pass
-
-    new_actual = task.actual_qty or 0
-    if task.planned_qty and task.planned_qty > 0 and new_actual > task.planned_qty * 1.1:
-        pct_over = round(((new_actual - task.planned_qty) / task.planned_qty) * 100)
-        deviation_flags.append("qty_threshold_exceeded")
-        deviation_details["qty_pct_over"] = pct_over
-
-    if deviation_flags:
-        entry.deviation_flags = json.dumps(deviation_flags)
-        entry.deviation_details = json.dumps(deviation_details)
+    distance_m = None
+    if data.gps_lat is not None and data.gps_lon is not None:
+        distance_m = gps_deviation.task_distance_m(task, data.gps_lon, data.gps_lat)
+    _flag_deviations(entry, task, distance_m)
 
     db.add(AuditLog(user_id=user.id, action="field_entry", entity_type="task", entity_id=task_id,
                     details=f"qty_delta={data.qty_delta}"))
     db.commit()
     db.refresh(entry)
-    return FieldEntryResponse(
-        id=entry.id, task_id=entry.task_id, user_id=entry.user_id,
-        qty_delta=entry.qty_delta, labor_hours=entry.labor_hours,
-        notes=entry.notes, deviation_flags=entry.deviation_flags,
-        deviation_details=entry.deviation_details, created_at=entry.created_at
+    return _field_entry_response(entry)
+
+
+@router.post("/field-entries/sync", response_model=FieldEntrySyncResponse)
+def sync_field_entries(
+    data: FieldEntrySyncRequest,
+    user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Apply a batch of queued offline entries in one transaction.
+
+    Entries are matched on ``offline_client_id``, so resending a batch after
+    a dropped connection reports the stored entries as duplicates instead of
+    applying them twice. Per-entry problems (unknown task, no access) are
+    reported in the results and don't fail the rest of the batch.
+    """
+    if len(data.entries) > MAX_SYNC_ENTRIES:
+        raise HTTPException(status_code=400, detail=f"Sync exceeds maximum of {MAX_SYNC_ENTRIES} entries")
+    try:
+        return _sync_field_entries(data.entries, user, db)
+    except IntegrityError:
+        # A concurrent retry of the same batch inserted some of these client ids
+        # first; they are visible now, so a second pass reports them as duplicates.
+        db.rollback()
+        return _sync_field_entries(data.entries, user, db)
+
+
+def _sync_field_entries(items: list[FieldEntryCreate], user: Principal, db: Session) -> FieldEntrySyncResponse:
+    client_ids = {item.offline_client_id for item in items if item.offline_client_id}
+    existing = {}
+    if client_ids:
+        existing = {
+            e.offline_client_id: e
+            for e in db.query(FieldEntry).filter(FieldEntry.offline_client_id.in_(client_ids))
+        }
+
+    # Lock the tasks in id order so concurrent syncs touching the same tasks queue up instead of deadlocking.
+    task_ids = {item.task_id for item in items if _is_uuid(item.task_id)}
+    tasks, denied = {}, set()
+    if task_ids:
+        rows = (
+            db.query(Task, Project)
+            .join(Project, Project.id == Task.project_id)
+            .filter(Task.id.in_(task_ids))
+            .options(defer(Task.geometry), joinedload(Task.task_type))
+            .order_by(Task.id)
+            .with_for_update(of=Task)
+            .all()
+        )
+        for task, project in rows:
+            try:
+                require_project_access(user, project)
+                tasks[task.id] = task
+            except HTTPException:
+                denied.add(task.id)
+
+    results: list[FieldEntrySyncResult | None] = [None] * len(items)
+    created: dict[int, FieldEntry] = {}
+    batch_ids: dict[str, int] = {}
+    repeats: dict[int, int] = {}
+    for i, item in enumerate(items):
+        cid = item.offline_client_id
+        if cid in existing:
+            results[i] = FieldEntrySyncResult(index=i, offline_client_id=cid, status="duplicate",
+                                              entry=_field_entry_response(existing[cid]))
+        elif cid in batch_ids:
+            repeats[i] = batch_ids[cid]
+        elif item.task_id in denied:
+            results[i] = FieldEntrySyncResult(index=i, offline_client_id=cid, status="error", error="No access to this project")
+        elif item.task_id not in tasks:
+            results[i] = FieldEntrySyncResult(index=i, offline_client_id=cid, status="error", error="Task not found")
+        else:
+            created[i] = FieldEntry(
+                task_id=item.task_id, user_id=user.id,
+                qty_delta=item.qty_delta, labor_hours=item.labor_hours,
+                notes=item.notes, gps_lat=item.gps_lat, gps_lon=item.gps_lon,
+                gps_accuracy=item.gps_accuracy, offline_client_id=cid
+            )
+            if cid:
+                batch_ids[cid] = i
+
+    distances = gps_deviation.batch_distances_m(db, [
+        (i, items[i].task_id, items[i].gps_lon, items[i].gps_lat)
+        for i in created if items[i].gps_lat is not None and items[i].gps_lon is not None
+    ])
+    # Deltas accumulate on the loaded rows, so each task gets one UPDATE at flush,
+    # and each entry is flagged against the running total as if sent one by one.
+    for i, entry in created.items():
+        task = tasks[entry.task_id]
+        if entry.qty_delta:
+            task.actual_qty = (task.actual_qty or 0) + entry.qty_delta
+        _flag_deviations(entry, task, distances.get(i))
+
+    db.add_all(created.values())
+    db.add_all([
+        AuditLog(user_id=user.id, action="field_entry", entity_type="task", entity_id=entry.task_id,
+                 details=f"qty_delta={entry.qty_delta}")
+        for entry in created.values()
+    ])
+    db.flush()
+    for i, entry in created.items():
+        results[i] = FieldEntrySyncResult(index=i, offline_client_id=entry.offline_client_id, status="created",
+                                          entry=_field_entry_response(entry))
+    for i, first in repeats.items():
+        results[i] = FieldEntrySyncResult(index=i, offline_client_id=items[i].offline_client_id, status="duplicate",
+                                          entry=results[first].entry)
+    db.commit()
+    return FieldEntrySyncResponse(
+        created=len(created),
+        duplicates=sum(r.status == "duplicate" for r in results),
+        errors=sum(r.status == "error" for r in results),
+        results=results,
     )
 
 
 @router.get("/tasks/{task_id}/field-entries", response_model=list[FieldEntryResponse])
-def list_field_entries(task_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_field_entries(task_id: str, user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     _get_project_or_404(task.project_id, user, db)
     entries = db.query(FieldEntry).filter(FieldEntry.task_id == task_id).order_by(FieldEntry.created_at.desc()).all()
-    return [FieldEntryResponse(
-        id=e.id, task_id=e.task_id, user_id=e.user_id,
-        qty_delta=e.qty_delta, labor_hours=e.labor_hours,
-        notes=e.notes, deviation_flags=e.deviation_flags,
-        deviation_details=e.deviation_details, created_at=e.created_at
-    ) for e in entries]
+    return [_field_entry_response(e) for e in entries]
 
 
 def _parse_wkt_to_geojson(wkt_str: str) -> dict | None:
@@ -428,7 +552,7 @@ def _resolve_task_type(name: str, db: Session) -> str | None:
 async def import_tasks(
     project_id: str,
     file: UploadFile = File(...),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     project = _get_project_or_404(project_id, user, db)
@@ -550,7 +674,7 @@ async def import_tasks(
 @router.get("/projects/{project_id}/import-history", response_model=list[ImportBatchResponse])
 def get_import_history(
     project_id: str,
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     _get_project_or_404(project_id, user, db)
@@ -569,7 +693,7 @@ def get_import_history(
 def bulk_update_tasks(
     project_id: str,
     data: BulkTaskUpdate,
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     _get_project_or_404(project_id, user, db)
@@ -611,7 +735,7 @@ def bulk_update_tasks(
 @router.get("/projects/{project_id}/import-history", response_model=list[ImportBatchResponse])
 def get_import_history(
     project_id: str,
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     project = _get_project_or_404(project_id, user, db)
@@ -1,76 +1,324 @@
+import asyncio
+import functools
 import hashlib
+import hmac
 import secrets
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+import bcrypt
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from app.core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES,
+    REFRESH_TOKEN_EXPIRE_DAYS, REFRESH_REUSE_GRACE_SECONDS,
+    PASSWORD_HASH_SCHEME, PBKDF2_ITERATIONS, BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE,
+)
+from app.core.revocation import revocations
 from app.db.session import get_db
-from app.models.models import User, OrgMember
+from app.models.models import User, OrgMember, RoleName, RefreshToken, TokenRevocation
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
+PBKDF2_SCHEME = "pbkdf2_sha256"
+BCRYPT_SCHEME = "bcrypt"
+LEGACY_PBKDF2_ITERATIONS = 100000
+
+# Hashing is CPU-bound but both hashlib and bcrypt release the GIL, so a small
+# dedicated pool keeps a login storm from occupying the request threadpool.
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+_hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+
+
+def _pbkdf2(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
+
+
+def _bcrypt_bytes(password: str) -> bytes:
+    # bcrypt only looks at the first 72 bytes; newer releases raise instead of truncating.
+    return password.encode()[:72]
+
 
 def hash_password(password: str) -> str:
+    """Hash with the configured scheme.
+
+    PBKDF2 hashes are stored as ``pbkdf2_sha256$<iterations>$<salt>$<hex>``;
+    bcrypt hashes use bcrypt's own ``$2b$<rounds>$...`` format.
+    """
+    if PASSWORD_HASH_SCHEME == BCRYPT_SCHEME:
+        return bcrypt.hashpw(_bcrypt_bytes(password), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
     salt = secrets.token_hex(16)
-    h = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
-    return f"{salt}${h.hex()}"
+    return f"{PBKDF2_SCHEME}${PBKDF2_ITERATIONS}${salt}${_pbkdf2(password, salt, PBKDF2_ITERATIONS)}"
 
 
 def verify_password(plain: str, hashed: str) -> bool:
     try:
-        salt, h = hashed.split('$', 1)
-        check = hashlib.pbkdf2_hmac('sha256', plain.encode(), salt.encode(), 100000)
-        return check.hex() == h
+        if hashed.startswith("$2"):
+            return bcrypt.checkpw(_bcrypt_bytes(plain), hashed.encode())
+        parts = hashed.split('$')
+        if len(parts) == 4 and parts[0] == PBKDF2_SCHEME:
+            _, iterations, salt, h = parts
+            return hmac.compare_digest(_pbkdf2(plain, salt, int(iterations)), h)
+        if len(parts) == 2:
+            salt, h = parts
+            return hmac.compare_digest(_pbkdf2(plain, salt, LEGACY_PBKDF2_ITERATIONS), h)
     except Exception:
+        pass
+    return False
+
+
+def password_needs_rehash(hashed: str) -> bool:
+    """True if ``hashed`` was not produced with the current scheme and cost."""
+    if PASSWORD_HASH_SCHEME == BCRYPT_SCHEME:
+        if not hashed.startswith("$2"):
+            return True
+        return hashed.split('$')[2] != f"{BCRYPT_ROUNDS:02d}"
+    parts = hashed.split('$')
+    return not (len(parts) == 4 and parts[0] == PBKDF2_SCHEME and parts[1] == str(PBKDF2_ITERATIONS))
+
+
+@functools.lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    return hash_password(secrets.token_hex(16))
+
+
+async def _run_hash_job(fn, *args):
+    if _hash_slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-ins in progress, please retry",
+            headers={"Retry-After": "1"},
+        )
+    async with _hash_slots:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+
+
+async def verify_password_async(plain: str, hashed: str | None) -> bool:
+    """Verify on the hashing pool. A missing hash is checked against a dummy
+    so unknown accounts take as long as wrong passwords."""
+    if hashed is None:
+        await _run_hash_job(verify_password, plain, await _run_hash_job(_dummy_hash))
         return False
+    return await _run_hash_job(verify_password, plain, hashed)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hash_job(hash_password, password)
+
+
+@dataclass(frozen=True)
+class Membership:
+    org_id: str
+    role: RoleName
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The caller as described by a verified access token.
+
+    Exposes ``id`` and ``memberships`` like ``User`` does, so the membership
+    helpers below accept either one.
+    """
+    id: str
+    email: str | None
+    full_name: str | None
+    memberships: tuple[Membership, ...]
+
+
+def _role_value(role) -> str:
+    return role.value if hasattr(role, "value") else role
+
+
+def access_claims_for(user: User) -> dict:
+    return {
+        "sub": user.id,
+        "email": user.email,
+        "name": user.full_name,
+        "orgs": [{"id": m.org_id, "role": _role_value(m.role)} for m in user.memberships],
+    }
 
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # Millisecond iat so a token refreshed right after a revocation is not caught by it.
+    to_encode.update({"typ": "access", "iat": round(time.time(), 3), "exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def _create_refresh_token(db: Session, user_id: str, family_id: str | None = None) -> str:
+    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    record = RefreshToken(id=str(uuid.uuid4()), user_id=user_id,
+                          family_id=family_id or str(uuid.uuid4()), expires_at=expires_at)
+    db.add(record)
+    return jwt.encode(
+        {"sub": user_id, "typ": "refresh", "jti": record.id, "fam": record.family_id, "exp": expires_at},
+        SECRET_KEY, algorithm=ALGORITHM,
+    )
+
+
+def issue_tokens(user: User, db: Session, family_id: str | None = None) -> dict:
+    """Build an access/refresh pair for ``user``. The caller commits."""
+    access = create_access_token(access_claims_for(user))
+    refresh = _create_refresh_token(db, user.id, family_id)
+    return {
+        "access_token": access,
+        "refresh_token": refresh,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def _revoke_family(db: Session, family_id: str):
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+
+def rotate_refresh_token(refresh_token: str, db: Session) -> dict:
+    """Exchange a refresh token for a new pair, invalidating the old one.
+
+    Presenting an already-rotated token again means it leaked, so the whole
+    family is revoked; a short grace period tolerates two tabs refreshing at
+    the same moment.
+    """
+    invalid = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    try:
+        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise invalid
+    if payload.get("typ") != "refresh" or not payload.get("jti"):
+        raise invalid
+
+    record = db.query(RefreshToken).filter(RefreshToken.id == payload["jti"]).first()
+    now = datetime.utcnow()
+    if record is None or record.revoked_at is not None or record.expires_at <= now:
+        raise invalid
+    if record.used_at is not None and (now - record.used_at).total_seconds() > REFRESH_REUSE_GRACE_SECONDS:
+        _revoke_family(db, record.family_id)
+        db.commit()
+        raise invalid
+
+    user = db.query(User).filter(User.id == record.user_id, User.is_active == True).first()
+    if user is None:
+        raise invalid
+    record.used_at = record.used_at or now
+    tokens = issue_tokens(user, db, family_id=record.family_id)
+    db.commit()
+    return tokens
+
+
+def revoke_refresh_token(refresh_token: str, db: Session):
+    """Sign out: revoke the token's whole family. Unknown tokens are ignored."""
+    try:
+        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return
+    if payload.get("typ") == "refresh" and payload.get("fam"):
+        _revoke_family(db, payload["fam"])
+        db.commit()
+
+
+def revoke_user_tokens(db: Session, user_id: str, reason: str, include_refresh: bool = False):
+    """Void every access token issued to ``user_id`` so far.
+
+    Clients then refresh and pick up current roles and memberships; with
+    ``include_refresh`` they are signed out instead. Call before the commit
+    that applies the change; other workers see it on their next sync.
+    """
+    revoked_at = time.time()
+    now = datetime.utcfromtimestamp(revoked_at)
+    db.add(TokenRevocation(user_id=user_id, reason=reason, revoked_at=now))
+    if include_refresh:
+        db.query(RefreshToken).filter(
+            RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None)
+        ).update({RefreshToken.revoked_at: now}, synchronize_session=False)
+    revocations.add(user_id, revoked_at)
+
+
+def _decode_access_token(token: str | None) -> dict | None:
+    if token is None:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("sub") is None or payload.get("typ", "access") != "access":
+        return None
+    if revocations.is_revoked(payload["sub"], payload.get("iat")):
+        return None
+    return payload
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> User:
     if token is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    except JWTError:
+    payload = _decode_access_token(token)
+    if payload is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    user = db.query(User).filter(User.id == payload["sub"], User.is_active == True).first()
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
 
 
-def get_optional_user(
+def get_current_principal(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> User | None:
+) -> Principal:
+    """Authorize from token claims alone, without a database round trip.
+
+    Tokens issued before membership claims existed fall back to loading the
+    user. Deactivation and role changes reach these callers through the
+    revocation list, or at the latest when the short-lived token expires.
+    """
+    return principal_from_token(token, db)
+
+
+def principal_from_token(token: str | None, db: Session | None) -> Principal:
+    """``get_current_principal`` outside dependency injection, e.g. for WebSockets.
+
+    Without a session, tokens lacking membership claims are rejected rather
+    than looked up.
+    """
     if token is None:
-        return None
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    payload = _decode_access_token(token)
+    if payload is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    if "orgs" not in payload:
+        if db is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        user = get_current_user(token, db)
+        payload = access_claims_for(user)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-    except JWTError:
+        memberships = tuple(Membership(org_id=m["id"], role=RoleName(m["role"])) for m in payload["orgs"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    return Principal(id=payload["sub"], email=payload.get("email"), full_name=payload.get("name"),
+                     memberships=memberships)
+
+
+def get_optional_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> User | None:
+    payload = _decode_access_token(token)
+    if payload is None:
         return None
-    return db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    return db.query(User).filter(User.id == payload["sub"], User.is_active == True).first()
 
 
-def get_user_org_ids(user: User) -> list[str]:
+def get_user_org_ids(user: User | Principal) -> list[str]:
     return [m.org_id for m in user.memberships]
 
 
@@ -82,13 +330,13 @@ def get_user_role_in_org(user_id: str, org_id: str, db: Session) -> str | None:
     return member.role.value if member else None
 
 
-def require_org_membership(user: User, org_id: str):
+def require_org_membership(user: User | Principal, org_id: str):
     org_ids = get_user_org_ids(user)
     if org_id not in org_ids:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this organization")
 
 
-def require_project_access(user: User, project, db: Session = None):
+def require_project_access(user: User | Principal, project, db: Session = None):
     from app.models.models import Project
     org_ids = get_user_org_ids(user)
     if project.executing_org_id not in org_ids and (project.owner_org_id is None or project.owner_org_id not in org_ids):
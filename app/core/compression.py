@@ -0,0 +1,157 @@
+"""gzip/brotli response compression.
+
+A pure ASGI middleware, so ``StreamingResponse`` bodies are compressed chunk
+by chunk instead of being buffered. Small responses (under
+``COMPRESSION_MIN_SIZE``) go out untouched. Chunks of at least
+``COMPRESSION_OFFLOAD_SIZE`` bytes are compressed in the threadpool so a
+large GeoJSON export doesn't stall the event loop.
+
+Only compressible media types are considered. Responses that already carry a
+``Content-Encoding``, partial content, paths under ``SKIP_PREFIXES``, and
+routes that depend on ``skip_compression`` are passed through.
+"""
+import zlib
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from app.core.config import COMPRESSION_MIN_SIZE, COMPRESSION_OFFLOAD_SIZE
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/geo+json", "application/javascript",
+    "application/xml", "application/vnd.google-earth.kml+xml", "image/svg+xml",
+}
+# User uploads are mostly photos, PDFs and KMZs; /static/dist is precompressed.
+SKIP_PREFIXES = ("/static/uploads", "/static/dist")
+SKIP_SCOPE_KEY = "compression.skip"
+
+
+def skip_compression(request: Request):
+    """Route dependency opting a response out of compression."""
+    request.scope[SKIP_SCOPE_KEY] = True
+
+
+def _choose_encoding(accept_encoding: str) -> str | None:
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip() in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(token.strip())
+    if "br" in accepted:
+        try:
+            import brotli  # noqa: F401
+            return "br"
+        except ImportError:
+            pass
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            import brotli
+            self._br = brotli.Compressor(quality=4)
+            self._gz = None
+        else:
+            self._br = None
+            self._gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self._br is not None:
+            out = self._br.process(data)
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, offload_size: int = COMPRESSION_OFFLOAD_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(SKIP_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        encoding = _choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressingResponder(self, scope, encoding, send).run(receive)
+
+
+class _CompressingResponder:
+    def __init__(self, middleware: CompressionMiddleware, scope, encoding: str, send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.pending: list[bytes] = []
+        self.pending_size = 0
+        self.encoder: _Encoder | None = None
+        self.passthrough = False
+
+    async def run(self, receive):
+        await self.middleware.app(self.scope, receive, self.on_send)
+
+    async def on_send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = (
+                self.scope.get(SKIP_SCOPE_KEY)
+                or message["status"] in (204, 206, 304)
+                or "content-encoding" in headers
+                or not _is_compressible(headers.get("content-type", ""))
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.encoder is None:
+            self.pending.append(body)
+            self.pending_size += len(body)
+            if more_body and self.pending_size < self.middleware.minimum_size:
+                return  # keep buffering until we know the body is worth compressing
+            body, self.pending = b"".join(self.pending), []
+            if not more_body and self.pending_size < self.middleware.minimum_size:
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            self.encoder = _Encoder(self.encoding)
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            del headers["content-length"]
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The encoded bytes differ from the identity representation the strong tag names.
+                headers["ETag"] = f"W/{etag}"
+            compressed = await self._compress(body, final=not more_body)
+            if not more_body:
+                headers["Content-Length"] = str(len(compressed))
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+            return
+
+        compressed = await self._compress(body, final=not more_body)
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    async def _compress(self, data: bytes, final: bool) -> bytes:
+        if len(data) >= self.middleware.offload_size:
+            return await run_in_threadpool(self.encoder.compress, data, final)
+        return self.encoder.compress(data, final)
@@ -26,6 +26,80 @@ def _parse_cors_origins(value: str | None) -> list[str]:
 DATABASE_URL = os.environ.get("DATABASE_URL", "postgresql://localhost/ftth")
 SECRET_KEY = os.environ.get("SECRET_KEY", "ftth-contractor-platform-secret-key-change-in-production")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+REFRESH_REUSE_GRACE_SECONDS = 10
+REVOCATION_SYNC_SECONDS = int(os.environ.get("REVOCATION_SYNC_SECONDS", "30"))
 MAPBOX_PUBLIC_TOKEN = os.environ.get("MAPBOX_PUBLIC_TOKEN", "")
+# Folded into every ETag so a deploy that changes a response shape invalidates cached copies.
+CACHE_BUILD_ID = os.environ.get("CACHE_BUILD_ID") or os.environ.get("RENDER_GIT_COMMIT", "")
+
+# Response compression: bodies under the minimum go out as-is; chunks at or
+# above the offload size are compressed in the threadpool.
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_OFFLOAD_SIZE = int(os.environ.get("COMPRESSION_OFFLOAD_SIZE", "262144"))
+
+# Content-addressed upload storage: "local" (under app/static/uploads/blobs) or
+# "s3" for any S3-compatible endpoint. Unreferenced blobs are kept for the
+# grace period before garbage collection removes them.
+BLOB_BACKEND = os.environ.get("BLOB_BACKEND", "local")
+BLOB_S3_BUCKET = os.environ.get("BLOB_S3_BUCKET", "")
+BLOB_S3_ENDPOINT_URL = os.environ.get("BLOB_S3_ENDPOINT_URL", "")
+BLOB_S3_PREFIX = os.environ.get("BLOB_S3_PREFIX", "")
+BLOB_PUBLIC_URL = os.environ.get("BLOB_PUBLIC_URL", "")
+BLOB_GC_GRACE_SECONDS = int(os.environ.get("BLOB_GC_GRACE_SECONDS", "3600"))
+# Document downloads: "x-accel" (nginx) or "x-sendfile" (Apache/lighttpd) hands
+# the transfer to the fronting proxy. For x-accel, DOWNLOAD_OFFLOAD_PREFIX is the
+# internal location aliased to app/static/uploads.
+DOWNLOAD_OFFLOAD = os.environ.get("DOWNLOAD_OFFLOAD", "").lower()
+DOWNLOAD_OFFLOAD_PREFIX = os.environ.get("DOWNLOAD_OFFLOAD_PREFIX", "/_protected/uploads/")
+# Default distance a field entry's GPS fix may be from its task before it is
+# flagged; task types can override it with their own gps_deviation_m.
+GPS_DEVIATION_METERS = float(os.environ.get("GPS_DEVIATION_METERS", "100"))
+
+# Dispatch board events reach every worker's WebSockets through "postgres"
+# (LISTEN/NOTIFY); "memory" keeps them in-process, for tests and single workers.
+DISPATCH_BUS = os.environ.get("DISPATCH_BUS", "postgres").lower()
+# Frames queued per dispatch socket before a slow client is switched to a resync.
+DISPATCH_WS_QUEUE_SIZE = int(os.environ.get("DISPATCH_WS_QUEUE_SIZE", "100"))
+# Dispatch planning: assumed average road speed for drive-time estimates, and the
+# default working day used when auto-scheduling jobs.
+DISPATCH_TRAVEL_SPEED_KMH = float(os.environ.get("DISPATCH_TRAVEL_SPEED_KMH", "50"))
+DISPATCH_WORKDAY = os.environ.get("DISPATCH_WORKDAY", "07:00-17:00")
+# Seconds dispatch stats are cached per org; job writes invalidate them sooner.
+DISPATCH_STATS_TTL_SECONDS = float(os.environ.get("DISPATCH_STATS_TTL_SECONDS", "30"))
+# Recent events kept per org so reconnecting boards get only what they missed;
+# persisting them lets a freshly started worker replay too.
+DISPATCH_REPLAY_SIZE = int(os.environ.get("DISPATCH_REPLAY_SIZE", "500"))
+DISPATCH_REPLAY_PERSIST = os.environ.get("DISPATCH_REPLAY_PERSIST", "").lower() in ("1", "true", "yes")
+# Live positions: an update is pushed once an entity has moved this far, or after
+# the heartbeat, but never more often than the minimum interval. Sockets receive
+# batched updates at most once per push interval.
+POSITION_MIN_DISTANCE_M = float(os.environ.get("POSITION_MIN_DISTANCE_M", "25"))
+POSITION_MIN_INTERVAL_SECONDS = float(os.environ.get("POSITION_MIN_INTERVAL_SECONDS", "5"))
+POSITION_HEARTBEAT_SECONDS = float(os.environ.get("POSITION_HEARTBEAT_SECONDS", "60"))
+POSITION_PUSH_INTERVAL_SECONDS = float(os.environ.get("POSITION_PUSH_INTERVAL_SECONDS", "1"))
+
+# Delta sync: tombstones older than this are pruned, and cursors older than this
+# are rejected so the client does a full resync instead of missing deletes.
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+# Longest-edge pixel sizes generated for image attachments and PDF previews.
+THUMBNAIL_SIZES = tuple(sorted(int(s) for s in os.environ.get("THUMBNAIL_SIZES", "160,480,1024").split(",") if s.strip()))
 CORS_ORIGINS = _parse_cors_origins(os.environ.get("CORS_ORIGINS"))
+
+# Password hashing: new hashes use PASSWORD_HASH_SCHEME; stored hashes with other
+# parameters are upgraded transparently on the next successful login.
+PASSWORD_HASH_SCHEME = os.environ.get("PASSWORD_HASH_SCHEME", "pbkdf2_sha256")
+PBKDF2_ITERATIONS = int(os.environ.get("PBKDF2_ITERATIONS", "100000"))
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", "32"))
+
+LOGIN_MAX_ATTEMPTS_PER_IP = int(os.environ.get("LOGIN_MAX_ATTEMPTS_PER_IP", "100"))
+LOGIN_IP_WINDOW_SECONDS = int(os.environ.get("LOGIN_IP_WINDOW_SECONDS", "60"))
+LOGIN_MAX_FAILURES_PER_ACCOUNT = int(os.environ.get("LOGIN_MAX_FAILURES_PER_ACCOUNT", "5"))
+LOGIN_ACCOUNT_WINDOW_SECONDS = int(os.environ.get("LOGIN_ACCOUNT_WINDOW_SECONDS", "900"))
+# Proxies in front of the app that append to X-Forwarded-For (Render's load
+# balancer is one). The login throttle keys on the address the outermost of
+# them saw; entries further left are client-supplied and ignored.
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", "0"))
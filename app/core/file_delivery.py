@@ -0,0 +1,57 @@
+"""Serving stored files: conditional requests, byte ranges and proxy offload.
+
+``file_response`` answers ``If-None-Match`` with ``304`` against a caller
+supplied ETag. That tag should name the content, such as a blob's SHA-256
+or a document version. Otherwise the file is sent with Starlette's
+``FileResponse``, which handles ``Range`` and ``If-Range``, so large PDFs
+can be resumed and viewed page by page.
+
+With ``DOWNLOAD_OFFLOAD`` set, the body is left to the fronting proxy:
+``x-accel`` answers with ``X-Accel-Redirect`` pointing into
+``DOWNLOAD_OFFLOAD_PREFIX``, and ``x-sendfile`` answers with the absolute
+path. Python then only authorizes the request. Files outside the uploads
+directory are always streamed by the app.
+"""
+import os
+from urllib.parse import quote
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from app.core.config import DOWNLOAD_OFFLOAD, DOWNLOAD_OFFLOAD_PREFIX
+from app.core.http_cache import cache_control_value, etag_matches
+
+UPLOAD_ROOT = os.path.abspath(os.path.join("app", "static", "uploads"))
+# Clients may keep a copy but must revalidate; a 304 is cheap and access can be revoked.
+DOWNLOAD_CACHE_CONTROL = cache_control_value(0, public=False)
+
+
+def _content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _offload_headers(path: str) -> dict[str, str] | None:
+    mode = DOWNLOAD_OFFLOAD
+    if mode not in ("x-accel", "x-sendfile"):
+        return None
+    full_path = os.path.abspath(path)
+    if os.path.commonpath([full_path, UPLOAD_ROOT]) != UPLOAD_ROOT:
+        return None
+    if mode == "x-sendfile":
+        return {"X-Sendfile": full_path}
+    relative = os.path.relpath(full_path, UPLOAD_ROOT).replace(os.sep, "/")
+    return {"X-Accel-Redirect": DOWNLOAD_OFFLOAD_PREFIX.rstrip("/") + "/" + quote(relative)}
+
+
+def file_response(request: Request, path: str, etag: str, filename: str, media_type: str | None) -> Response:
+    headers = {"ETag": etag, "Cache-Control": DOWNLOAD_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    media_type = media_type or "application/octet-stream"
+    offload = _offload_headers(path)
+    if offload:
+        headers.update(offload)
+        headers["Content-Disposition"] = _content_disposition(filename)
+        return Response(headers=headers, media_type=media_type)
+    return FileResponse(path, filename=filename, media_type=media_type, headers=headers)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.auth import get_current_principal
+from app.core.config import CACHE_BUILD_ID
+from app.db.session import get_db
+
+NO_STORE = "no-cache, no-store, must-revalidate"
+
+# Tables whose writes bump a row in ``table_versions``. Filled in by
+# ``cache_tables`` when routers are imported, so only tables that back a
+# cached route pay for the extra upsert.
+_tracked_tables: set[str] = set()
+
+
+def _etag(*parts) -> str:
+    digest = hashlib.sha256(json.dumps([CACHE_BUILD_ID, *parts], sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def cache_control_value(max_age: int, public: bool) -> str:
+    scope = "public" if public else "private"
+    if max_age <= 0:
+        return f"{scope}, no-cache"
+    return f"{scope}, max-age={max_age}, must-revalidate"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so a W/ prefix added by a proxy still matches.
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def _apply(request: Request, response: Response, etag: str, cache_control: str):
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+
+def table_versions(db: Session, tables) -> dict[str, int]:
+    from app.models.models import TableVersion
+    rows = db.execute(
+        select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(list(tables)))
+    ).all()
+    versions = {name: 0 for name in tables}
+    versions.update({name: version for name, version in rows})
+    return versions
+
+
+def cache_tables(*tables: str, max_age: int = 0):
+    """Dependency validating a cached response against the given tables' versions.
+
+    The ETag is derived from the route and the current version of each table,
+    so it changes whenever a row in any of them is written through the ORM.
+    A matching ``If-None-Match`` short-circuits with ``304`` before the
+    endpoint runs. Requires an authenticated caller.
+    """
+    _tracked_tables.update(tables)
+    cache_control = cache_control_value(max_age, public=False)
+
+    def dependency(request: Request, response: Response, db: Session = Depends(get_db),
+                   _user=Depends(get_current_principal)):
+        versions = table_versions(db, tables)
+        _apply(request, response, _etag(request.url.path, str(request.query_params), versions), cache_control)
+
+    return dependency
+
+
+def cache_static(payload, max_age: int = 300, public: bool = False):
+    """Dependency for responses that only change on deploy (constants, env config).
+
+    ``payload`` is hashed once at import; pass the same object the endpoint returns.
+    """
+    etag = _etag(payload)
+    cache_control = cache_control_value(max_age, public)
+
+    if public:
+        def dependency(request: Request, response: Response):
+            _apply(request, response, etag, cache_control)
+    else:
+        def dependency(request: Request, response: Response, _user=Depends(get_current_principal)):
+            _apply(request, response, etag, cache_control)
+
+    return dependency
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_table_versions(session, flush_context):
+    if not _tracked_tables:
+        return
+    touched = {
+        obj.__table__.name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if getattr(obj, "__table__", None) is not None and obj.__table__.name in _tracked_tables
+    }
+    if not touched:
+        return
+    from app.models.models import TableVersion
+    table = TableVersion.__table__
+    for name in sorted(touched):
+        stmt = insert(table).values(table_name=name, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.table_name],
+            set_={"version": table.c.version + 1, "updated_at": stmt.excluded.updated_at},
+        )
+        session.connection().execute(stmt)
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from fastapi import HTTPException, Request, status
+from app.core.config import (
+    LOGIN_MAX_ATTEMPTS_PER_IP, LOGIN_IP_WINDOW_SECONDS,
+    LOGIN_MAX_FAILURES_PER_ACCOUNT, LOGIN_ACCOUNT_WINDOW_SECONDS, TRUSTED_PROXY_HOPS,
+)
+
+
+def client_ip(request: Request, hops: int = TRUSTED_PROXY_HOPS) -> str:
+    """The caller's address as seen by the outermost of ``hops`` trusted proxies.
+
+    Each proxy appends the address it received from to X-Forwarded-For, so
+    only the last ``hops`` entries can be trusted; anything to their left
+    was sent by the client. Without proxies this is the socket peer.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if hops <= 0:
+        return peer
+    forwarded = [ip.strip() for header in request.headers.getlist("x-forwarded-for")
+                 for ip in header.split(",") if ip.strip()]
+    return forwarded[-hops] if len(forwarded) >= hops else peer
+
+
+class SlidingWindowCounter:
+    """Per-key event timestamps within a rolling window.
+
+    State is per process; with several workers each enforces its own limit,
+    which is fine for shedding load but means the effective cap is
+    ``limit * workers``. Beyond ``max_keys`` the least recently hit key is
+    forgotten, and each key keeps only its last ``limit`` events.
+    """
+
+    def __init__(self, limit: int, window_seconds: int, max_keys: int = 100_000):
+        self.limit = limit
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._events: OrderedDict[str, deque] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, key: str, now: float) -> deque | None:
+        events = self._events.get(key)
+        if events is None:
+            return None
+        cutoff = now - self.window
+        while events and events[0] <= cutoff:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def retry_after(self, key: str) -> int:
+        """Seconds until ``key`` is allowed again, or 0 if it is under the limit."""
+        now = time.monotonic()
+        with self._lock:
+            events = self._prune(key, now)
+            if events is None or len(events) < self.limit:
+                return 0
+            return max(1, int(events[0] + self.window - now) + 1)
+
+    def hit(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                events = self._events[key] = deque(maxlen=self.limit)
+                if len(self._events) > self.max_keys:
+                    self._events.popitem(last=False)
+            else:
+                self._events.move_to_end(key)
+            events.append(now)
+
+    def reset(self, key: str):
+        with self._lock:
+            self._events.pop(key, None)
+
+
+class LoginThrottle:
+    """Rejects sign-in attempts before any password hashing happens.
+
+    Every attempt counts against the client IP; only failures count against
+    the account, so a user who gets their password right is never locked out
+    by their own earlier typos once the window passes.
+    """
+
+    def __init__(self):
+        self.by_ip = SlidingWindowCounter(LOGIN_MAX_ATTEMPTS_PER_IP, LOGIN_IP_WINDOW_SECONDS)
+        self.by_account = SlidingWindowCounter(LOGIN_MAX_FAILURES_PER_ACCOUNT, LOGIN_ACCOUNT_WINDOW_SECONDS)
+
+    def check(self, email: str, ip: str):
+        wait = max(self.by_ip.retry_after(ip), self.by_account.retry_after(email.strip().lower()))
+        if wait:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many sign-in attempts, please wait and try again",
+                headers={"Retry-After": str(wait)},
+            )
+        self.by_ip.hit(ip)
+
+    def record_failure(self, email: str):
+        self.by_account.hit(email.strip().lower())
+
+    def record_success(self, email: str):
+        self.by_account.reset(email.strip().lower())
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,64 @@
+"""Fast JSON responses.
+
+``FastJSONResponse`` is the app's default response class and encodes with
+orjson. Hot routes can return it directly: that skips FastAPI's
+``jsonable_encoder`` walk and ``response_model`` validation, so the content
+must already be JSON-ready. ``raw_json`` embeds an already-serialized
+fragment, such as ``ST_AsGeoJSON`` output, without parsing it, and bytes
+from ``json_bytes`` are sent as they are.
+
+orjson is optional: without it encoding falls back to the stdlib and
+fragments are parsed.
+"""
+import enum
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson installed
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    # orjson handles these natively; the stdlib fallback does not.
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def json_bytes(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def raw_json(text: str | None):
+    """Wrap serialized JSON so it is embedded verbatim when the response is encoded."""
+    if text is None:
+        return None
+    if orjson is not None:
+        return orjson.Fragment(text)
+    return json.loads(text)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content  # already encoded, e.g. by json_bytes
+        return json_bytes(content)
@@ -0,0 +1,88 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from app.core.config import ACCESS_TOKEN_EXPIRE_MINUTES, REVOCATION_SYNC_SECONDS
+
+
+class RevocationList:
+    """Per-process map of user id -> time before which their access tokens are void.
+
+    Revocations are written to ``token_revocations`` so every worker learns
+    about them; each worker pulls new rows at most every
+    ``REVOCATION_SYNC_SECONDS`` from the request path, so a check is normally
+    a dict lookup. Entries older than the access token lifetime are dropped
+    because any token they could reject has already expired.
+
+    ``revoked_at`` is stamped before the row commits, so a sync re-reads the
+    last ``COMMIT_LAG_SECONDS`` before its high-water mark to catch rows
+    that committed late (or came from a worker with a slightly slow clock).
+    """
+
+    COMMIT_LAG_SECONDS = 60
+
+    def __init__(self, sync_seconds: int = REVOCATION_SYNC_SECONDS,
+                 ttl_seconds: int = ACCESS_TOKEN_EXPIRE_MINUTES * 60):
+        self.sync_seconds = sync_seconds
+        self.ttl_seconds = ttl_seconds
+        self._revoked: dict[str, float] = {}
+        self._last_sync = 0.0
+        self._high_water: datetime | None = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def add(self, user_id: str, revoked_at: float | None = None):
+        ts = revoked_at if revoked_at is not None else time.time()
+        with self._lock:
+            if ts > self._revoked.get(user_id, 0):
+                self._revoked[user_id] = ts
+
+    def is_revoked(self, user_id: str, issued_at: float | None) -> bool:
+        self._maybe_sync()
+        ts = self._revoked.get(user_id)
+        if ts is None:
+            return False
+        return issued_at is None or issued_at <= ts
+
+    def _maybe_sync(self):
+        if time.monotonic() - self._last_sync < self.sync_seconds:
+            return
+        self.sync()
+
+    def sync(self):
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._sync()
+        except Exception:
+            # A failed sync keeps serving the current list; try again next interval.
+            pass
+        finally:
+            self._last_sync = time.monotonic()
+            self._sync_lock.release()
+
+    def _sync(self):
+        from app.db.session import SessionLocal
+        from app.models.models import TokenRevocation
+
+        since = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        if self._high_water is not None:
+            since = max(since, self._high_water - timedelta(seconds=self.COMMIT_LAG_SECONDS))
+        db = SessionLocal()
+        try:
+            rows = db.query(TokenRevocation.user_id, TokenRevocation.revoked_at).filter(
+                TokenRevocation.revoked_at >= since
+            ).all()
+        finally:
+            db.close()
+        for user_id, revoked_at in rows:
+            self.add(user_id, (revoked_at - datetime(1970, 1, 1)).total_seconds())
+            if self._high_water is None or revoked_at > self._high_water:
+                self._high_water = revoked_at
+
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            for user_id in [u for u, ts in self._revoked.items() if ts < cutoff]:
+                del self._revoked[user_id]
+
+
+revocations = RevocationList()
@@ -0,0 +1,186 @@
+"""Fingerprinted, precompressed static assets.
+
+``build_assets`` copies ``app/static/{css,js,images}`` into ``app/static/dist``
+under content-hashed names, writes ``.gz``/``.br`` siblings for text assets
+and resized/WebP variants for images, and records everything in
+``dist/manifest.json``. It is incremental, so running it at startup after the
+Docker build step is cheap. ``/static/dist`` is served by
+``PrecompressedStaticFiles`` with immutable cache headers, and the index
+template resolves names through ``asset_url``/``asset_srcset``.
+
+    python -m app.core.static_assets
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import stat
+import tempfile
+from pathlib import Path
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+
+STATIC_DIR = Path("app/static")
+DIST_DIR = STATIC_DIR / "dist"
+SOURCE_DIRS = ("css", "js", "images")
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt"}
+IMAGE_TYPES = {".png", ".jpg", ".jpeg"}
+# Rendered widths: the login logo is at most 420 CSS px, the sidebar logo 210;
+# the doubles cover 2x screens.
+IMAGE_WIDTHS = (210, 420, 840)
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_manifest: dict = {"files": {}, "variants": {}}
+
+
+def _write_atomic(path: Path, data: bytes):
+    """Write via rename so concurrent workers building at startup never serve a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def _hashed_name(rel: Path, digest: str, suffix: str | None = None, width: int | None = None) -> Path:
+    tag = f"{digest}.{width}w" if width else digest
+    return rel.with_name(f"{rel.stem}.{tag}{suffix or rel.suffix}")
+
+
+def _precompress(target: Path, data: bytes):
+    gz = target.with_name(target.name + ".gz")
+    if not gz.exists():
+        _write_atomic(gz, gzip.compress(data, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return
+    br = target.with_name(target.name + ".br")
+    if not br.exists():
+        _write_atomic(br, brotli.compress(data, quality=11))
+
+
+def _image_variants(source: Path, rel: Path, digest: str, dist: Path) -> dict:
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+    variants = {"webp": {}, rel.suffix.lstrip(".").lower(): {}}
+    with Image.open(source) as im:
+        im.load()
+        full_width = im.width
+        widths = [w for w in IMAGE_WIDTHS if w < full_width] or [full_width]
+        for width in widths:
+            height = round(im.height * width / full_width)
+            resized = im if width == full_width else im.resize((width, height), Image.LANCZOS)
+            for fmt, suffix in (("webp", ".webp"), (None, rel.suffix)):
+                name = _hashed_name(rel, digest, suffix, width)
+                target = dist / name
+                if not target.exists():
+                    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+                    os.close(fd)
+                    os.chmod(tmp, 0o644)
+                    if fmt == "webp":
+                        resized.save(tmp, "WEBP", quality=82, method=6)
+                    else:
+                        resized.save(tmp, im.format, optimize=True)
+                    os.replace(tmp, target)
+                variants[fmt or rel.suffix.lstrip(".").lower()][width] = name.as_posix()
+    return variants
+
+
+def build_assets(static_dir: Path = STATIC_DIR, dist_dir: Path = DIST_DIR) -> dict:
+    files, variants = {}, {}
+    for top in SOURCE_DIRS:
+        for source in sorted((static_dir / top).rglob("*")):
+            if not source.is_file() or source.name.startswith("."):
+                continue
+            rel = source.relative_to(static_dir)
+            data = source.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            name = _hashed_name(rel, digest)
+            target = dist_dir / name
+            if not target.exists():
+                _write_atomic(target, data)
+            files[rel.as_posix()] = name.as_posix()
+            if rel.suffix in COMPRESSIBLE:
+                _precompress(target, data)
+            elif rel.suffix.lower() in IMAGE_TYPES:
+                variants[rel.as_posix()] = _image_variants(source, rel, digest, dist_dir)
+    manifest = {"files": files, "variants": variants}
+    _write_atomic(dist_dir / "manifest.json", json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+def load_manifest(dist_dir: Path = DIST_DIR):
+    global _manifest
+    try:
+        _manifest = json.loads((dist_dir / "manifest.json").read_text())
+    except (OSError, ValueError):
+        _manifest = {"files": {}, "variants": {}}
+
+
+def asset_url(path: str, width: int | None = None, fmt: str | None = None) -> str:
+    """URL for a source asset under app/static, falling back to the unhashed file."""
+    if width or fmt:
+        by_width = _manifest["variants"].get(path, {}).get(fmt or Path(path).suffix.lstrip(".").lower(), {})
+        name = by_width.get(str(width)) if width else None
+        if name:
+            return f"/static/dist/{name}"
+    name = _manifest["files"].get(path)
+    return f"/static/dist/{name}" if name else f"/static/{path}"
+
+
+def asset_srcset(path: str, fmt: str | None = None) -> str:
+    by_width = _manifest["variants"].get(path, {}).get(fmt or Path(path).suffix.lstrip(".").lower(), {})
+    return ", ".join(f"/static/dist/{name} {width}w" for width, name in sorted(by_width.items(), key=lambda i: int(i[0])))
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """Serves fingerprinted files, preferring a ``.br``/``.gz`` sibling the client accepts."""
+
+    async def get_response(self, path, scope):
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await run_in_threadpool(self.lookup_path, path + suffix)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            return FileResponse(full_path, stat_result=stat_result, media_type=media_type, headers={
+                "Content-Encoding": encoding,
+                "Cache-Control": IMMUTABLE,
+                "Vary": "Accept-Encoding",
+            })
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = IMMUTABLE
+            if Path(path).suffix in COMPRESSIBLE:
+                response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+if __name__ == "__main__":
+    result = build_assets()
+    print(f"Built {len(result['files'])} assets into {DIST_DIR}")
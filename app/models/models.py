@@ -1,8 +1,8 @@
 import uuid
 from datetime import datetime
 from sqlalchemy import (
-    Column, String, Integer, Float, Boolean, Text, DateTime, ForeignKey,
-    Enum as SAEnum, Index, UniqueConstraint
+    Column, String, Integer, BigInteger, Float, Boolean, Text, DateTime, ForeignKey,
+    Enum as SAEnum, FetchedValue, Index, UniqueConstraint
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
@@ -11,14 +11,15 @@ from app.models.base import Base
 import enum
 
 __all__ = [
-    "Org", "OrgType", "User", "OrgMember", "Project", "ProjectStatus",
+    "Org", "OrgType", "User", "OrgMember", "RefreshToken", "TokenRevocation",
+    "Project", "ProjectStatus",
     "WorkPackage", "TaskType", "Task", "TaskStatus", "FieldEntry",
-    "Attachment", "AuditLog", "RoleName", "InspectionStatus",
+    "Attachment", "Blob", "SyncTombstone", "AuditLog", "TableVersion", "RoleName", "InspectionStatus",
     "InspectionTemplate", "Inspection", "ImportBatch", "ProjectBudget",
     "Material", "TaskMaterial", "Activity", "Document", "DocumentVersion",
     "SavedMapView", "UserProfile", "OrgInvite", "InvoiceStatus",
     "Invoice", "InvoiceLineItem", "RateCard", "Payment", "ChangeOrder",
-    "Crew", "CrewMember", "DispatchJob", "DispatchJobStatus",
+    "Crew", "CrewMember", "DispatchJob", "DispatchJobStatus", "DispatchEventSeq", "DispatchEvent",
     "AssetStatus", "AssetCategory", "Asset", "AssetAllocation",
     "AssetIncident", "AssetMaintenance", "FleetVehicle", "FleetVehicleStatus",
     "FleetTelemetry", "TechnicianLocation", "TelematicsIntegration",
@@ -106,6 +107,12 @@ def gen_uuid():
     return str(uuid.uuid4())
 
 
+class ChangeTracked:
+    """Columns stamped by database triggers for the delta-sync feed (see ``app.services.change_feed``)."""
+    change_txid = Column(BigInteger, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    change_seq = Column(BigInteger, server_default=FetchedValue(), server_onupdate=FetchedValue())
+
+
 class Org(Base):
     __tablename__ = "orgs"
 
@@ -149,6 +156,38 @@ class OrgMember(Base):
     )
 
 
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
+    user_id = Column(UUID(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    family_id = Column(UUID(as_uuid=False), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("idx_refresh_user", "user_id"),
+        Index("idx_refresh_family", "family_id"),
+    )
+
+
+class TokenRevocation(Base):
+    __tablename__ = "token_revocations"
+
+    id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
+    user_id = Column(UUID(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    reason = Column(String(100), nullable=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("idx_token_revocation_time", "revoked_at"),
+    )
+
+
 class Project(Base):
     __tablename__ = "projects"
 
@@ -189,12 +228,13 @@ class TaskType(Base):
     description = Column(Text, nullable=True)
     unit = Column(String(50), nullable=False, default="feet")
     color = Column(String(7), nullable=True, default="#3B82F6")
+    gps_deviation_m = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     tasks = relationship("Task", back_populates="task_type")
 
 
-class Task(Base):
+class Task(ChangeTracked, Base):
     __tablename__ = "tasks"
 
     id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
@@ -235,7 +275,7 @@ class Task(Base):
     )
 
 
-class FieldEntry(Base):
+class FieldEntry(ChangeTracked, Base):
     __tablename__ = "field_entries"
 
     id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
@@ -256,7 +296,7 @@ class FieldEntry(Base):
     user = relationship("User")
 
 
-class Attachment(Base):
+class Attachment(ChangeTracked, Base):
     __tablename__ = "attachments"
 
     id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
@@ -266,6 +306,8 @@ class Attachment(Base):
     file_path = Column(String(500), nullable=False)
     file_type = Column(String(100), nullable=True)
     file_size = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    thumbnail_sizes = Column(String(100), nullable=True)
     uploaded_by = Column(UUID(as_uuid=False), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -274,6 +316,40 @@ class Attachment(Base):
     user = relationship("User")
 
 
+class Blob(Base):
+    """One stored file per SHA-256, shared by every attachment/document version with that content."""
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    key = Column(String(255), nullable=False)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String(100), nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("idx_blobs_unreferenced", "updated_at", postgresql_where=(ref_count == 0)),
+    )
+
+
+class SyncTombstone(Base):
+    """A deleted change-tracked row, written by trigger so cascaded deletes are caught too."""
+    __tablename__ = "sync_tombstones"
+
+    change_seq = Column(BigInteger, primary_key=True, autoincrement=False)
+    change_txid = Column(BigInteger, nullable=False)
+    entity = Column(String(50), nullable=False)
+    entity_id = Column(UUID(as_uuid=False), nullable=False)
+    project_id = Column(UUID(as_uuid=False), nullable=False)
+    deleted_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("idx_sync_tombstones_project", "project_id", "change_txid", "change_seq"),
+        Index("idx_sync_tombstones_deleted", "deleted_at"),
+    )
+
+
 class InspectionStatus(str, enum.Enum):
     PENDING = "pending"
     IN_PROGRESS = "in_progress"
@@ -292,7 +368,7 @@ class InspectionTemplate(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
-class Inspection(Base):
+class Inspection(ChangeTracked, Base):
     __tablename__ = "inspections"
 
     id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
@@ -329,6 +405,14 @@ class AuditLog(Base):
     )
 
 
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    table_name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class ImportBatch(Base):
     __tablename__ = "import_batches"
 
@@ -446,6 +530,7 @@ class DocumentVersion(Base):
     version_number = Column(Integer, nullable=False)
     file_path = Column(String(500), nullable=False)
     file_size = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True)
     change_notes = Column(Text, nullable=True)
     uploaded_by = Column(UUID(as_uuid=False), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -693,7 +778,7 @@ class CrewMember(Base):
     )
 
 
-class DispatchJob(Base):
+class DispatchJob(ChangeTracked, Base):
     __tablename__ = "dispatch_jobs"
 
     id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
@@ -729,10 +814,32 @@ class DispatchJob(Base):
     __table_args__ = (
         Index("idx_dispatch_project", "project_id"),
         Index("idx_dispatch_crew_date", "crew_id", "scheduled_start"),
+        # Timeline windows: jobs ending after the window start, per crew. Ordering by
+        # end skips a crew's history; start is checked without visiting the heap.
+        Index("idx_dispatch_crew_window", "crew_id", "scheduled_end", "scheduled_start"),
+        Index("idx_dispatch_unassigned", "project_id", "created_at", postgresql_where=(crew_id.is_(None))),
         Index("idx_dispatch_status", "status"),
     )
 
 
+class DispatchEventSeq(Base):
+    """Last sequence number handed to a dispatch board event, per org."""
+    __tablename__ = "dispatch_event_seqs"
+
+    org_id = Column(UUID(as_uuid=False), ForeignKey("orgs.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(BigInteger, nullable=False, default=0)
+
+
+class DispatchEvent(Base):
+    """A published dispatch board event, kept for reconnect replay when DISPATCH_REPLAY_PERSIST is on."""
+    __tablename__ = "dispatch_events"
+
+    org_id = Column(UUID(as_uuid=False), ForeignKey("orgs.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(BigInteger, primary_key=True, autoincrement=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
 class AssetStatus(str, enum.Enum):
     AVAILABLE = "available"
     ASSIGNED = "assigned"
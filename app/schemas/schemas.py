@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from typing import Optional
 
@@ -10,7 +10,13 @@ class LoginRequest(BaseModel):
 
 class TokenResponse(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
+    expires_in: Optional[int] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class UserCreate(BaseModel):
@@ -119,6 +125,15 @@ class TaskTypeCreate(BaseModel):
     description: Optional[str] = None
     unit: str = "feet"
     color: Optional[str] = "#3B82F6"
+    gps_deviation_m: Optional[float] = Field(None, gt=0)
+
+
+class TaskTypeUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    unit: Optional[str] = None
+    color: Optional[str] = None
+    gps_deviation_m: Optional[float] = Field(None, gt=0)
 
 
 class TaskTypeResponse(BaseModel):
@@ -127,6 +142,7 @@ class TaskTypeResponse(BaseModel):
     description: Optional[str]
     unit: str
     color: Optional[str]
+    gps_deviation_m: Optional[float] = None
     created_at: datetime
 
     class Config:
@@ -219,6 +235,25 @@ class FieldEntryResponse(BaseModel):
         from_attributes = True
 
 
+class FieldEntrySyncRequest(BaseModel):
+    entries: list[FieldEntryCreate]
+
+
+class FieldEntrySyncResult(BaseModel):
+    index: int
+    offline_client_id: Optional[str] = None
+    status: str  # created | duplicate | error
+    entry: Optional[FieldEntryResponse] = None
+    error: Optional[str] = None
+
+
+class FieldEntrySyncResponse(BaseModel):
+    created: int
+    duplicates: int
+    errors: int
+    results: list[FieldEntrySyncResult]
+
+
 class ImportError(BaseModel):
     row: int
     message: str
@@ -235,6 +270,7 @@ class AttachmentResponse(BaseModel):
     file_path: str
     file_type: Optional[str]
     file_size: Optional[int]
+    thumbnails: Optional[dict[str, str]] = None
     created_at: datetime
 
     class Config:
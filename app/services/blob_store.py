@@ -0,0 +1,302 @@
+"""Content-addressed storage for uploaded files.
+
+Files are stored once per SHA-256 under a key derived from the hash. A
+``Blob`` row counts how many ``Attachment``/``DocumentVersion`` rows point
+at it. Uploads are streamed to ``temp_path()`` and handed to ``adopt``;
+deletes call ``release``. A blob whose count reaches zero is kept for
+``BLOB_GC_GRACE_SECONDS`` and then removed by ``collect_garbage``, so an
+offline retry re-uploading the same photo right after a delete never races
+with the file being unlinked.
+
+Rows store ``blob:<key>`` in ``file_path`` rather than a URL, which on S3
+would be a presigned link that expires; ``file_url`` makes the link when a
+row is read.
+
+The backend is pluggable: ``LocalBackend`` writes under
+``app/static/uploads/blobs`` (served by the ``/static`` mount), and
+``S3Backend`` talks to any S3-compatible endpoint through boto3.
+
+    python -m app.services.blob_store gc
+    python -m app.services.blob_store relink
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.config import (
+    BLOB_BACKEND, BLOB_GC_GRACE_SECONDS, BLOB_PUBLIC_URL,
+    BLOB_S3_BUCKET, BLOB_S3_ENDPOINT_URL, BLOB_S3_PREFIX, THUMBNAIL_SIZES,
+)
+from app.models.models import Blob
+from app.services.upload_service import StoredUpload
+
+UPLOAD_ROOT = os.path.join("app", "static", "uploads")
+TEMP_DIR = os.path.join(UPLOAD_ROOT, "tmp")
+GC_INTERVAL_SECONDS = 300
+_last_gc = 0.0
+# The extension lets the /static mount serve local blobs with the right type.
+BLOB_REF_PREFIX = "blob:"
+_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "application/pdf": ".pdf"}
+
+
+def blob_key(sha256: str, content_type: str | None = None) -> str:
+    ext = _EXTENSIONS.get(content_type or "") or ""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+def blob_ref(key: str) -> str:
+    return BLOB_REF_PREFIX + key
+
+
+def file_url(file_path: str | None) -> str | None:
+    """A link for a stored ``file_path``: blob refs get a fresh URL, older values are returned as stored."""
+    if file_path and file_path.startswith(BLOB_REF_PREFIX):
+        return backend.url(file_path[len(BLOB_REF_PREFIX):])
+    return file_path
+
+
+def thumbnail_key(sha256: str, size: int) -> str:
+    """Thumbnails derive from the content, so they share the blob's lifetime and dedupe with it."""
+    return f"thumbs/{sha256[:2]}/{sha256[2:4]}/{sha256}-{size}.webp"
+
+
+class LocalBackend:
+    def __init__(self, root: str = os.path.join(UPLOAD_ROOT, "blobs"), url_prefix: str = "/static/uploads/blobs"):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip("/")
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.local_path(key))
+
+    def put_file(self, key: str, source_path: str, content_type: str | None = None):
+        target = self.local_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source_path, target)
+
+    def put_bytes(self, key: str, data: bytes, content_type: str | None = None):
+        target = self.local_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        part = f"{target}.{uuid.uuid4().hex}.part"
+        with open(part, "wb") as f:
+            f.write(data)
+        os.replace(part, target)
+
+    def read(self, key: str) -> bytes:
+        with open(self.local_path(key), "rb") as f:
+            return f.read()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+
+class S3Backend:
+    """S3-compatible backend (AWS, MinIO, R2...). ``client`` may be any object with boto3's S3 client API."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str | None = None,
+                 public_url: str | None = None, client=None):
+        if client is None:
+            import boto3
+            client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.public_url = (public_url or "").rstrip("/")
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def local_path(self, key: str) -> None:
+        return None
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put_file(self, key: str, source_path: str, content_type: str | None = None):
+        extra = {"ContentType": content_type} if content_type else {}
+        with open(source_path, "rb") as f:
+            self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=f, **extra)
+        os.remove(source_path)
+
+    def put_bytes(self, key: str, data: bytes, content_type: str | None = None):
+        extra = {"ContentType": content_type} if content_type else {}
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data, **extra)
+
+    def read(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))["Body"].read()
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{self._object_key(key)}"
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._object_key(key)}, ExpiresIn=3600,
+        )
+
+
+def _create_backend():
+    if BLOB_BACKEND == "s3":
+        return S3Backend(BLOB_S3_BUCKET, BLOB_S3_PREFIX, BLOB_S3_ENDPOINT_URL, BLOB_PUBLIC_URL)
+    return LocalBackend()
+
+
+backend = _create_backend()
+
+
+def temp_path() -> str:
+    """A fresh path for streaming an upload before it is adopted."""
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    return os.path.join(TEMP_DIR, f"{uuid.uuid4().hex}.part")
+
+
+def _put(key: str, source_path: str, content_type: str | None):
+    try:
+        if not backend.exists(key):
+            backend.put_file(key, source_path, content_type)
+    finally:
+        if os.path.exists(source_path):
+            os.remove(source_path)
+
+
+def claim(db: Session, stored: StoredUpload, content_type: str | None) -> str:
+    """Take one reference on the blob for ``stored.sha256`` and return its key.
+
+    The file at ``stored.path`` is moved into the backend if the blob is new
+    and discarded otherwise. The reference row stays locked until the caller
+    commits, so a concurrent ``collect_garbage`` can't remove the blob in
+    between. Callers claiming several uploads should go in hash order.
+    Blocks on the database and the backend; ``adopt`` is the async form.
+    """
+    table = Blob.__table__
+    stmt = insert(table).values(
+        sha256=stored.sha256, key=blob_key(stored.sha256, content_type), size=stored.size,
+        content_type=content_type, ref_count=1,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.sha256],
+        set_={"ref_count": table.c.ref_count + 1, "updated_at": datetime.utcnow()},
+    ).returning(table.c.key)
+    try:
+        key = db.execute(stmt).scalar_one()
+    except BaseException:
+        os.remove(stored.path)
+        raise
+    _put(key, stored.path, content_type)
+    return key
+
+
+async def adopt(db: Session, stored: StoredUpload, content_type: str | None) -> str:
+    """``claim`` from async code, in the threadpool."""
+    return await run_in_threadpool(claim, db, stored, content_type)
+
+
+def release(db: Session, sha256: str | None) -> bool:
+    """Drop one reference; False if ``sha256`` isn't a stored blob (a pre-blob-store upload).
+
+    The blob itself is removed later by ``collect_garbage``.
+    """
+    if not sha256:
+        return False
+    result = db.execute(
+        text("UPDATE blobs SET ref_count = GREATEST(ref_count - 1, 0), updated_at = :now WHERE sha256 = :sha"),
+        {"now": datetime.utcnow(), "sha": sha256},
+    )
+    return result.rowcount > 0
+
+
+def collect_garbage(db: Session, grace_seconds: int = BLOB_GC_GRACE_SECONDS, limit: int = 500) -> int:
+    """Remove unreferenced blobs older than the grace period; returns how many.
+
+    Objects are deleted while the rows are still locked. An ``adopt`` racing
+    for the same hash waits, then inserts a new row and finds the object gone,
+    so it uploads it again instead of referencing a blob about to vanish.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    rows = db.execute(
+        text("""
+            DELETE FROM blobs WHERE sha256 IN (
+                SELECT sha256 FROM blobs WHERE ref_count = 0 AND updated_at < :cutoff
+                ORDER BY updated_at LIMIT :limit FOR UPDATE SKIP LOCKED
+            ) RETURNING sha256, key
+        """),
+        {"cutoff": cutoff, "limit": limit},
+    ).all()
+    try:
+        for sha256, key in rows:
+            backend.delete(key)
+            for size in THUMBNAIL_SIZES:
+                backend.delete(thumbnail_key(sha256, size))
+    except BaseException:
+        db.rollback()  # the rows stay for the next run; adopt re-uploads anything already deleted
+        raise
+    db.commit()
+    return len(rows)
+
+
+def relink(db: Session) -> int:
+    """Point rows that stored a blob's URL (before blob refs) at the blob; returns how many."""
+    count = 0
+    for table in ("attachments", "document_versions"):
+        count += db.execute(text(f"""
+            UPDATE {table} r SET file_path = :prefix || b.key FROM blobs b
+            WHERE b.sha256 = r.content_hash AND r.file_path NOT LIKE :prefix || '%'
+              AND strpos(r.file_path, b.key) > 0
+        """), {"prefix": BLOB_REF_PREFIX}).rowcount
+    db.execute(text("""
+        UPDATE documents d SET file_path = v.file_path FROM document_versions v
+        WHERE v.document_id = d.id AND v.version_number = d.current_version
+          AND v.file_path LIKE :prefix || '%' AND d.file_path IS DISTINCT FROM v.file_path
+    """), {"prefix": BLOB_REF_PREFIX})
+    db.commit()
+    return count
+
+
+def collect_garbage_soon():
+    """Background-task entry point for delete endpoints; runs at most once per interval per process."""
+    global _last_gc
+    now = time.monotonic()
+    if now - _last_gc < GC_INTERVAL_SECONDS:
+        return
+    _last_gc = now
+    from app.db.session import SessionLocal
+    session = SessionLocal()
+    try:
+        collect_garbage(session)
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    import sys
+    from app.db.session import SessionLocal
+
+    if sys.argv[1:] not in (["gc"], ["relink"]):
+        sys.exit("usage: python -m app.services.blob_store gc|relink")
+    session = SessionLocal()
+    try:
+        if sys.argv[1] == "gc":
+            print(f"Removed {collect_garbage(session)} unreferenced blobs")
+        else:
+            print(f"Relinked {relink(session)} attachments and document versions")
+    finally:
+        session.close()
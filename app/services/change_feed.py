@@ -0,0 +1,213 @@
+"""Delta-sync change feed for offline and mobile clients.
+
+Every insert or update of a change-tracked row (tasks, field entries,
+dispatch jobs, inspections, attachments) is stamped by a trigger with the
+writing transaction's id and a value from ``sync_change_seq``. Deletes,
+including ones cascaded by the database, leave a ``sync_tombstones`` row
+scoped to the project.
+
+Clients page through changes in ``(change_txid, change_seq)`` order and
+keep the cursor returned by each page. ``updated_at`` is not used for
+ordering because it comes from each worker's clock. A plain sequence isn't
+enough either: a transaction can take a low number and commit after a
+higher one was already served. So each page stops at the oldest
+transaction still in flight (``pg_snapshot_xmin``). Everything before that
+is committed and nothing new can appear behind the cursor.
+
+Child rows of a deleted task are removed by cascade and get no tombstone
+of their own; clients drop them along with the task.
+
+    python -m app.services.change_feed prune
+"""
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, text, tuple_
+from sqlalchemy.orm import Session
+from geoalchemy2.functions import ST_AsGeoJSON
+from app.core.config import SYNC_TOMBSTONE_RETENTION_DAYS
+from app.core.responses import raw_json
+from app.models.models import Attachment, DispatchJob, FieldEntry, Inspection, SyncTombstone, Task
+from app.services import blob_store
+
+TRACKED_TABLES = ("tasks", "field_entries", "dispatch_jobs", "inspections", "attachments")
+
+# Appended to main.SCHEMA_COLUMNS/SCHEMA_INDEXES/SCHEMA_UPGRADES, which
+# workers apply one at a time; each statement is idempotent. Needs
+# PostgreSQL 13+.
+SCHEMA_COLUMNS = [(_table, column, "BIGINT") for _table in TRACKED_TABLES for column in ("change_txid", "change_seq")]
+SCHEMA_INDEXES = {f"idx_{_table}_change": f"{_table} (change_txid, change_seq)" for _table in TRACKED_TABLES}
+SCHEMA_STATEMENTS = [
+    "CREATE SEQUENCE IF NOT EXISTS sync_change_seq",
+    """
+    CREATE OR REPLACE FUNCTION sync_stamp_change() RETURNS trigger AS $$
+    BEGIN
+        NEW.change_txid := pg_current_xact_id()::text::bigint;
+        NEW.change_seq := nextval('sync_change_seq');
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION sync_record_delete() RETURNS trigger AS $$
+    DECLARE scope uuid;
+    BEGIN
+        IF TG_TABLE_NAME IN ('tasks', 'dispatch_jobs') THEN
+            scope := OLD.project_id;
+        ELSE
+            SELECT project_id INTO scope FROM tasks WHERE id = OLD.task_id;
+        END IF;
+        IF scope IS NOT NULL THEN
+            INSERT INTO sync_tombstones (change_seq, change_txid, entity, entity_id, project_id, deleted_at)
+            VALUES (nextval('sync_change_seq'), pg_current_xact_id()::text::bigint,
+                    TG_TABLE_NAME, OLD.id, scope, now() AT TIME ZONE 'utc');
+        END IF;
+        RETURN OLD;
+    END $$ LANGUAGE plpgsql
+    """,
+]
+for _table in TRACKED_TABLES:
+    SCHEMA_STATEMENTS += [
+        # Triggers are created once; DROP/CREATE on every boot would take an
+        # exclusive lock on busy tables. Rows written before the stamp trigger
+        # existed are backfilled then, and the trigger fills them in.
+        f"""
+        DO $$ BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'sync_stamp' AND tgrelid = '{_table}'::regclass) THEN
+                CREATE TRIGGER sync_stamp BEFORE INSERT OR UPDATE ON {_table}
+                    FOR EACH ROW EXECUTE FUNCTION sync_stamp_change();
+                UPDATE {_table} SET change_seq = 0 WHERE change_seq IS NULL;
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'sync_tombstone' AND tgrelid = '{_table}'::regclass) THEN
+                CREATE TRIGGER sync_tombstone AFTER DELETE ON {_table}
+                    FOR EACH ROW EXECUTE FUNCTION sync_record_delete();
+            END IF;
+        END $$
+        """,
+    ]
+
+
+class CursorExpired(Exception):
+    pass
+
+
+def _feeds(project_id: str):
+    """(name, model, columns, select) per change-tracked entity, scoped to one project."""
+    return [
+        ("tasks", Task, ("id", "name", "status", "task_type_id", "work_package_id", "planned_qty", "actual_qty",
+                         "unit", "priority", "assigned_to", "due_date", "updated_at", "geometry"),
+         select(Task.id, Task.name, Task.status, Task.task_type_id, Task.work_package_id, Task.planned_qty,
+                Task.actual_qty, Task.unit, Task.priority, Task.assigned_to, Task.due_date, Task.updated_at,
+                ST_AsGeoJSON(Task.geometry))
+         .where(Task.project_id == project_id)),
+        ("field_entries", FieldEntry, ("id", "task_id", "user_id", "qty_delta", "labor_hours", "notes",
+                                       "deviation_flags", "offline_client_id", "created_at"),
+         select(FieldEntry.id, FieldEntry.task_id, FieldEntry.user_id, FieldEntry.qty_delta, FieldEntry.labor_hours,
+                FieldEntry.notes, FieldEntry.deviation_flags, FieldEntry.offline_client_id, FieldEntry.created_at)
+         .join(Task, Task.id == FieldEntry.task_id).where(Task.project_id == project_id)),
+        ("dispatch_jobs", DispatchJob, ("id", "task_id", "crew_id", "title", "status", "priority", "job_type",
+                                        "scheduled_start", "scheduled_end", "location_lat", "location_lng", "updated_at"),
+         select(DispatchJob.id, DispatchJob.task_id, DispatchJob.crew_id, DispatchJob.title, DispatchJob.status,
+                DispatchJob.priority, DispatchJob.job_type, DispatchJob.scheduled_start, DispatchJob.scheduled_end,
+                DispatchJob.location_lat, DispatchJob.location_lng, DispatchJob.updated_at)
+         .where(DispatchJob.project_id == project_id)),
+        ("inspections", Inspection, ("id", "task_id", "template_id", "inspector_id", "status", "comments", "updated_at"),
+         select(Inspection.id, Inspection.task_id, Inspection.template_id, Inspection.inspector_id,
+                Inspection.status, Inspection.comments, Inspection.updated_at)
+         .join(Task, Task.id == Inspection.task_id).where(Task.project_id == project_id)),
+        ("attachments", Attachment, ("id", "task_id", "field_entry_id", "filename", "file_path", "file_type",
+                                     "thumbnail_sizes", "created_at"),
+         select(Attachment.id, Attachment.task_id, Attachment.field_entry_id, Attachment.filename,
+                Attachment.file_path, Attachment.file_type, Attachment.thumbnail_sizes, Attachment.created_at)
+         .join(Task, Task.id == Attachment.task_id).where(Task.project_id == project_id)),
+    ]
+
+
+def encode_cursor(txid: int, seq: int) -> str:
+    return f"{txid}.{seq}.{int(time.time())}"
+
+
+def decode_cursor(cursor: str | None) -> tuple[int, int]:
+    """``(txid, seq)`` to resume after; raises ``ValueError`` if malformed and ``CursorExpired`` if too old."""
+    if not cursor:
+        return (0, 0)
+    txid, seq, issued = (int(part) for part in cursor.split("."))
+    if time.time() - issued > SYNC_TOMBSTONE_RETENTION_DAYS * 86400:
+        raise CursorExpired()
+    return (txid, seq)
+
+
+def changes_since(db: Session, project_id: str, cursor: str | None, limit: int) -> dict:
+    """One page of changes after ``cursor``, encoded column-wise per entity."""
+    after = decode_cursor(cursor)
+    horizon = db.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar()
+
+    merged = []
+    full_feed = False
+    for name, model, _, query in _feeds(project_id):
+        key = tuple_(model.change_txid, model.change_seq)
+        rows = db.execute(
+            query.add_columns(model.change_txid, model.change_seq)
+            .where(key > tuple_(*after), model.change_txid < horizon)
+            .order_by(model.change_txid, model.change_seq)
+            .limit(limit)
+        ).all()
+        full_feed = full_feed or len(rows) == limit
+        merged.extend((row[-2], row[-1], name, row[:-2]) for row in rows)
+
+    tombstones = db.execute(
+        select(SyncTombstone.change_txid, SyncTombstone.change_seq, SyncTombstone.entity, SyncTombstone.entity_id)
+        .where(SyncTombstone.project_id == project_id,
+               tuple_(SyncTombstone.change_txid, SyncTombstone.change_seq) > tuple_(*after),
+               SyncTombstone.change_txid < horizon)
+        .order_by(SyncTombstone.change_txid, SyncTombstone.change_seq)
+        .limit(limit)
+    ).all()
+    full_feed = full_feed or len(tombstones) == limit
+    merged.extend((txid, seq, None, (entity, entity_id)) for txid, seq, entity, entity_id in tombstones)
+
+    # Each source returned its first ``limit`` rows, so the first ``limit`` of the merge are exact.
+    merged.sort(key=lambda item: (item[0], item[1]))
+    page = merged[:limit]
+
+    columns = {name: cols for name, _, cols, _ in _feeds(project_id)}
+    changes: dict[str, dict] = {}
+    deleted: dict[str, list[str]] = {}
+    for _, _, name, values in page:
+        if name is None:
+            entity, entity_id = values
+            deleted.setdefault(entity, []).append(entity_id)
+            continue
+        values = list(values)
+        if name == "tasks":
+            values[-1] = raw_json(values[-1])
+        elif name == "attachments":
+            at = columns[name].index("file_path")
+            values[at] = blob_store.file_url(values[at])
+        changes.setdefault(name, {"columns": columns[name], "rows": []})["rows"].append(values)
+
+    last = (page[-1][0], page[-1][1]) if page else after
+    return {
+        "cursor": encode_cursor(*last),
+        "has_more": len(merged) > limit or full_feed,
+        "changes": changes,
+        "deleted": deleted,
+    }
+
+
+def prune_tombstones(db: Session) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+    removed = db.query(SyncTombstone).filter(SyncTombstone.deleted_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+
+if __name__ == "__main__":
+    import sys
+    from app.db.session import SessionLocal
+
+    if sys.argv[1:] != ["prune"]:
+        sys.exit("usage: python -m app.services.change_feed prune")
+    session = SessionLocal()
+    try:
+        print(f"Removed {prune_tombstones(session)} tombstones")
+    finally:
+        session.close()
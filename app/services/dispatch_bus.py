@@ -0,0 +1,260 @@
+"""Cross-worker delivery of dispatch board events.
+
+Each uvicorn worker holds its own WebSocket connections, so an event
+published on one worker must reach the sockets on every other one. The
+``postgres`` bus does this with ``LISTEN/NOTIFY``:
+
+- Every worker keeps one dedicated listening connection, outside the pool.
+- Publishing runs ``pg_notify`` from the request's session, so nothing new
+  needs to be deployed.
+- The publishing worker gets its own events back through the listener like
+  everyone else.
+
+Events carry a sequence number per org, taken from ``dispatch_event_seqs``
+in the same transaction as the notify. The counter row stays locked until
+commit, and notifications go out in commit order. A board connected to an
+org therefore sees ``seq`` rise by exactly one, and any jump means it missed
+something. When the listener reconnects, it delivers a ``resync`` event,
+because notifications sent while it was down are gone.
+
+The ``memory`` bus does the same within one process, for tests and
+single-worker development.
+
+``history`` backs reconnect replay (see ``dispatch_replay``). It returns
+each org's latest seq, plus any events persisted to ``dispatch_events``.
+
+Both buses publish several ``(org_id, event)`` pairs at once with
+``publish_many``, in one transaction on the postgres bus. Its database work
+runs in the threadpool; ``publish_blocking`` is the same for callers that
+are already in a worker thread. Callers go in org order, so two publishers
+can't wait on each other's seq rows.
+
+A bus created with ``sequenced=False`` skips the seq and the persisted
+events. Live positions use one on their own channel: they are superseded
+by the next update, so there is nothing to replay.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from typing import Awaitable, Callable
+from anyio import from_thread
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.config import DISPATCH_BUS, DISPATCH_REPLAY_PERSIST, DISPATCH_REPLAY_SIZE
+
+CHANNEL = "dispatch_events"
+# NOTIFY payloads must stay under 8000 bytes; larger events lose their job bodies,
+# and events still too large become a resync for their org.
+MAX_PAYLOAD_BYTES = 7900
+
+# Receives each event both parsed, for routing, and as the JSON text sent to sockets.
+Deliver = Callable[[dict, str], Awaitable[None]]
+RESYNC = '{"type":"resync"}'
+
+
+def _dumps(event: dict) -> str:
+    return json.dumps(event, separators=(",", ":"), default=str)
+
+
+def _fits(payload: str) -> bool:
+    return len(payload.encode("utf-8")) <= MAX_PAYLOAD_BYTES
+
+
+def _encode(event: dict) -> str:
+    payload = _dumps(event)
+    if _fits(payload):
+        return payload
+    if "job" in event:
+        trimmed = {k: v for k, v in event.items() if k != "job"}
+        trimmed["job_id"] = event["job"].get("id")
+        payload = _dumps(trimmed)
+    elif "jobs" in event:
+        # Bulk changes keep only the ids; boards reload those jobs.
+        trimmed = {k: v for k, v in event.items() if k != "jobs"}
+        trimmed["job_ids"] = [job.get("id") for job in event["jobs"]]
+        payload = _dumps(trimmed)
+    if _fits(payload):
+        return payload
+    # Even the ids don't fit (hundreds of jobs across many crews): the org's boards reload.
+    return _dumps({"type": "resync", **{k: event[k] for k in ("org_id", "seq") if k in event}})
+
+
+class MemoryBus:
+    """Delivers to this process only."""
+
+    def __init__(self, sequenced: bool = True):
+        self.sequenced = sequenced
+        self._seqs: dict[str, int] = defaultdict(int)
+        self._deliver: Deliver | None = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        self._deliver = None
+
+    async def publish(self, db: Session, org_id: str, event: dict) -> dict:
+        return (await self.publish_many(db, [(org_id, event)]))[0]
+
+    async def publish_many(self, db: Session, events: list[tuple[str, dict]]) -> list[dict]:
+        envelopes = []
+        for org_id, event in events:
+            if self.sequenced:
+                self._seqs[org_id] += 1
+                event = {**event, "seq": self._seqs[org_id]}
+            payload = _encode({**event, "org_id": org_id})
+            envelope = json.loads(payload)
+            if self._deliver is not None:
+                await self._deliver(envelope, payload)
+            envelopes.append(envelope)
+        return envelopes
+
+    def publish_blocking(self, db: Session, events: list[tuple[str, dict]]) -> list[dict]:
+        return from_thread.run(self.publish_many, db, events)
+
+    async def history(self, resume: dict[str, int]) -> tuple[dict[str, int], dict[str, list]]:
+        return {org_id: self._seqs.get(org_id, 0) for org_id in resume}, {}
+
+
+class PostgresBus:
+    """``LISTEN/NOTIFY`` on ``channel``; one listening connection per worker."""
+
+    RECONNECT_MAX_SECONDS = 30
+
+    def __init__(self, dsn: str | None = None, persist: bool = DISPATCH_REPLAY_PERSIST,
+                 keep: int = DISPATCH_REPLAY_SIZE, channel: str = CHANNEL, sequenced: bool = True):
+        self.dsn = dsn
+        self.persist = persist and sequenced
+        self.keep = keep
+        self.channel = channel
+        self.sequenced = sequenced
+        self._deliver: Deliver | None = None
+        self._task: asyncio.Task | None = None
+        self.listening = False
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, db: Session, org_id: str, event: dict) -> dict:
+        return (await self.publish_many(db, [(org_id, event)]))[0]
+
+    async def publish_many(self, db: Session, events: list[tuple[str, dict]]) -> list[dict]:
+        return await run_in_threadpool(self.publish_blocking, db, events)
+
+    def publish_blocking(self, db: Session, events: list[tuple[str, dict]]) -> list[dict]:
+        """Notify every event and commit once; subscribers, this worker included, get them via LISTEN."""
+        payloads = [self._notify(db, org_id, event) for org_id, event in events]
+        db.commit()
+        return [json.loads(payload) for payload in payloads]
+
+    def _notify(self, db: Session, org_id: str, event: dict) -> str:
+        if not self.sequenced:
+            payload = _encode({**event, "org_id": org_id})
+            db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+            return payload
+        seq = db.execute(text(
+            "INSERT INTO dispatch_event_seqs (org_id, seq) VALUES (:org_id, 1) "
+            "ON CONFLICT (org_id) DO UPDATE SET seq = dispatch_event_seqs.seq + 1 RETURNING seq"
+        ), {"org_id": org_id}).scalar()
+        payload = _encode({**event, "org_id": org_id, "seq": seq})
+        if self.persist:
+            db.execute(text(
+                "INSERT INTO dispatch_events (org_id, seq, payload, created_at) "
+                "VALUES (:org_id, :seq, :payload, now() AT TIME ZONE 'utc')"
+            ), {"org_id": org_id, "seq": seq, "payload": payload})
+            if seq % 50 == 0:
+                db.execute(text("DELETE FROM dispatch_events WHERE org_id = :org_id AND seq <= :oldest"),
+                           {"org_id": org_id, "oldest": seq - self.keep})
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+        return payload
+
+    async def history(self, resume: dict[str, int]) -> tuple[dict[str, int], dict[str, list]]:
+        return await run_in_threadpool(self._history, resume)
+
+    def _history(self, resume: dict[str, int]):
+        from app.db.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            current = dict(db.execute(
+                text("SELECT org_id, seq FROM dispatch_event_seqs WHERE org_id = ANY(CAST(:orgs AS uuid[]))"),
+                {"orgs": list(resume)},
+            ).all())
+            current = {org_id: current.get(org_id, 0) for org_id in resume}
+            stored = {}
+            for org_id, after in resume.items():
+                if not self.persist or after >= current[org_id]:
+                    continue
+                rows = db.execute(text(
+                    "SELECT seq, payload FROM dispatch_events WHERE org_id = :org_id AND seq > :after "
+                    "ORDER BY seq LIMIT :keep"
+                ), {"org_id": org_id, "after": after, "keep": self.keep}).all()
+                stored[org_id] = [(seq, json.loads(payload), payload) for seq, payload in rows]
+            return current, stored
+        finally:
+            db.close()
+
+    def _connect(self):
+        import psycopg2
+        from app.db.session import engine
+
+        dsn = self.dsn or engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        # Keepalives let libpq notice a dead server; the socket then reads as an error and we reconnect.
+        conn = psycopg2.connect(dsn, keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        return conn
+
+    async def _listen(self):
+        loop = asyncio.get_running_loop()
+        delay, connected_before = 1, False
+        while True:
+            try:
+                conn = await run_in_threadpool(self._connect)
+            except Exception as e:
+                print(f"Event bus {self.channel}: listen failed ({e}); retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+                continue
+            delay = 1
+            if connected_before:
+                await self._deliver(json.loads(RESYNC), RESYNC)
+            connected_before = True
+            readable, fd = asyncio.Event(), conn.fileno()
+            loop.add_reader(fd, readable.set)
+            self.listening = True
+            try:
+                while True:
+                    await readable.wait()
+                    readable.clear()
+                    conn.poll()
+                    while conn.notifies:
+                        payload = conn.notifies.pop(0).payload
+                        await self._deliver(json.loads(payload), payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event bus {self.channel}: listener lost ({e}); reconnecting")
+            finally:
+                self.listening = False
+                loop.remove_reader(fd)
+                conn.close()
+
+
+def create_bus(channel: str = CHANNEL, sequenced: bool = True):
+    if DISPATCH_BUS == "memory":
+        return MemoryBus(sequenced=sequenced)
+    return PostgresBus(channel=channel, sequenced=sequenced)
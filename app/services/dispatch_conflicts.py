@@ -0,0 +1,154 @@
+"""Double-booking and over-capacity checks for crew schedules.
+
+There are two kinds of conflict:
+
+- ``overlap``: two of a crew's jobs share time.
+- ``over_capacity``: a crew has more jobs starting on one day than its
+  ``max_jobs_per_day``.
+
+Cancelled jobs never count. A job needs both ``scheduled_start`` and
+``scheduled_end`` to be checked for overlaps. It only needs a start to
+count toward a day.
+
+A single booking is checked in the database. ``idx_dispatch_crew_window``
+turns "this crew's jobs ending after ``start``" into an index range scan,
+so the check costs O(log n + k) whatever the crew's history. A date range
+is checked in memory with a sweep over each crew's jobs sorted by start,
+in O(n log n) for n jobs.
+"""
+import heapq
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import or_, true
+from sqlalchemy.orm import Session
+from app.models.models import Crew, DispatchJob, DispatchJobStatus
+
+
+@dataclass(frozen=True)
+class Booking:
+    id: str
+    crew_id: str
+    start: datetime
+    end: datetime | None
+    title: str | None = None
+
+
+def _overlap(crew_id: str, a: Booking, b: Booking) -> dict:
+    return {
+        "type": "overlap",
+        "crew_id": crew_id,
+        "job_ids": [a.id, b.id],
+        "titles": [a.title, b.title],
+        "start": max(a.start, b.start).isoformat(),
+        "end": min(a.end, b.end).isoformat(),
+    }
+
+
+def _over_capacity(crew_id: str, day: date, job_ids: list[str], limit: int) -> dict:
+    return {"type": "over_capacity", "crew_id": crew_id, "date": day.isoformat(), "job_ids": job_ids, "limit": limit}
+
+
+def find_conflicts(bookings: list[Booking], limits: dict[str, int]) -> list[dict]:
+    """Every overlapping pair and over-full day among ``bookings``; ``limits`` is max jobs per day by crew."""
+    by_crew: dict[str, list[Booking]] = {}
+    for b in bookings:
+        by_crew.setdefault(b.crew_id, []).append(b)
+
+    conflicts = []
+    for crew_id, crew_bookings in by_crew.items():
+        crew_bookings.sort(key=lambda b: (b.start, b.id))
+        active: list[tuple[datetime, str, Booking]] = []  # min-heap by end
+        for b in crew_bookings:
+            if b.end is None:
+                continue
+            while active and active[0][0] <= b.start:
+                heapq.heappop(active)
+            conflicts.extend(_overlap(crew_id, other, b) for _, _, other in sorted(active, key=lambda a: a[2].start))
+            heapq.heappush(active, (b.end, b.id, b))
+
+        limit = limits.get(crew_id)
+        if limit:
+            per_day: dict[date, list[str]] = {}
+            for b in crew_bookings:
+                per_day.setdefault(b.start.date(), []).append(b.id)
+            conflicts.extend(_over_capacity(crew_id, day, ids, limit)
+                             for day, ids in sorted(per_day.items()) if len(ids) > limit)
+    return conflicts
+
+
+def live_jobs(query):
+    """Restrict ``query`` to jobs that take up a crew's time; the scheduler counts the same ones."""
+    return query.filter(DispatchJob.status != DispatchJobStatus.CANCELLED)
+
+
+def check_booking(db: Session, crew_id: str, job_id: str | None, start: datetime | None,
+                  end: datetime | None) -> list[dict]:
+    """Conflicts that booking ``job_id`` onto the crew for ``start``-``end`` would cause.
+
+    Locks the crew row until the transaction ends, so two requests booking
+    the same crew are checked one after the other.
+    """
+    if start is None:
+        return []
+    crew = db.query(Crew).filter(Crew.id == crew_id).with_for_update().first()
+    if crew is None:
+        return []
+    candidate = Booking(job_id, crew_id, start, end)
+    others = DispatchJob.id != job_id if job_id else true()
+
+    conflicts = []
+    if end is not None:
+        overlapping = live_jobs(db.query(DispatchJob.id, DispatchJob.scheduled_start, DispatchJob.scheduled_end,
+                                     DispatchJob.title)).filter(
+            DispatchJob.crew_id == crew_id,
+            DispatchJob.scheduled_end > start,
+            DispatchJob.scheduled_start < end,
+            others,
+        ).order_by(DispatchJob.scheduled_start).all()
+        conflicts.extend(_overlap(crew_id, Booking(job, crew_id, s, e, title), candidate)
+                         for job, s, e, title in overlapping)
+
+    if crew.max_jobs_per_day:
+        day_start = datetime.combine(start.date(), time.min)
+        same_day = live_jobs(db.query(DispatchJob.id)).filter(
+            DispatchJob.crew_id == crew_id,
+            DispatchJob.scheduled_start >= day_start,
+            DispatchJob.scheduled_start < day_start + timedelta(days=1),
+            others,
+        ).all()
+        if len(same_day) + 1 > crew.max_jobs_per_day:
+            job_ids = [r.id for r in same_day] + ([job_id] if job_id else [])
+            conflicts.append(_over_capacity(crew_id, start.date(), job_ids, crew.max_jobs_per_day))
+    return conflicts
+
+
+def describe(conflicts: list[dict]) -> str:
+    parts = []
+    for c in conflicts:
+        if c["type"] == "overlap":
+            other = c["titles"][0] or c["job_ids"][0]
+            parts.append(f"overlaps '{other}' from {c['start'][11:16]} to {c['end'][11:16]}")
+        else:
+            parts.append(f"the crew is limited to {c['limit']} jobs on {c['date']}")
+    return "Scheduling conflict: " + "; ".join(parts)
+
+
+def conflicts_in_range(db: Session, org_id: str, start: datetime, end: datetime,
+                       crew_ids: list[str] | None = None) -> list[dict]:
+    """Every conflict among the org's crews' jobs that start in ``start``-``end``."""
+    crews = db.query(Crew.id, Crew.max_jobs_per_day).filter(Crew.org_id == org_id)
+    if crew_ids:
+        crews = crews.filter(Crew.id.in_(crew_ids))
+    limits = dict(crews.all())
+    if not limits:
+        return []
+    # Jobs that started before the range but run into it still overlap with jobs inside it.
+    rows = live_jobs(db.query(DispatchJob.id, DispatchJob.crew_id, DispatchJob.scheduled_start,
+                          DispatchJob.scheduled_end, DispatchJob.title)).filter(
+        DispatchJob.crew_id.in_(list(limits)),
+        DispatchJob.scheduled_start < end,
+        or_(DispatchJob.scheduled_end > start, DispatchJob.scheduled_start >= start),
+    ).all()
+    first_day = start.date().isoformat()
+    return [c for c in find_conflicts([Booking(*row) for row in rows], limits)
+            if c["type"] == "overlap" or c["date"] >= first_day]
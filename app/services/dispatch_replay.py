@@ -0,0 +1,58 @@
+"""Recent dispatch events per org, for boards that reconnect.
+
+A client keeps the last ``seq`` it saw for each org and sends it as
+``"resume": {org_id: seq}`` on its ``auth`` message. It then receives only
+the events it missed. If any of them is no longer held, it gets a single
+``resync`` instead and reloads the timeline.
+
+Every worker hears every event through the bus, so each one keeps the
+latest ``DISPATCH_REPLAY_SIZE`` per org in memory. A worker that has just
+started has nothing in memory yet. With ``DISPATCH_REPLAY_PERSIST`` on, the
+Postgres bus also writes events to ``dispatch_events``, trimmed to the same
+size, and missing history is read back from there.
+"""
+from collections import deque
+from app.core.config import DISPATCH_REPLAY_SIZE
+
+Held = tuple[int, dict, str]  # (seq, event, frame)
+
+
+class ReplayBuffer:
+    """The last ``size`` events of each org, contiguous in ``seq``."""
+
+    def __init__(self, size: int = DISPATCH_REPLAY_SIZE):
+        self.size = size
+        self._orgs: dict[str, deque[Held]] = {}
+
+    def record(self, event: dict, frame: str):
+        org_id, seq = event.get("org_id"), event.get("seq")
+        if org_id is None or seq is None:
+            return
+        ring = self._orgs.get(org_id)
+        if ring is None:
+            ring = self._orgs[org_id] = deque(maxlen=self.size)
+        elif ring and seq != ring[-1][0] + 1:
+            ring.clear()  # something was missed; only what follows can be vouched for
+        ring.append((seq, event, frame))
+
+    def clear(self):
+        """Forget everything, e.g. after the bus lost notifications."""
+        self._orgs.clear()
+
+    def after(self, org_id: str, after: int) -> list[Held]:
+        return [held for held in self._orgs.get(org_id, ()) if held[0] > after]
+
+
+def missed_events(after: int, current: int, held: list[Held]) -> list[Held] | None:
+    """Events with ``seq > after``, in order, or None if any are missing.
+
+    ``current`` is the org's latest seq as far as the bus knows. ``held``
+    may overlap and come from several sources.
+    """
+    if after > current:
+        return None  # the counter went backwards; the client's seq means nothing now
+    by_seq = {seq: (seq, event, frame) for seq, event, frame in held if seq > after}
+    upper = max([current, *by_seq])
+    if any(seq not in by_seq for seq in range(after + 1, upper + 1)):
+        return None
+    return [by_seq[seq] for seq in range(after + 1, upper + 1)]
@@ -0,0 +1,268 @@
+"""Automatic crew assignment for unassigned dispatch jobs.
+
+Each crew-day is a route of stops inside the working day. It starts at the
+crew's current position, and its already-scheduled jobs are fixed stops.
+Jobs are only placed in the free time between stops, so nothing already on
+the board moves. A job fits a crew when the crew lists its ``job_type`` in
+``skills``, or lists no skills at all. It also needs the crew to have
+``max_jobs_per_day`` room that day (no limit when it is unset), and a gap long enough for the travel in
+and out plus the job.
+
+The solver runs in two passes:
+
+1. Construction inserts jobs in priority order, jobs with a time window
+   before those without, then longest first. Each goes to the cheapest
+   feasible spot, where cost is the added drive time plus a per-day delay
+   penalty scaled by priority. Critical work lands early; low-priority
+   work may wait a day to save a long drive.
+2. Improvement repeatedly takes each placed job out and puts it back in the
+   cheapest spot, which may be on another crew. Unplaced jobs get another
+   chance after each round. It stops at a local optimum or when the time
+   budget runs out.
+
+The module is pure: the API layer loads ``JobSpec``/``CrewSpec`` and
+applies the returned ``Placement``s.
+"""
+import math
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as clock, timedelta
+from app.services.travel import Point, travel_minutes
+
+DEFAULT_JOB_HOURS = 2.0
+SLOT_MINUTES = 5  # start times are rounded up to this
+PRIORITY_WEIGHT = {"critical": 8, "high": 4, "medium": 2, "low": 1}
+# Cost, in drive-minutes, of pushing a job back one day.
+DAY_DELAY_MINUTES = {"critical": 480, "high": 240, "medium": 60, "low": 15}
+
+
+def normalize_skill(value: str | None) -> str:
+    return re.sub(r"[\s\-]+", "_", (value or "").strip().lower())
+
+
+def parse_skills(value: str | None) -> frozenset[str]:
+    return frozenset(s for s in (normalize_skill(part) for part in (value or "").split(",")) if s)
+
+
+@dataclass
+class JobSpec:
+    id: str
+    job_type: str | None
+    duration_min: float
+    priority: str
+    location: Point | None
+    window_start: datetime | None = None
+    window_end: datetime | None = None
+
+
+@dataclass
+class Stop:
+    job_id: str
+    start: datetime
+    end: datetime
+    location: Point | None
+    fixed: bool
+
+
+@dataclass
+class CrewSpec:
+    id: str
+    skills: frozenset[str]
+    max_jobs_per_day: int | None
+    origin: Point | None
+    busy: list[Stop] = field(default_factory=list)  # already-scheduled jobs
+
+
+@dataclass
+class CrewDay:
+    crew_id: str
+    day_index: int
+    shift_start: datetime
+    shift_end: datetime
+    capacity: int | None  # None: no daily limit
+    origin: Point | None
+    stops: list[Stop]
+
+    def placed(self) -> int:
+        return sum(1 for s in self.stops if not s.fixed)
+
+
+@dataclass
+class Placement:
+    job_id: str
+    crew_id: str
+    start: datetime
+    end: datetime
+    travel_minutes: float
+
+
+@dataclass
+class Schedule:
+    placements: list[Placement]
+    unassigned: dict[str, str]  # job id -> reason
+    travel_minutes: float
+    rounds: int
+    elapsed_ms: int
+
+
+@dataclass
+class _Option:
+    cost: float
+    day: CrewDay
+    index: int
+    start: datetime
+    end: datetime
+    travel: float
+
+
+def round_to_slot(dt: datetime) -> datetime:
+    """``dt`` rounded up to the next ``SLOT_MINUTES`` boundary."""
+    minutes = math.ceil((dt.minute + dt.second / 60 + dt.microsecond / 6e7) / SLOT_MINUTES) * SLOT_MINUTES
+    return dt.replace(minute=0, second=0, microsecond=0) + timedelta(minutes=minutes)
+
+
+def _can_do(crew: CrewSpec, job: JobSpec) -> bool:
+    needed = normalize_skill(job.job_type)
+    return not crew.skills or not needed or needed == "other" or needed in crew.skills
+
+
+def _build_days(crews: list[CrewSpec], days: list[date], workday: tuple[clock, clock]) -> list[CrewDay]:
+    crew_days = []
+    for crew in crews:
+        for index, day in enumerate(days):
+            shift_start = datetime.combine(day, workday[0])
+            shift_end = datetime.combine(day, workday[1])
+            stops = sorted((s for s in crew.busy if s.start < shift_end and s.end > shift_start),
+                           key=lambda s: s.start)
+            capacity = None
+            if crew.max_jobs_per_day:
+                capacity = crew.max_jobs_per_day - sum(1 for s in crew.busy if s.start.date() == day)
+            crew_days.append(CrewDay(crew.id, index, shift_start, shift_end, capacity, crew.origin, stops))
+    return crew_days
+
+
+def _best_option(job: JobSpec, days: list[CrewDay], eligible: set[str]) -> _Option | None:
+    duration = timedelta(minutes=job.duration_min)
+    delay = DAY_DELAY_MINUTES.get(job.priority, DAY_DELAY_MINUTES["medium"])
+    best = None
+    for day in days:
+        if day.crew_id not in eligible or day.capacity is not None and day.placed() >= day.capacity:
+            continue
+        if job.window_start and day.shift_end <= job.window_start or job.window_end and day.shift_start >= job.window_end:
+            continue
+        stops = day.stops
+        for i in range(len(stops) + 1):
+            prev = stops[i - 1] if i else None
+            nxt = stops[i] if i < len(stops) else None
+            prev_loc = prev.location if prev else day.origin
+            next_loc = nxt.location if nxt else None
+            t_in = travel_minutes(prev_loc, job.location)
+            t_out = travel_minutes(job.location, next_loc)
+            earliest = max(prev.end if prev else day.shift_start, day.shift_start) + timedelta(minutes=t_in)
+            if job.window_start and earliest < job.window_start:
+                earliest = job.window_start
+            start = round_to_slot(earliest)
+            end = start + duration
+            limit = nxt.start if nxt else day.shift_end
+            if end + timedelta(minutes=t_out) > limit or end > day.shift_end:
+                continue
+            if job.window_end and end > job.window_end:
+                continue
+            added = t_in + t_out - travel_minutes(prev_loc, next_loc)
+            cost = added + day.day_index * delay + (start - day.shift_start).total_seconds() / 60 * 0.01
+            if best is None or cost < best.cost:
+                best = _Option(cost, day, i, start, end, t_in)
+    return best
+
+
+def solve(jobs: list[JobSpec], crews: list[CrewSpec], days: list[date],
+          workday: tuple[clock, clock], budget_seconds: float = 2.0) -> Schedule:
+    started = time.monotonic()
+    deadline = started + budget_seconds
+    crew_days = _build_days(crews, days, workday)
+    eligible = {job.id: {c.id for c in crews if _can_do(c, job)} for job in jobs}
+    placed: dict[str, tuple[CrewDay, Stop, float]] = {}
+
+    def insert(job: JobSpec, option: _Option):
+        stop = Stop(job.id, option.start, option.end, job.location, fixed=False)
+        option.day.stops.insert(option.index, stop)
+        placed[job.id] = (option.day, stop, option.travel)
+
+    def remove(job_id: str):
+        day, stop, _ = placed.pop(job_id)
+        day.stops.remove(stop)
+
+    # Most important first; among equals, the least flexible.
+    order = sorted(jobs, key=lambda j: (-PRIORITY_WEIGHT.get(j.priority, 2), j.window_start is None,
+                                        -j.duration_min, j.id))
+    for job in order:
+        if time.monotonic() > deadline:
+            break
+        option = _best_option(job, crew_days, eligible[job.id])
+        if option:
+            insert(job, option)
+
+    rounds = 0
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        rounds += 1
+        for job in order:
+            if time.monotonic() > deadline:
+                break
+            if job.id not in placed:
+                option = _best_option(job, crew_days, eligible[job.id])
+                if option:
+                    insert(job, option)
+                    improved = True
+                continue
+            day, stop, travel = placed[job.id]
+            index = day.stops.index(stop)
+            remove(job.id)
+            current = _best_option(job, [day], {day.crew_id})  # its own slot is free again
+            option = _best_option(job, crew_days, eligible[job.id])
+            if option and (current is None or option.cost < current.cost - 1e-6):
+                insert(job, option)
+                improved = True
+            else:
+                day.stops.insert(index, stop)
+                placed[job.id] = (day, stop, travel)
+
+    unassigned = {}
+    for job in jobs:
+        if job.id in placed:
+            continue
+        if not eligible[job.id]:
+            unassigned[job.id] = f"No crew has the skill for job type '{job.job_type}'"
+        else:
+            unassigned[job.id] = "No crew has capacity or a free slot in the date range"
+
+    placements = [Placement(job_id, day.crew_id, stop.start, stop.end, round(travel, 1))
+                  for job_id, (day, stop, travel) in placed.items()]
+    placements.sort(key=lambda p: (p.crew_id, p.start))
+    return Schedule(
+        placements=placements,
+        unassigned=unassigned,
+        travel_minutes=round(sum(p.travel_minutes for p in placements), 1),
+        rounds=rounds,
+        elapsed_ms=round((time.monotonic() - started) * 1000),
+    )
+
+
+def job_spec(job, default_hours: float = DEFAULT_JOB_HOURS) -> JobSpec:
+    """A ``JobSpec`` from a ``DispatchJob``; its scheduled times, if any, are its time window."""
+    hours = job.estimated_duration_hrs or default_hours
+    location = (job.location_lat, job.location_lng) if job.location_lat is not None and job.location_lng is not None else None
+    window_end = job.scheduled_end
+    if job.scheduled_start and (window_end is None or window_end - job.scheduled_start < timedelta(hours=hours)):
+        window_end = job.scheduled_start + timedelta(hours=hours)
+    return JobSpec(job.id, job.job_type, hours * 60, job.priority or "medium", location,
+                   job.scheduled_start, window_end if job.scheduled_start else None)
+
+
+def parse_workday(value: str) -> tuple[clock, clock]:
+    start, end = (clock.fromisoformat(part.strip()) for part in value.split("-"))
+    if end <= start:
+        raise ValueError("workday must end after it starts")
+    return start, end
@@ -0,0 +1,319 @@
+"""Dispatch board WebSockets held by this worker.
+
+Authentication: send an ``Authorization: Bearer`` header, or make the first
+message ``{"type": "auth", "token": ...}``. Browsers can't set headers on a
+WebSocket. When the access token expires the socket is closed with
+``4401``, unless a fresh token arrives first in another ``auth`` message.
+
+By default a socket gets every event for its user's orgs. A ``subscribe``
+message narrows it: ``{"type": "subscribe", "orgs": [...], "projects":
+[...], "crews": [...]}``. The same keys are accepted on the ``auth``
+message, along with ``"resume": {org_id: last_seq}`` to replay missed
+events (see ``dispatch_replay``).
+
+Every event is encoded once, by the bus. Each connection then queues the
+same string and sends from its own task. A slow tablet only delays itself:
+
+- A full-state event (created, updated, deleted) replaces anything still
+  queued for the same job.
+- If the queue still overflows, it is emptied and replaced by a single
+  ``resync``.
+- A send that stalls for ``SEND_TIMEOUT_SECONDS`` closes the socket.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Iterable
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from jose import jwt
+from app.core.auth import Principal, principal_from_token
+from app.core.config import DISPATCH_WS_QUEUE_SIZE
+from app.services.dispatch_bus import RESYNC, Deliver, create_bus
+from app.services.dispatch_replay import ReplayBuffer, missed_events
+
+AUTH_TIMEOUT_SECONDS = 10
+SEND_TIMEOUT_SECONDS = 10
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_TRY_AGAIN = 1013
+PONG = '{"type":"pong"}'
+# Events carrying the job's whole state; they make queued events for that job redundant.
+FULL_STATE_EVENTS = {"job_created", "job_updated", "job_deleted"}
+
+
+def _job_id(event: dict) -> str | None:
+    return event.get("job_id") or (event.get("job") or {}).get("id")
+
+
+class Connection:
+    """One socket: its principal, subscription and bounded send queue."""
+
+    def __init__(self, websocket: WebSocket, principal: Principal, max_queue: int = DISPATCH_WS_QUEUE_SIZE):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.principal = principal
+        self.org_ids: set[str] = {m.org_id for m in principal.memberships}
+        self.projects: set[str] = set()
+        self.crews: set[str] = set()
+        self._queue: OrderedDict[int, tuple[str | None, str]] = OrderedDict()
+        self._queued_by_job: dict[str, set[int]] = {}
+        self._next_key = 0
+        self._overflowed = False
+        self._ready = asyncio.Event()
+
+    def subscribe(self, message: dict):
+        member_orgs = {m.org_id for m in self.principal.memberships}
+        orgs = set(message.get("orgs") or ()) & member_orgs
+        self.org_ids = orgs or member_orgs
+        self.projects = set(message.get("projects") or ())
+        self.crews = set(message.get("crews") or ())
+
+    def wants(self, event: dict) -> bool:
+        org_id = event.get("org_id")
+        if org_id is None:
+            return True  # worker-wide notices such as resync
+        if org_id not in self.org_ids:
+            return False
+        if (not self.projects and not self.crews) or event.get("type") == "resync":
+            return True  # an org-wide resync stands in for events that may have matched
+        return event.get("project_id") in self.projects or not self.crews.isdisjoint(event.get("crew_ids") or ())
+
+    def offer(self, event: dict, frame: str):
+        """Queue ``frame`` without waiting on the socket."""
+        if self._overflowed:
+            return  # the queued resync reloads the board, which covers this event too
+        job_id = _job_id(event)
+        if job_id is not None and event.get("type") in FULL_STATE_EVENTS:
+            for key in self._queued_by_job.pop(job_id, ()):
+                del self._queue[key]
+        if len(self._queue) >= self.max_queue:
+            self._queue.clear()
+            self._queued_by_job.clear()
+            self._overflowed = True
+            job_id, frame = None, RESYNC
+        self._push(job_id, frame)
+
+    def send_control(self, frame: str):
+        self._push(None, frame)
+
+    def _push(self, job_id: str | None, frame: str):
+        key = self._next_key
+        self._next_key += 1
+        self._queue[key] = (job_id, frame)
+        if job_id is not None:
+            self._queued_by_job.setdefault(job_id, set()).add(key)
+        self._ready.set()
+
+    def pending(self) -> list[str]:
+        return [frame for _, frame in self._queue.values()]
+
+    async def run_sender(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._queue:
+                key, (job_id, frame) = self._queue.popitem(last=False)
+                if job_id is not None:
+                    keys = self._queued_by_job.get(job_id)
+                    keys.discard(key)
+                    if not keys:
+                        del self._queued_by_job[job_id]
+                if frame is RESYNC:
+                    self._overflowed = False
+                await asyncio.wait_for(self.websocket.send_text(frame), SEND_TIMEOUT_SECONDS)
+
+
+class DispatchConnectionManager:
+    """This worker's dispatch sockets; events arrive from every worker through the bus."""
+
+    def __init__(self, bus=None, max_queue: int = DISPATCH_WS_QUEUE_SIZE):
+        self.bus = bus or create_bus()
+        self.max_queue = max_queue
+        self.active_connections: set[Connection] = set()
+        self._by_org: dict[str, set[Connection]] = {}
+        self.history = ReplayBuffer()
+        self.listeners: list[Deliver] = []  # e.g. caches to drop when an org's jobs change
+        self._started = False
+
+    async def start(self):
+        if not self._started:
+            await self.bus.start(self.deliver)
+            self._started = True
+
+    async def stop(self):
+        if self._started:
+            await self.bus.stop()
+            self._started = False
+
+    async def broadcast(self, db, org_id: str, message: dict, project_id: str | None = None,
+                        crew_ids=()) -> dict:
+        """Publish to every worker; returns the event with its ``org_id`` and ``seq``.
+
+        ``crew_ids`` should include a job's previous crew, so that crew's board sees it leave.
+        """
+        return (await self.broadcast_many(db, [(org_id, message, project_id, crew_ids)]))[0]
+
+    async def broadcast_many(self, db, events: list[tuple[str, dict, str | None, Iterable]]) -> list[dict]:
+        """``broadcast`` for several ``(org_id, message, project_id, crew_ids)`` in one transaction, in org order."""
+        await self.start()
+        return await self.bus.publish_many(db, [
+            (org_id, {**message, "project_id": project_id, "crew_ids": [c for c in dict.fromkeys(crew_ids) if c]})
+            for org_id, message, project_id, crew_ids in events
+        ])
+
+    async def deliver(self, event: dict, frame: str):
+        org_id = event.get("org_id")
+        if org_id is None and event.get("type") == "resync":
+            self.history.clear()
+        self.history.record(event, frame)
+        for listener in self.listeners:
+            await listener(event, frame)
+        targets = self._by_org.get(org_id, ()) if org_id is not None else self.active_connections
+        for conn in list(targets):
+            if conn.wants(event):
+                conn.offer(event, frame)
+
+    def _register(self, conn: Connection):
+        self.active_connections.add(conn)
+        for org_id in conn.org_ids:
+            self._by_org.setdefault(org_id, set()).add(conn)
+
+    def _unregister(self, conn: Connection):
+        self.active_connections.discard(conn)
+        for org_id in list(self._by_org):
+            members = self._by_org[org_id]
+            members.discard(conn)
+            if not members:
+                del self._by_org[org_id]
+
+    async def serve(self, websocket: WebSocket):
+        await self.start()
+        accepted = await accept_authenticated(websocket)
+        if accepted is None:
+            return
+        principal, expires_at, first = accepted
+
+        conn = Connection(websocket, principal, self.max_queue)
+        conn.subscribe(first)
+        resume = _resume_points(first, principal)
+        current, stored = {}, {}
+        if resume:
+            try:
+                current, stored = await self.bus.history(resume)
+            except Exception:
+                pass  # no authoritative seqs: every resumed org gets a resync
+        # No awaits from here to the end of the replay: events delivered meanwhile
+        # are already in self.history, and later ones go to the registered socket.
+        self._register(conn)
+        for org_id, after in resume.items():
+            self._replay(conn, org_id, after, current.get(org_id), stored.get(org_id, ()))
+        tasks = {asyncio.create_task(conn.run_sender()),
+                 asyncio.create_task(self._receive_loop(conn, expires_at))}
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and isinstance(task.exception(), asyncio.TimeoutError):
+                    await close_quietly(websocket, CLOSE_TRY_AGAIN)  # the sender stalled
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._unregister(conn)
+
+    async def _receive_loop(self, conn: Connection, expires_at: float):
+        websocket = conn.websocket
+        try:
+            while True:
+                try:
+                    msg = await asyncio.wait_for(receive_message(websocket), max(expires_at - time.time(), 0))
+                except asyncio.TimeoutError:
+                    await close_quietly(websocket, CLOSE_UNAUTHORIZED)
+                    return
+                kind = msg.get("type")
+                if kind == "ping":
+                    conn.send_control(PONG)
+                elif kind == "auth":
+                    try:
+                        principal, new_expiry = authenticate(msg.get("token"))
+                    except HTTPException:
+                        await close_quietly(websocket, CLOSE_UNAUTHORIZED)
+                        return
+                    if principal.id != conn.principal.id:
+                        await close_quietly(websocket, CLOSE_UNAUTHORIZED)
+                        return
+                    expires_at = new_expiry
+                    if any(key in msg for key in ("orgs", "projects", "crews")):
+                        self._resubscribe(conn, principal, msg)
+                    else:
+                        conn.principal = principal
+                elif kind == "subscribe":
+                    self._resubscribe(conn, conn.principal, msg)
+        except WebSocketDisconnect:
+            return
+
+    def _replay(self, conn: Connection, org_id: str, after: int, current: int | None, stored):
+        events = None
+        if current is not None:
+            events = missed_events(after, current, [*stored, *self.history.after(org_id, after)])
+        if events is None:
+            conn.send_control(RESYNC)
+            return
+        for _, event, frame in events:
+            if conn.wants(event):
+                conn.offer(event, frame)
+
+    def _resubscribe(self, conn: Connection, principal: Principal, msg: dict):
+        self._unregister(conn)
+        conn.principal = principal
+        conn.subscribe(msg)
+        self._register(conn)
+
+
+def _resume_points(msg: dict, principal: Principal) -> dict[str, int]:
+    member_orgs = {m.org_id for m in principal.memberships}
+    resume = msg.get("resume")
+    if not isinstance(resume, dict):
+        return {}
+    return {org_id: seq for org_id, seq in resume.items()
+            if org_id in member_orgs and isinstance(seq, int) and seq >= 0}
+
+
+async def accept_authenticated(websocket: WebSocket) -> tuple[Principal, float, dict] | None:
+    """Accept and authenticate a socket: ``(principal, token expiry, first message)``.
+
+    Returns ``None`` once the socket is closed for want of a valid token.
+    """
+    await websocket.accept()
+    try:
+        first = {}
+        token = websocket.headers.get("authorization", "").removeprefix("Bearer ").strip() or None
+        if token is None:
+            first = await asyncio.wait_for(receive_message(websocket), AUTH_TIMEOUT_SECONDS)
+            token = first.get("token") if first.get("type") == "auth" else None
+        principal, expires_at = authenticate(token)
+    except (HTTPException, asyncio.TimeoutError):
+        await websocket.close(code=CLOSE_UNAUTHORIZED)
+        return None
+    except WebSocketDisconnect:
+        return None
+    return principal, expires_at, first
+
+
+def authenticate(token: str | None) -> tuple[Principal, float]:
+    principal = principal_from_token(token, None)
+    return principal, float(jwt.get_unverified_claims(token)["exp"])
+
+
+async def receive_message(websocket: WebSocket) -> dict:
+    text = await websocket.receive_text()
+    try:
+        msg = json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+    return msg if isinstance(msg, dict) else {}
+
+
+async def close_quietly(websocket: WebSocket, code: int):
+    try:
+        await websocket.close(code=code)
+    except RuntimeError:
+        pass  # already closed
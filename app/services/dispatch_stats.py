@@ -0,0 +1,104 @@
+"""Dispatch board statistics for one org, computed in SQL.
+
+The job figures come from one aggregate over the org's jobs, using
+``FILTER`` clauses. Crew utilization is a second aggregate over its crews.
+Results are cached per org for ``DISPATCH_STATS_TTL_SECONDS``. The cache is
+dropped as soon as the dispatch bus reports a change to that org's jobs,
+from any worker.
+"""
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from app.core.config import DISPATCH_STATS_TTL_SECONDS, DISPATCH_WORKDAY
+from app.models.models import Crew, DispatchJob, DispatchJobStatus, Project
+from app.services.dispatch_scheduler import parse_workday
+
+WORKDAYS_PER_WEEK = 5
+
+
+class StatsCache:
+    """Per-org results, kept until they expire or the org's jobs change."""
+
+    def __init__(self, ttl: float = DISPATCH_STATS_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries: dict[str, tuple[float, dict]] = {}
+
+    def get(self, org_id: str) -> dict | None:
+        entry = self._entries.get(org_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, org_id: str, stats: dict):
+        self._entries[org_id] = (time.monotonic(), stats)
+
+    def invalidate(self, org_id: str | None = None):
+        if org_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(org_id, None)
+
+    async def on_event(self, event: dict, frame: str):
+        """Bus listener: every event is a job write, and a resync may hide some."""
+        self.invalidate(event.get("org_id"))
+
+
+def _hours(interval):
+    return func.extract("epoch", interval) / 3600
+
+
+def compute_stats(db: Session, org_id: str, now: datetime | None = None) -> dict:
+    now = now or datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    tomorrow = today + timedelta(days=1)
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=7)
+
+    org_projects = select(Project.id).where(or_(Project.owner_org_id == org_id, Project.executing_org_id == org_id))
+    statuses = list(DispatchJobStatus)
+    completed = DispatchJob.status == DispatchJobStatus.COMPLETED
+    row = db.query(
+        func.count(DispatchJob.id),
+        *(func.count(DispatchJob.id).filter(DispatchJob.status == s) for s in statuses),
+        func.count(DispatchJob.id).filter(DispatchJob.scheduled_start >= today, DispatchJob.scheduled_start < tomorrow),
+        func.count(DispatchJob.id).filter(DispatchJob.scheduled_start >= week_start,
+                                          DispatchJob.scheduled_start < week_end),
+        func.avg(_hours(DispatchJob.completed_at - DispatchJob.actual_start)).filter(
+            completed, DispatchJob.completed_at.isnot(None), DispatchJob.actual_start.isnot(None)),
+        func.count(DispatchJob.id).filter(completed, DispatchJob.completed_at.isnot(None),
+                                          DispatchJob.scheduled_end.isnot(None)),
+        func.count(DispatchJob.id).filter(completed, DispatchJob.completed_at <= DispatchJob.scheduled_end),
+    ).filter(DispatchJob.project_id.in_(org_projects)).one()
+    total, *by_status, jobs_today, jobs_this_week, avg_hours, due, on_time = row
+
+    workday = parse_workday(DISPATCH_WORKDAY)
+    day_hours = (datetime.combine(today, workday[1]) - datetime.combine(today, workday[0])).total_seconds() / 3600
+    capacity = day_hours * WORKDAYS_PER_WEEK
+    in_week = [DispatchJob.scheduled_start < week_end, DispatchJob.scheduled_end > week_start,
+               DispatchJob.status != DispatchJobStatus.CANCELLED]
+    week_hours = func.coalesce(func.sum(_hours(
+        func.least(DispatchJob.scheduled_end, week_end) - func.greatest(DispatchJob.scheduled_start, week_start)
+    )).filter(*in_week), 0)
+    crews = db.query(
+        Crew.id, Crew.name, func.count(DispatchJob.id), week_hours,
+    ).outerjoin(DispatchJob, DispatchJob.crew_id == Crew.id).filter(
+        Crew.is_active == True, Crew.org_id == org_id,
+    ).group_by(Crew.id, Crew.name).order_by(Crew.name).all()
+
+    return {
+        "total_jobs": total,
+        "by_status": {s.value: count for s, count in zip(statuses, by_status) if count},
+        "jobs_today": jobs_today,
+        "jobs_this_week": jobs_this_week,
+        "crew_utilization": [{
+            "crew_id": crew_id,
+            "crew_name": name,
+            "job_count": job_count,
+            "scheduled_hours_week": round(float(hours), 2),
+            "capacity_hours_week": capacity,
+            "utilization": round(float(hours) / capacity, 3) if capacity else None,
+        } for crew_id, name, job_count, hours in crews],
+        "avg_completion_time": round(float(avg_hours), 2) if avg_hours is not None else None,
+        "on_time_rate": round(on_time / due, 3) if due else None,
+    }
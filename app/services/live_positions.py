@@ -0,0 +1,396 @@
+"""Live technician and vehicle positions for the fleet map.
+
+Check-ins and vehicle location updates are stored as before. The ones worth
+showing are also published on their own bus channel, ``fleet_positions``.
+That channel has no sequence numbers and no replay: each position replaces
+the one before it. A reconnecting client gets a fresh snapshot instead.
+
+Updates are thinned before they are published. An entity's position goes
+out when:
+
+- it is new, or it checks out;
+- it has moved ``POSITION_MIN_DISTANCE_M`` since the last one published;
+- ``POSITION_HEARTBEAT_SECONDS`` have passed since then.
+
+It never goes out more than once per ``POSITION_MIN_INTERVAL_SECONDS``,
+except for a check-out. The check runs against the publishing worker's
+index, so a worker that hasn't seen an entity yet publishes its first update.
+
+Each worker keeps the latest published position of every entity in a
+``PositionIndex``. An org is loaded from the database when its first socket
+connects to this worker. After that, snapshots come from memory. When the
+bus reconnects, the index is dropped and reloaded, because updates sent
+while it was down are gone.
+
+Sockets authenticate like the dispatch board's (see ``dispatch_sockets``)
+and receive ``{"type": "positions", "positions": [...]}`` frames:
+
+- On connect, and after falling behind, a frame with ``"snapshot": true``
+  that replaces everything the client has.
+- Then, at most once per ``POSITION_PUSH_INTERVAL_SECONDS``, a batch with
+  the latest position of each entity that changed. A batch is encoded once
+  per org and shared by its sockets. Entries with ``"active": false`` have
+  checked out and should be removed.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Iterable
+from anyio import from_thread
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.auth import Principal
+from app.core.config import (POSITION_HEARTBEAT_SECONDS, POSITION_MIN_DISTANCE_M, POSITION_MIN_INTERVAL_SECONDS,
+                             POSITION_PUSH_INTERVAL_SECONDS)
+from app.services.dispatch_bus import MAX_PAYLOAD_BYTES, create_bus
+from app.services.dispatch_sockets import (CLOSE_TRY_AGAIN, CLOSE_UNAUTHORIZED, PONG, SEND_TIMEOUT_SECONDS,
+                                           accept_authenticated, authenticate, close_quietly, receive_message)
+from app.services.travel import haversine_km
+
+CHANNEL = "fleet_positions"
+# Batches a socket may have queued before they are replaced by one snapshot.
+MAX_QUEUED_BATCHES = 5
+
+
+def position_key(position: dict) -> str:
+    return f"{position['kind']}:{position['id']}"
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def tech_position(loc, name: str | None = None) -> dict:
+    """A technician's position from their active ``TechnicianLocation``."""
+    return {
+        "kind": "tech", "id": loc.user_id, "name": name,
+        "lat": loc.lat, "lng": loc.lng, "speed": loc.speed, "heading": loc.heading,
+        "battery": loc.battery_level, "source": loc.source,
+        "at": _iso(loc.event_time), "active": True,
+    }
+
+
+def vehicle_position(v) -> dict:
+    return {
+        "kind": "vehicle", "id": v.id, "name": v.name, "type": v.vehicle_type,
+        "lat": v.current_lat, "lng": v.current_lng,
+        "speed": float(v.current_speed or 0), "heading": float(v.current_heading or 0),
+        "status": v.status.value if v.status else "active", "crew_id": v.assigned_crew_id,
+        "at": _iso(v.last_location_update), "active": True,
+    }
+
+
+def checked_out(user_id: str) -> dict:
+    return {"kind": "tech", "id": user_id, "active": False}
+
+
+def should_publish(previous: tuple[dict, float] | None, position: dict, now: float,
+                   min_distance_m: float = POSITION_MIN_DISTANCE_M,
+                   min_interval: float = POSITION_MIN_INTERVAL_SECONDS,
+                   heartbeat: float = POSITION_HEARTBEAT_SECONDS) -> bool:
+    """Whether ``position`` is worth sending, given the last one published and when."""
+    if previous is None or not position.get("active", True):
+        return True
+    last, published_at = previous
+    elapsed = now - published_at
+    if elapsed < min_interval:
+        return False
+    if elapsed >= heartbeat:
+        return True
+    return haversine_km((last["lat"], last["lng"]), (position["lat"], position["lng"])) * 1000 >= min_distance_m
+
+
+class PositionIndex:
+    """Latest published position of each entity, by org."""
+
+    def __init__(self):
+        self._orgs: dict[str, dict[str, tuple[dict, float]]] = {}
+        self.loaded: set[str] = set()
+
+    def get(self, org_id: str, key: str) -> tuple[dict, float] | None:
+        return self._orgs.get(org_id, {}).get(key)
+
+    def apply(self, org_id: str, position: dict, now: float):
+        entries = self._orgs.setdefault(org_id, {})
+        if position.get("active", True):
+            entries[position_key(position)] = (position, now)
+        else:
+            entries.pop(position_key(position), None)
+
+    def load(self, org_id: str, positions: Iterable[dict], now: float):
+        """Add the org's stored positions; anything already published since wins."""
+        entries = self._orgs.setdefault(org_id, {})
+        for position in positions:
+            entries.setdefault(position_key(position), (position, now))
+        self.loaded.add(org_id)
+
+    def snapshot(self, org_id: str) -> list[dict]:
+        return [position for position, _ in self._orgs.get(org_id, {}).values()]
+
+    def clear(self):
+        self._orgs.clear()
+        self.loaded.clear()
+
+
+def load_positions(org_id: str) -> list[dict]:
+    """The org's active technicians and located vehicles, from the database."""
+    from app.db.session import SessionLocal
+    from app.models.models import FleetVehicle, TechnicianLocation, User
+
+    db = SessionLocal()
+    try:
+        techs = db.query(TechnicianLocation, User.full_name).join(User, User.id == TechnicianLocation.user_id).filter(
+            TechnicianLocation.org_id == org_id, TechnicianLocation.is_active == True
+        ).order_by(TechnicianLocation.event_time.desc()).all()
+        vehicles = db.query(FleetVehicle).filter(
+            FleetVehicle.org_id == org_id,
+            FleetVehicle.current_lat.isnot(None),
+            FleetVehicle.current_lng.isnot(None),
+        ).all()
+        positions = {}
+        for loc, name in techs:
+            positions.setdefault(loc.user_id, tech_position(loc, name))
+        return [*positions.values(), *(vehicle_position(v) for v in vehicles)]
+    finally:
+        db.close()
+
+
+def _frame(positions: list[dict], snapshot: bool = False) -> str:
+    message = {"type": "positions", "positions": positions}
+    if snapshot:
+        message["snapshot"] = True
+    return json.dumps(message, separators=(",", ":"), default=str)
+
+
+def _chunks(positions: list[dict]):
+    """Split ``positions`` into events that fit a NOTIFY payload."""
+    chunk, size = [], 0
+    for position in positions:
+        n = len(json.dumps(position, separators=(",", ":"), default=str).encode("utf-8")) + 1
+        if chunk and size + n > MAX_PAYLOAD_BYTES - 200:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(position)
+        size += n
+    if chunk:
+        yield chunk
+
+
+class PositionSocket:
+    """One socket's queue of batches. Falling behind swaps them for a snapshot."""
+
+    def __init__(self, websocket: WebSocket, principal: Principal, org_ids: set[str],
+                 snapshot: Callable[[set[str]], str], max_batches: int = MAX_QUEUED_BATCHES):
+        self.websocket = websocket
+        self.principal = principal
+        self.org_ids = org_ids
+        self.max_batches = max_batches
+        self._snapshot = snapshot
+        self._queue: deque[str] = deque()
+        self._stale = False
+        self._ready = asyncio.Event()
+
+    def offer(self, frame: str):
+        if self._stale:
+            return  # the queued snapshot covers it
+        if len(self._queue) >= self.max_batches:
+            self.resync()
+            return
+        self._queue.append(frame)
+        self._ready.set()
+
+    def resync(self):
+        """Replace anything queued with a snapshot, taken when it is sent."""
+        self._queue.clear()
+        self._stale = True
+        self._ready.set()
+
+    def send_control(self, frame: str):
+        self._queue.append(frame)
+        self._ready.set()
+
+    async def run_sender(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            if self._stale:
+                self._stale = False
+                await asyncio.wait_for(self.websocket.send_text(self._snapshot(self.org_ids)), SEND_TIMEOUT_SECONDS)
+            while self._queue:
+                await asyncio.wait_for(self.websocket.send_text(self._queue.popleft()), SEND_TIMEOUT_SECONDS)
+
+
+class PositionHub:
+    """This worker's position sockets and index; updates arrive from every worker through the bus."""
+
+    def __init__(self, bus=None, push_interval: float = POSITION_PUSH_INTERVAL_SECONDS,
+                 loader: Callable[[str], list[dict]] = load_positions):
+        self.bus = bus or create_bus(CHANNEL, sequenced=False)
+        self.push_interval = push_interval
+        self.loader = loader
+        self.index = PositionIndex()
+        self._sockets: dict[str, set[PositionSocket]] = {}
+        self._pending: dict[str, dict[str, dict]] = {}
+        self._loading: dict[str, asyncio.Future] = {}
+        self._flusher: asyncio.Task | None = None
+        self._reloader: asyncio.Task | None = None
+
+    async def start(self):
+        if self._flusher is None:
+            await self.bus.start(self.deliver)
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+            if self._reloader is not None:
+                self._reloader.cancel()
+            await self.bus.stop()
+
+    async def _thin(self, org_id: str, positions: list[dict]) -> list[dict]:
+        """Those of ``positions`` that pass thinning, recorded in the index as published."""
+        await self.start()
+        now = time.monotonic()
+        due = [p for p in positions if should_publish(self.index.get(org_id, position_key(p)), p, now)]
+        for position in due:
+            self.index.apply(org_id, position, now)
+        return due
+
+    @staticmethod
+    def _events(org_id: str, due: list[dict]) -> list[tuple[str, dict]]:
+        return [(org_id, {"type": "positions", "positions": chunk}) for chunk in _chunks(due)]
+
+    async def publish(self, db: Session, org_id: str, positions: list[dict]) -> list[dict]:
+        """Publish those of ``positions`` that pass thinning; returns them."""
+        due = await self._thin(org_id, positions)
+        if due:
+            await self.bus.publish_many(db, self._events(org_id, due))
+        return due
+
+    def publish_from_thread(self, db: Session, org_id: str, positions: list[dict]) -> list[dict]:
+        """``publish`` for sync endpoints: only the thinning goes to the event loop, the notify runs here."""
+        due = from_thread.run(self._thin, org_id, positions)
+        if due:
+            self.bus.publish_blocking(db, self._events(org_id, due))
+        return due
+
+    async def deliver(self, event: dict, frame: str):
+        if event.get("type") == "resync":
+            self.index.clear()
+            self._pending.clear()
+            self._reloader = asyncio.create_task(self._reload())
+            return
+        org_id = event.get("org_id")
+        now = time.monotonic()
+        pending = self._pending.setdefault(org_id, {}) if org_id in self._sockets else None
+        for position in event.get("positions") or ():
+            self.index.apply(org_id, position, now)
+            if pending is not None:
+                pending[position_key(position)] = position
+
+    def flush(self):
+        """Send each org's changes since the last flush to its sockets, as one batch."""
+        pending, self._pending = self._pending, {}
+        for org_id, batch in pending.items():
+            if not batch:
+                continue
+            frame = _frame(list(batch.values()))
+            for sock in list(self._sockets.get(org_id, ())):
+                sock.offer(frame)
+
+    def snapshot_frame(self, org_ids: set[str]) -> str:
+        return _frame([p for org_id in sorted(org_ids) for p in self.index.snapshot(org_id)], snapshot=True)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.push_interval)
+            self.flush()
+
+    async def _ensure_loaded(self, org_id: str):
+        if org_id in self.index.loaded:
+            return
+        future = self._loading.get(org_id)
+        if future is None:
+            future = self._loading[org_id] = asyncio.ensure_future(run_in_threadpool(self.loader, org_id))
+            future.add_done_callback(lambda f: self._loading.pop(org_id, None) if self._loading.get(org_id) is f
+                                     else None)
+        try:
+            positions = await asyncio.shield(future)
+        except Exception as e:
+            print(f"Live positions: loading org {org_id} failed ({e})")
+            return
+        self.index.load(org_id, positions, time.monotonic())
+
+    async def _reload(self):
+        for org_id in list(self._sockets):
+            await self._ensure_loaded(org_id)
+        for sock in {s for socks in self._sockets.values() for s in socks}:
+            sock.resync()
+
+    def _register(self, sock: PositionSocket):
+        for org_id in sock.org_ids:
+            self._sockets.setdefault(org_id, set()).add(sock)
+
+    def _unregister(self, sock: PositionSocket):
+        for org_id in sock.org_ids:
+            members = self._sockets.get(org_id)
+            if members is not None:
+                members.discard(sock)
+                if not members:
+                    del self._sockets[org_id]
+                    self._pending.pop(org_id, None)
+
+    async def serve(self, websocket: WebSocket):
+        await self.start()
+        accepted = await accept_authenticated(websocket)
+        if accepted is None:
+            return
+        principal, expires_at, first = accepted
+        member_orgs = {m.org_id for m in principal.memberships}
+        org_ids = set(first.get("orgs") or ()) & member_orgs or member_orgs
+
+        sock = PositionSocket(websocket, principal, org_ids, self.snapshot_frame)
+        self._register(sock)
+        tasks = set()
+        try:
+            for org_id in org_ids:
+                await self._ensure_loaded(org_id)
+            sock.resync()
+            tasks = {asyncio.create_task(sock.run_sender()),
+                     asyncio.create_task(self._receive_loop(sock, expires_at))}
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and isinstance(task.exception(), asyncio.TimeoutError):
+                    await close_quietly(websocket, CLOSE_TRY_AGAIN)  # the sender stalled
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._unregister(sock)
+
+    async def _receive_loop(self, sock: PositionSocket, expires_at: float):
+        websocket = sock.websocket
+        try:
+            while True:
+                try:
+                    msg = await asyncio.wait_for(receive_message(websocket), max(expires_at - time.time(), 0))
+                except asyncio.TimeoutError:
+                    await close_quietly(websocket, CLOSE_UNAUTHORIZED)
+                    return
+                kind = msg.get("type")
+                if kind == "ping":
+                    sock.send_control(PONG)
+                elif kind == "auth":
+                    try:
+                        principal, expires_at = authenticate(msg.get("token"))
+                    except HTTPException:
+                        principal = None
+                    if principal is None or principal.id != sock.principal.id:
+                        await close_quietly(websocket, CLOSE_UNAUTHORIZED)
+                        return
+                    sock.principal = principal
+        except WebSocketDisconnect:
+            return
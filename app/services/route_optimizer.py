@@ -0,0 +1,157 @@
+"""Visiting order for one crew's day of jobs.
+
+A route starts at the crew's position and visits every stop once. Each stop
+can have a time window, an earliest start and a latest finish. Arriving early
+means waiting. Finishing late costs ``LATE_PENALTY`` drive-minutes per minute
+late, so a route that keeps every window always beats one that doesn't.
+
+Small days (up to ``EXACT_LIMIT`` stops) are solved exactly by trying every
+order. Larger ones start from nearest-neighbour and cheapest-insertion
+tours. Those are then improved with 2-opt (reversing a run of stops) and
+or-opt (moving a run of one to three stops elsewhere) until neither helps
+or ``budget_seconds`` runs out. The current order is a candidate too, so the
+result is never worse than what is already on the board.
+"""
+import itertools
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from app.services.dispatch_scheduler import round_to_slot
+from app.services.travel import Point, travel_minutes
+
+EXACT_LIMIT = 7
+LATE_PENALTY = 100
+
+
+@dataclass
+class RouteStop:
+    id: str
+    location: Point | None
+    duration_min: float
+    earliest: datetime | None = None
+    latest: datetime | None = None  # the job should be finished by then
+
+
+@dataclass
+class Visit:
+    stop: RouteStop
+    travel_minutes: float
+    arrival: datetime
+    start: datetime
+    end: datetime
+
+
+@dataclass
+class Route:
+    visits: list[Visit]
+    travel_minutes: float
+    late_minutes: float
+
+
+def _matrix(origin: Point | None, stops: list[RouteStop]) -> list[list[float]]:
+    """Drive minutes between points; index 0 is the origin."""
+    points = [origin, *(s.location for s in stops)]
+    return [[travel_minutes(a, b) for b in points] for a in points]
+
+
+def _cost(order: list[int], stops: list[RouteStop], matrix, begin: datetime) -> tuple[float, float, float]:
+    """(cost, travel, lateness) of visiting ``stops`` in ``order``, leaving at ``begin``."""
+    clock = begin
+    here = 0
+    travel = late = 0.0
+    for i in order:
+        leg = matrix[here][i + 1]
+        travel += leg
+        clock += timedelta(minutes=leg)
+        stop = stops[i]
+        if stop.earliest and clock < stop.earliest:
+            clock = stop.earliest
+        clock += timedelta(minutes=stop.duration_min)
+        if stop.latest and clock > stop.latest:
+            late += (clock - stop.latest).total_seconds() / 60
+        here = i + 1
+    return travel + LATE_PENALTY * late, travel, late
+
+
+def _nearest_neighbour(n: int, matrix) -> list[int]:
+    order, left, here = [], set(range(n)), 0
+    while left:
+        nxt = min(left, key=lambda i: (matrix[here][i + 1], i))
+        order.append(nxt)
+        left.discard(nxt)
+        here = nxt + 1
+    return order
+
+
+def _cheapest_insertion(n: int, stops, matrix, begin) -> list[int]:
+    order: list[int] = []
+    for i in sorted(range(n), key=lambda i: (stops[i].latest or datetime.max, i)):
+        order = min((order[:k] + [i] + order[k:] for k in range(len(order) + 1)),
+                    key=lambda o: _cost(o, stops, matrix, begin)[0])
+    return order
+
+
+def _improve(order: list[int], stops, matrix, begin, deadline: float) -> list[int]:
+    best = _cost(order, stops, matrix, begin)[0]
+    n = len(order)
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        candidates = itertools.chain(
+            (order[:i] + order[i:j + 1][::-1] + order[j + 1:] for i in range(n - 1) for j in range(i + 1, n)),
+            (_moved(order, i, length, k) for length in (1, 2, 3) for i in range(n - length + 1)
+             for k in range(n - length + 1) if k != i),
+        )
+        for candidate in candidates:
+            cost = _cost(candidate, stops, matrix, begin)[0]
+            if cost < best - 1e-9:
+                order, best, improved = candidate, cost, True
+                break
+            if time.monotonic() > deadline:
+                break
+    return order
+
+
+def _moved(order: list[int], i: int, length: int, k: int) -> list[int]:
+    segment = order[i:i + length]
+    rest = order[:i] + order[i + length:]
+    return rest[:k] + segment + rest[k:]
+
+
+def optimize(origin: Point | None, stops: list[RouteStop], begin: datetime,
+             budget_seconds: float = 1.0) -> Route:
+    """Best order found for ``stops``, which are given in their current order."""
+    deadline = time.monotonic() + budget_seconds
+    n = len(stops)
+    matrix = _matrix(origin, stops)
+    current = list(range(n))
+    if n <= EXACT_LIMIT:
+        best = min(itertools.permutations(current), key=lambda o: _cost(list(o), stops, matrix, begin)[0])
+        order = list(best)
+    else:
+        starts = [current, _nearest_neighbour(n, matrix), _cheapest_insertion(n, stops, matrix, begin)]
+        order = min((_improve(o, stops, matrix, begin, deadline) for o in starts),
+                    key=lambda o: _cost(o, stops, matrix, begin)[0])
+    return _route(order, stops, matrix, begin)
+
+
+def evaluate(origin: Point | None, stops: list[RouteStop], begin: datetime) -> Route:
+    """The route for ``stops`` in the order given."""
+    return _route(list(range(len(stops))), stops, _matrix(origin, stops), begin)
+
+
+def _route(order: list[int], stops, matrix, begin: datetime) -> Route:
+    visits = []
+    clock, here = begin, 0
+    for i in order:
+        leg = matrix[here][i + 1]
+        arrival = clock + timedelta(minutes=leg)
+        stop = stops[i]
+        start = max(arrival, stop.earliest) if stop.earliest else arrival
+        start = round_to_slot(start)
+        end = start + timedelta(minutes=stop.duration_min)
+        visits.append(Visit(stop, round(leg, 1), arrival, start, end))
+        clock, here = end, i + 1
+    travel = sum(v.travel_minutes for v in visits)
+    late = sum((v.end - v.stop.latest).total_seconds() / 60 for v in visits if v.stop.latest and v.end > v.stop.latest)
+    return Route(visits, round(travel, 1), round(late, 1))
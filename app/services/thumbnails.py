@@ -0,0 +1,132 @@
+"""Thumbnail and preview generation for attachments.
+
+Upload endpoints schedule ``generate_for_attachments`` as a background task
+once the response has gone out. For each distinct blob it renders WebP
+thumbnails at ``THUMBNAIL_SIZES`` (longest edge, never upscaled). Photos
+are auto-rotated from their EXIF orientation and written without EXIF, so
+GPS tags never leak through a thumbnail URL. PDFs get a first-page preview
+when pypdfium2 is installed (``pip install .[previews]``).
+
+Thumbnails are stored next to the blob under ``blob_store.thumbnail_key``
+and collected with it. The generated sizes are recorded in
+``Attachment.thumbnail_sizes``; rows that missed their background task
+(a worker restart, say) can be filled in with:
+
+    python -m app.services.thumbnails backfill
+"""
+import io
+from PIL import Image, ImageOps
+from sqlalchemy.orm import Session
+from app.core.config import THUMBNAIL_SIZES
+from app.models.models import Attachment, Blob
+from app.services import blob_store
+
+WEBP_QUALITY = 80
+PREVIEWABLE_TYPES = {"image/jpeg", "image/png", "image/webp", "application/pdf"}
+
+
+def _open_source(data: bytes, content_type: str | None) -> Image.Image | None:
+    if content_type == "application/pdf":
+        try:
+            import pypdfium2
+        except ImportError:
+            return None
+        pdf = pypdfium2.PdfDocument(data)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            scale = max(THUMBNAIL_SIZES) / max(width, height, 1)
+            return page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+    image = Image.open(io.BytesIO(data))
+    # Let the JPEG decoder downscale by a power of two; a 12MP photo decodes several times faster.
+    image.draft("RGB", (max(THUMBNAIL_SIZES), max(THUMBNAIL_SIZES)))
+    return ImageOps.exif_transpose(image)
+
+
+def render_thumbnails(data: bytes, content_type: str | None) -> dict[int, bytes]:
+    """WebP bytes per size for an image or PDF; empty if the file can't be previewed."""
+    try:
+        image = _open_source(data, content_type)
+        if image is None:
+            return {}
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        rendered = {}
+        for size in sorted(THUMBNAIL_SIZES, reverse=True):
+            # Each size is shrunk from the previous, larger one.
+            image.thumbnail((size, size), Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, "WEBP", quality=WEBP_QUALITY, method=4)
+            rendered[size] = out.getvalue()
+        return rendered
+    except Exception:
+        return {}  # corrupt or unsupported files just keep showing the original
+
+
+def _ensure_thumbnails(blob: Blob) -> bool:
+    backend = blob_store.backend
+    if all(backend.exists(blob_store.thumbnail_key(blob.sha256, s)) for s in THUMBNAIL_SIZES):
+        return True
+    rendered = render_thumbnails(backend.read(blob.key), blob.content_type)
+    for size, data in rendered.items():
+        backend.put_bytes(blob_store.thumbnail_key(blob.sha256, size), data, "image/webp")
+    return bool(rendered)
+
+
+def process(db: Session, attachments: list[Attachment]) -> int:
+    """Generate thumbnails for ``attachments`` (once per distinct blob) and record the sizes."""
+    by_hash: dict[str, list[Attachment]] = {}
+    for a in attachments:
+        if a.content_hash and a.file_type in PREVIEWABLE_TYPES and not a.thumbnail_sizes:
+            by_hash.setdefault(a.content_hash, []).append(a)
+    if not by_hash:
+        return 0
+    blobs = db.query(Blob).filter(Blob.sha256.in_(list(by_hash))).all()
+    sizes = ",".join(str(s) for s in THUMBNAIL_SIZES)
+    done = 0
+    for blob in blobs:
+        if _ensure_thumbnails(blob):
+            for a in by_hash[blob.sha256]:
+                a.thumbnail_sizes = sizes
+                done += 1
+    db.commit()
+    return done
+
+
+def generate_for_attachments(attachment_ids: list[str]):
+    """Background-task entry point; uses its own session since the request's is closed by now."""
+    from app.db.session import SessionLocal
+    session = SessionLocal()
+    try:
+        process(session, session.query(Attachment).filter(Attachment.id.in_(attachment_ids)).all())
+    finally:
+        session.close()
+
+
+def thumbnail_urls(attachment: Attachment) -> dict[str, str] | None:
+    if not attachment.thumbnail_sizes or not attachment.content_hash:
+        return None
+    return {
+        size: blob_store.backend.url(blob_store.thumbnail_key(attachment.content_hash, int(size)))
+        for size in attachment.thumbnail_sizes.split(",")
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    from app.db.session import SessionLocal
+
+    if sys.argv[1:] != ["backfill"]:
+        sys.exit("usage: python -m app.services.thumbnails backfill")
+    session = SessionLocal()
+    try:
+        pending = session.query(Attachment).filter(
+            Attachment.thumbnail_sizes.is_(None),
+            Attachment.content_hash.isnot(None),
+            Attachment.file_type.in_(PREVIEWABLE_TYPES),
+        ).all()
+        print(f"Generated thumbnails for {process(session, pending)} of {len(pending)} attachments")
+    finally:
+        session.close()
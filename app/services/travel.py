@@ -0,0 +1,53 @@
+"""Straight-line travel estimates between job sites for dispatch planning.
+
+Drive time is the great-circle distance times ``ROAD_FACTOR``, at
+``DISPATCH_TRAVEL_SPEED_KMH``. That is coarse, but consistent, and needs no
+routing service. A leg with an unknown end counts as zero.
+"""
+import math
+from sqlalchemy.orm import Session
+from app.core.config import DISPATCH_TRAVEL_SPEED_KMH
+from app.models.models import CrewMember, FleetVehicle, TechnicianLocation
+
+EARTH_RADIUS_KM = 6371.0088
+# Roads are rarely straight; typical circuity for suburban and rural networks.
+ROAD_FACTOR = 1.3
+
+Point = tuple[float, float]  # (lat, lng)
+
+
+def haversine_km(a: Point, b: Point) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def travel_minutes(a: Point | None, b: Point | None, speed_kmh: float = DISPATCH_TRAVEL_SPEED_KMH) -> float:
+    if a is None or b is None:
+        return 0.0
+    return haversine_km(a, b) * ROAD_FACTOR / speed_kmh * 60
+
+
+def crew_start_points(db: Session, crew_ids: list[str]) -> dict[str, Point]:
+    """Where each crew is now: its vehicle's last position, else its members' latest check-in."""
+    if not crew_ids:
+        return {}
+    points: dict[str, Point] = {}
+    vehicles = db.query(FleetVehicle.assigned_crew_id, FleetVehicle.current_lat, FleetVehicle.current_lng).filter(
+        FleetVehicle.assigned_crew_id.in_(crew_ids),
+        FleetVehicle.current_lat.isnot(None),
+        FleetVehicle.current_lng.isnot(None),
+    ).order_by(FleetVehicle.assigned_crew_id, FleetVehicle.last_location_update.desc().nullslast()).all()
+    for crew_id, lat, lng in vehicles:
+        points.setdefault(crew_id, (lat, lng))
+
+    missing = [c for c in crew_ids if c not in points]
+    if missing:
+        latest = db.query(CrewMember.crew_id, TechnicianLocation.lat, TechnicianLocation.lng).join(
+            TechnicianLocation, TechnicianLocation.user_id == CrewMember.user_id
+        ).filter(CrewMember.crew_id.in_(missing)).distinct(CrewMember.crew_id).order_by(
+            CrewMember.crew_id, TechnicianLocation.event_time.desc()
+        ).all()
+        for crew_id, lat, lng in latest:
+            points[crew_id] = (lat, lng)
+    return points
@@ -0,0 +1,69 @@
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+
+
+async def _discard(path: str):
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(upload: UploadFile, dest_path: str, max_size: int, too_large_detail: str) -> StoredUpload:
+    """Stream an upload to ``dest_path`` in chunks, hashing and size-checking as it goes.
+
+    The file is written to a ``.part`` sibling and renamed into place, so a
+    rejected or interrupted upload never leaves a truncated file behind.
+
+    Starlette has already received and spooled the whole multipart body by
+    the time an endpoint runs, so ``max_size`` bounds what is kept, not what
+    is received. Oversized requests are only stopped at the door by a body
+    limit on the proxy in front of the app.
+    """
+    if upload.size is not None and upload.size > max_size:
+        raise HTTPException(status_code=400, detail=too_large_detail)
+
+    await aiofiles.os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    part_path = f"{dest_path}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(part_path, "wb") as out:
+            while chunk := await upload.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=400, detail=too_large_detail)
+                digest.update(chunk)
+                await out.write(chunk)
+        await aiofiles.os.replace(part_path, dest_path)
+    except BaseException:
+        await _discard(part_path)
+        raise
+    return StoredUpload(path=dest_path, size=size, sha256=digest.hexdigest())
+
+
+async def save_uploads(items: list[tuple[UploadFile, str]], max_size: int, too_large_detail: str) -> list[StoredUpload]:
+    """Write several uploads concurrently; if any fails, remove the ones that succeeded."""
+    results = await asyncio.gather(
+        *(save_upload(upload, dest, max_size, too_large_detail) for upload, dest in items),
+        return_exceptions=True,
+    )
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if failures:
+        await asyncio.gather(*(_discard(r.path) for r in results if isinstance(r, StoredUpload)))
+        raise failures[0]
+    return results
@@ -1,4 +1,7 @@
 let token = localStorage.getItem('ftth_token');
+let refreshToken = localStorage.getItem('ftth_refresh_token');
+let refreshPromise = null;
+let refreshTimer = null;
 let currentUser = null;
 let map = null;
 let draw = null;
@@ -23,14 +26,53 @@ const STATUS_COLORS = {
     failed_inspection: '#DC2626'
 };
 
-async function api(path, options = {}) {
+function storeTokens(data) {
+    token = data.access_token;
+    localStorage.setItem('ftth_token', token);
+    if (data.refresh_token) {
+        refreshToken = data.refresh_token;
+        localStorage.setItem('ftth_refresh_token', refreshToken);
+    }
+    [dispatchWs, fleetPositionsWs].forEach(ws => {
+        if (ws && ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify({ type: 'auth', token }));
+    });
+    clearTimeout(refreshTimer);
+    if (data.expires_in) {
+        refreshTimer = setTimeout(() => refreshAccessToken().catch(() => {}), data.expires_in * 800);
+    }
+}
+
+// Single-flight: concurrent 401s share one refresh so the rotated token is only spent once.
+function refreshAccessToken() {
+    if (!refreshToken) return Promise.resolve(false);
+    if (!refreshPromise) {
+        refreshPromise = fetch(API + '/api/auth/refresh', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken })
+        }).then(async res => {
+            if (!res.ok) return false;
+            storeTokens(await res.json());
+            return true;
+        }).catch(() => false).finally(() => { refreshPromise = null; });
+    }
+    return refreshPromise;
+}
+
+async function api(path, options = {}, retried = false) {
     const headers = { 'Content-Type': 'application/json' };
     if (token) headers['Authorization'] = `Bearer ${token}`;
     const res = await fetch(API + path, { ...options, headers });
+    if (res.status === 401 && token && !retried && await refreshAccessToken()) {
+        return api(path, options, true);
+    }
     if (res.status === 401) { logout(); throw new Error('Unauthorized'); }
     if (!res.ok) {
         const err = await res.json().catch(() => ({}));
-        throw new Error(err.detail || 'Request failed');
+        const error = new Error((err.detail && err.detail.message) || err.detail || 'Request failed');
+        error.status = res.status;
+        error.detail = err.detail;
+        throw error;
     }
     return res.json();
 }
@@ -49,8 +91,7 @@ document.getElementById('login-form').addEventListener('submit', async (e) => {
             method: 'POST',
             body: JSON.stringify({ email, password })
         });
-        token = data.access_token;
-        localStorage.setItem('ftth_token', token);
+        storeTokens(data);
         await loadApp();
     } catch (err) {
         document.getElementById('login-error').textContent = err.message;
@@ -73,9 +114,19 @@ async function loadApp() {
 }
 
 function logout() {
+    if (refreshToken) {
+        fetch(API + '/api/auth/logout', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken })
+        }).catch(() => {});
+    }
     token = null;
+    refreshToken = null;
     currentUser = null;
+    clearTimeout(refreshTimer);
     localStorage.removeItem('ftth_token');
+    localStorage.removeItem('ftth_refresh_token');
     document.getElementById('login-screen').classList.remove('hidden');
     document.getElementById('main-screen').classList.add('hidden');
 }
@@ -693,6 +744,14 @@ async function loadFieldEntries(taskId) {
     }
 }
 
+// Thumbnails are generated after upload, so fall back to the original until they exist.
+function thumbnailAttrs(a) {
+    const sizes = Object.keys(a.thumbnails || {}).map(Number).sort((x, y) => x - y);
+    if (!sizes.length) return `src="${a.file_path}"`;
+    const srcset = sizes.map(s => `${a.thumbnails[s]} ${s / sizes[0]}x`).join(', ');
+    return `src="${a.thumbnails[sizes[0]]}" srcset="${srcset}"`;
+}
+
 async function loadAttachments(taskId) {
     const container = document.getElementById('panel-attachments');
     try {
@@ -707,15 +766,16 @@ async function loadAttachments(taskId) {
         innerHtml += `<input type="file" id="attachment-file-input" multiple accept="image/jpeg,image/png,image/webp,application/pdf" style="display:none" onchange="handleAttachmentUpload('${taskId}')">`;
 
         if (attachments.length) {
-            const images = attachments.filter(a => a.file_type && a.file_type.startsWith('image/'));
-            const others = attachments.filter(a => !a.file_type || !a.file_type.startsWith('image/'));
+            // PDFs with a first-page preview sit in the grid alongside photos.
+            const images = attachments.filter(a => a.thumbnails || (a.file_type && a.file_type.startsWith('image/')));
+            const others = attachments.filter(a => !images.includes(a));
 
             if (images.length) {
                 innerHtml += '<div class="attachment-grid">';
                 images.forEach(a => {
                     innerHtml += `
                         <div class="attachment-item">
-                            <a href="${a.file_path}" target="_blank"><img class="attachment-thumb" src="${a.file_path}" alt="${esc(a.filename)}"></a>
+                            <a href="${a.file_path}" target="_blank"><img class="attachment-thumb" ${thumbnailAttrs(a)} loading="lazy" alt="${esc(a.filename)}"></a>
                             <button class="btn btn-sm btn-danger attachment-delete-btn" onclick="deleteAttachment('${a.id}', '${taskId}')">&times;</button>
                         </div>`;
                 });
@@ -1740,13 +1800,16 @@ const state = {
     set projects(v) { projects = v; }
 };
 
-async function apiFetch(path, options = {}) {
-    const headers = options.headers || {};
+async function apiFetch(path, options = {}, retried = false) {
+    const headers = { ...(options.headers || {}) };
     if (token) headers['Authorization'] = `Bearer ${token}`;
     if (!options.body || typeof options.body === 'string') {
         if (!headers['Content-Type'] && typeof options.body === 'string') headers['Content-Type'] = 'application/json';
     }
     const res = await fetch(API + path, { ...options, headers });
+    if (res.status === 401 && token && !retried && await refreshAccessToken()) {
+        return apiFetch(path, options, true);
+    }
     if (res.status === 401) { logout(); throw new Error('Unauthorized'); }
     return res;
 }
@@ -3478,7 +3541,12 @@ async function approveChangeOrder(coId) {
 // ==================== DISPATCH BOARD ====================
 
 let dispatchStartDate = getWeekStart(new Date());
+let dispatchCrewOffset = 0;
+const DISPATCH_CREW_PAGE = 50;
 let dispatchWs = null;
+let dispatchWsPing = null;
+// Last event seq seen per org, so a reconnect replays only what was missed.
+const dispatchLastSeq = {};
 
 function getWeekStart(date) {
     const d = new Date(date);
@@ -3509,13 +3577,15 @@ async function loadDispatchBoard() {
             `${dispatchStartDate.toLocaleDateString('en-US', {month:'short',day:'numeric'})} - ${endDate.toLocaleDateString('en-US', {month:'short',day:'numeric',year:'numeric'})}`;
 
         const projectId = document.getElementById('dispatch-project-select')?.value || '';
-        let url = `/api/dispatch/timeline?date_from=${dateFrom}&date_to=${dateTo}`;
+        let url = `/api/dispatch/timeline?date_from=${dateFrom}&date_to=${dateTo}&format=columnar`
+            + `&crew_offset=${dispatchCrewOffset}&crew_limit=${DISPATCH_CREW_PAGE}`;
         if (projectId) url += `&project_id=${projectId}`;
 
-        const [timeline, stats] = await Promise.all([
+        const [columnar, stats] = await Promise.all([
             api(url),
             api('/api/dispatch/stats')
         ]);
+        const timeline = decodeTimeline(columnar);
 
         renderDispatchStats(stats);
         renderTimeline(timeline, dispatchStartDate, endDate);
@@ -3538,10 +3608,31 @@ function renderDispatchStats(stats) {
         <div class="stat-card"><div class="stat-value">${stats.total_jobs || 0}</div><div class="stat-label">Total Jobs</div></div>
         <div class="stat-card"><div class="stat-value" style="color:#3B82F6">${stats.jobs_today || 0}</div><div class="stat-label">Today</div></div>
         <div class="stat-card"><div class="stat-value" style="color:#F59E0B">${stats.jobs_this_week || 0}</div><div class="stat-label">This Week</div></div>
-        <div class="stat-card"><div class="stat-value" style="color:#10B981">${(stats.by_status || {}).COMPLETED || 0}</div><div class="stat-label">Completed</div></div>
+        <div class="stat-card"><div class="stat-value" style="color:#10B981">${(stats.by_status || {}).completed || 0}</div><div class="stat-label">Completed</div></div>
     `;
 }
 
+// The columnar timeline back into crew and job objects for rendering.
+function decodeTimeline(t) {
+    const origin = new Date(t.origin).getTime();
+    const at = m => m == null ? null : new Date(origin + m * 60000).toISOString();
+    const crews = t.crews.id.map((id, i) => ({
+        id, name: t.crews.name[i], color: t.crews.color[i], member_count: t.crews.member_count[i]
+    }));
+    const jobs = cols => cols.id.map((id, i) => ({
+        id, title: cols.title[i], status: t.statuses[cols.status[i]], priority: cols.priority[i],
+        job_type: cols.job_type[i], color: cols.color[i], project_id: cols.project_id[i],
+        scheduled_start: at(cols.start[i]), scheduled_end: at(cols.end[i]),
+        crew_id: cols.crew ? crews[cols.crew[i]].id : null
+    }));
+    return { crews, crew_total: t.crew_total, crew_offset: t.crew_offset, jobs: jobs(t.jobs), unassigned: jobs(t.unassigned) };
+}
+
+function pageDispatchCrews(step) {
+    dispatchCrewOffset = Math.max(0, dispatchCrewOffset + step * DISPATCH_CREW_PAGE);
+    loadDispatchBoard();
+}
+
 function renderTimeline(timeline, startDate, endDate) {
     const days = [];
     for (let d = new Date(startDate); d <= endDate; d.setDate(d.getDate() + 1)) {
@@ -3591,7 +3682,19 @@ function renderTimeline(timeline, startDate, endDate) {
                 }).join('')}
             </div>
         `;
-    }).join('');
+    }).join('') + renderCrewPager(timeline);
+}
+
+function renderCrewPager(timeline) {
+    const offset = timeline.crew_offset || 0;
+    const total = timeline.crew_total || 0;
+    if (total <= DISPATCH_CREW_PAGE) return '';
+    const last = Math.min(offset + DISPATCH_CREW_PAGE, total);
+    return `<div class="tl-row" style="justify-content:center;gap:0.5rem;padding:0.5rem">
+        <button class="btn btn-sm" ${offset ? '' : 'disabled'} onclick="pageDispatchCrews(-1)">Previous</button>
+        <small style="color:var(--text-secondary);align-self:center">Crews ${offset + 1}-${last} of ${total}</small>
+        <button class="btn btn-sm" ${last < total ? '' : 'disabled'} onclick="pageDispatchCrews(1)">Next</button>
+    </div>`;
 }
 
 function isToday(date) {
@@ -3640,14 +3743,21 @@ async function dropJob(event, crewId, dateIso) {
         scheduledStart.setHours(8, 0, 0, 0);
         const scheduledEnd = new Date(scheduledStart);
         scheduledEnd.setHours(16, 0, 0, 0);
-        await api(`/api/dispatch/jobs/${jobId}/reschedule`, {
+        const reschedule = force => api(`/api/dispatch/jobs/${jobId}/reschedule`, {
             method: 'PUT',
             body: JSON.stringify({
                 crew_id: crewId,
                 scheduled_start: scheduledStart.toISOString(),
-                scheduled_end: scheduledEnd.toISOString()
+                scheduled_end: scheduledEnd.toISOString(),
+                force
             })
         });
+        try {
+            await reschedule(false);
+        } catch (err) {
+            if (err.status !== 409 || !confirm(`${err.message}\n\nSchedule anyway?`)) throw err;
+            await reschedule(true);
+        }
         loadDispatchBoard();
     } catch (err) { alert(err.message); }
     draggedJobId = null;
@@ -3825,24 +3935,33 @@ async function createCrew() {
 }
 
 function connectDispatchWs() {
-    if (dispatchWs && dispatchWs.readyState === WebSocket.OPEN) return;
+    if (dispatchWs && dispatchWs.readyState <= WebSocket.OPEN) return;
     try {
         const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
-        dispatchWs = new WebSocket(`${protocol}//${location.host}/api/dispatch/ws`);
-        dispatchWs.onmessage = (event) => {
+        const ws = new WebSocket(`${protocol}//${location.host}/api/dispatch/ws`);
+        dispatchWs = ws;
+        ws.onopen = () => { ws.send(JSON.stringify({ type: 'auth', token, resume: dispatchLastSeq })); };
+        ws.onmessage = (event) => {
             try {
                 const msg = JSON.parse(event.data);
-                if (['job_created','job_updated','job_deleted','job_status_changed','job_assigned','job_rescheduled'].includes(msg.type)) {
+                if (msg.org_id && msg.seq) dispatchLastSeq[msg.org_id] = msg.seq;
+                if (['job_created','job_updated','job_deleted','job_status_changed','job_assigned','job_rescheduled','jobs_scheduled','jobs_updated','resync'].includes(msg.type)) {
                     loadDispatchBoard();
                 }
             } catch {}
         };
-        dispatchWs.onclose = () => { setTimeout(connectDispatchWs, 5000); };
-        dispatchWs.onerror = () => { dispatchWs.close(); };
+        ws.onclose = async (event) => {
+            clearInterval(dispatchWsPing);
+            // 4401: the access token expired or was rejected; refresh before reconnecting.
+            if (event.code === 4401 && !(await refreshAccessToken())) return;
+            setTimeout(connectDispatchWs, event.code === 4401 ? 0 : 5000);
+        };
+        ws.onerror = () => { ws.close(); };
 
-        setInterval(() => {
-            if (dispatchWs && dispatchWs.readyState === WebSocket.OPEN) {
-                dispatchWs.send(JSON.stringify({ type: 'ping' }));
+        clearInterval(dispatchWsPing);
+        dispatchWsPing = setInterval(() => {
+            if (ws.readyState === WebSocket.OPEN) {
+                ws.send(JSON.stringify({ type: 'ping' }));
             }
         }, 30000);
     } catch {}
@@ -4396,113 +4515,138 @@ async function initFleetMap() {
     } catch(e) { console.error('Fleet map init error:', e); }
 }
 
-async function loadFleetMapData() {
+// Live positions: a snapshot on connect, then batched changes (see /api/fleet/positions/ws).
+let fleetPositionsWs = null;
+let fleetPositionsPing = null;
+const fleetPositions = new Map();
+let fleetMapFitted = false;
+
+function loadFleetMapData() {
     if (!fleetMap) return;
-    try {
-        const mapData = await api('/api/fleet/map/all');
-        const sources = ['fleet-vehicles', 'fleet-techs'];
-        sources.forEach(s => {
-            if (fleetMap.getLayer(s + '-layer')) fleetMap.removeLayer(s + '-layer');
-            if (fleetMap.getLayer(s + '-labels')) fleetMap.removeLayer(s + '-labels');
-            if (fleetMap.getSource(s)) fleetMap.removeSource(s);
+    if (!fleetMap.getSource('fleet-vehicles')) {
+        const empty = { type: 'FeatureCollection', features: [] };
+        fleetMap.addSource('fleet-vehicles', { type: 'geojson', data: empty });
+        fleetMap.addLayer({
+            id: 'fleet-vehicles-layer',
+            type: 'circle',
+            source: 'fleet-vehicles',
+            paint: {
+                'circle-radius': 9,
+                'circle-color': ['match', ['get', 'status'], 'active', '#3B82F6', 'in_shop', '#EF4444', '#F59E0B'],
+                'circle-stroke-width': 3,
+                'circle-stroke-color': '#ffffff'
+            }
+        });
+        fleetMap.addLayer({
+            id: 'fleet-vehicles-labels',
+            type: 'symbol',
+            source: 'fleet-vehicles',
+            layout: {
+                'text-field': ['get', 'name'],
+                'text-size': 11,
+                'text-offset': [0, 1.8],
+                'text-anchor': 'top'
+            },
+            paint: { 'text-color': '#ffffff', 'text-halo-color': '#000000', 'text-halo-width': 1 }
+        });
+        fleetMap.addSource('fleet-techs', { type: 'geojson', data: empty });
+        fleetMap.addLayer({
+            id: 'fleet-techs-layer',
+            type: 'circle',
+            source: 'fleet-techs',
+            paint: {
+                'circle-radius': 7,
+                'circle-color': '#10B981',
+                'circle-stroke-width': 3,
+                'circle-stroke-color': '#ffffff'
+            }
+        });
+        fleetMap.addLayer({
+            id: 'fleet-techs-labels',
+            type: 'symbol',
+            source: 'fleet-techs',
+            layout: {
+                'text-field': ['get', 'name'],
+                'text-size': 10,
+                'text-offset': [0, 1.5],
+                'text-anchor': 'top'
+            },
+            paint: { 'text-color': '#10B981', 'text-halo-color': '#000000', 'text-halo-width': 1 }
         });
-
-        if (mapData.vehicles && mapData.vehicles.length > 0) {
-            fleetMap.addSource('fleet-vehicles', {
-                type: 'geojson',
-                data: {
-                    type: 'FeatureCollection',
-                    features: mapData.vehicles.map(v => ({
-                        type: 'Feature',
-                        geometry: { type: 'Point', coordinates: [v.lng, v.lat] },
-                        properties: { name: v.name, type: v.type, status: v.status, speed: v.speed, driver: v.driver || '', heading: v.heading }
-                    }))
-                }
-            });
-            fleetMap.addLayer({
-                id: 'fleet-vehicles-layer',
-                type: 'circle',
-                source: 'fleet-vehicles',
-                paint: {
-                    'circle-radius': 9,
-                    'circle-color': ['match', ['get', 'status'], 'active', '#3B82F6', 'in_shop', '#EF4444', '#F59E0B'],
-                    'circle-stroke-width': 3,
-                    'circle-stroke-color': '#ffffff'
-                }
-            });
-            fleetMap.addLayer({
-                id: 'fleet-vehicles-labels',
-                type: 'symbol',
-                source: 'fleet-vehicles',
-                layout: {
-                    'text-field': ['get', 'name'],
-                    'text-size': 11,
-                    'text-offset': [0, 1.8],
-                    'text-anchor': 'top'
-                },
-                paint: { 'text-color': '#ffffff', 'text-halo-color': '#000000', 'text-halo-width': 1 }
-            });
-        }
-
-        if (mapData.technicians && mapData.technicians.length > 0) {
-            fleetMap.addSource('fleet-techs', {
-                type: 'geojson',
-                data: {
-                    type: 'FeatureCollection',
-                    features: mapData.technicians.map(t => ({
-                        type: 'Feature',
-                        geometry: { type: 'Point', coordinates: [t.lng, t.lat] },
-                        properties: { name: t.name || 'Tech', battery: t.battery, speed: t.speed, source: t.source, time: t.event_time }
-                    }))
-                }
-            });
-            fleetMap.addLayer({
-                id: 'fleet-techs-layer',
-                type: 'circle',
-                source: 'fleet-techs',
-                paint: {
-                    'circle-radius': 7,
-                    'circle-color': '#10B981',
-                    'circle-stroke-width': 3,
-                    'circle-stroke-color': '#ffffff'
-                }
-            });
-            fleetMap.addLayer({
-                id: 'fleet-techs-labels',
-                type: 'symbol',
-                source: 'fleet-techs',
-                layout: {
-                    'text-field': ['get', 'name'],
-                    'text-size': 10,
-                    'text-offset': [0, 1.5],
-                    'text-anchor': 'top'
-                },
-                paint: { 'text-color': '#10B981', 'text-halo-color': '#000000', 'text-halo-width': 1 }
-            });
-        }
-
-        const allPts = [
-            ...(mapData.vehicles || []).map(v => [v.lng, v.lat]),
-            ...(mapData.technicians || []).map(t => [t.lng, t.lat])
-        ];
-        if (allPts.length > 0) {
-            const bounds = allPts.reduce((b, p) => b.extend(p), new mapboxgl.LngLatBounds(allPts[0], allPts[0]));
-            fleetMap.fitBounds(bounds, { padding: 60, maxZoom: 15 });
-        }
 
         ['fleet-vehicles-layer', 'fleet-techs-layer'].forEach(layerId => {
-            if (!fleetMap.getLayer(layerId)) return;
             fleetMap.on('click', layerId, (e) => {
                 const p = e.features[0].properties;
                 new mapboxgl.Popup({ offset: 12 })
                     .setLngLat(e.lngLat)
-                    .setHTML(`<div style="color:#0F172A;padding:4px"><strong>${p.name}</strong><br>${p.type||p.source||''}<br>${p.driver ? 'Driver: ' + p.driver : ''}${p.speed ? '<br>Speed: ' + p.speed + ' mph' : ''}${p.battery != null && p.battery !== 'null' ? '<br>Battery: ' + p.battery + '%' : ''}</div>`)
+                    .setHTML(`<div style="color:#0F172A;padding:4px"><strong>${p.name}</strong><br>${p.type||p.source||''}${p.speed ? '<br>Speed: ' + p.speed + ' mph' : ''}${p.battery != null && p.battery !== 'null' ? '<br>Battery: ' + p.battery + '%' : ''}</div>`)
                     .addTo(fleetMap);
             });
             fleetMap.on('mouseenter', layerId, () => { fleetMap.getCanvas().style.cursor = 'pointer'; });
             fleetMap.on('mouseleave', layerId, () => { fleetMap.getCanvas().style.cursor = ''; });
         });
-    } catch(e) { console.error('Fleet map data error:', e); }
+    }
+    renderFleetPositions();
+    connectFleetPositions();
+}
+
+function renderFleetPositions() {
+    if (!fleetMap || !fleetMap.getSource('fleet-vehicles')) return;
+    const features = kind => ({
+        type: 'FeatureCollection',
+        features: [...fleetPositions.values()].filter(p => p.kind === kind).map(p => ({
+            type: 'Feature',
+            geometry: { type: 'Point', coordinates: [p.lng, p.lat] },
+            properties: kind === 'vehicle'
+                ? { name: p.name, type: p.type, status: p.status, speed: p.speed, heading: p.heading }
+                : { name: p.name || 'Tech', battery: p.battery, speed: p.speed, source: p.source, time: p.at }
+        }))
+    });
+    fleetMap.getSource('fleet-vehicles').setData(features('vehicle'));
+    fleetMap.getSource('fleet-techs').setData(features('tech'));
+
+    if (!fleetMapFitted && fleetPositions.size > 0) {
+        fleetMapFitted = true;
+        const pts = [...fleetPositions.values()].map(p => [p.lng, p.lat]);
+        const bounds = pts.reduce((b, p) => b.extend(p), new mapboxgl.LngLatBounds(pts[0], pts[0]));
+        fleetMap.fitBounds(bounds, { padding: 60, maxZoom: 15 });
+    }
+}
+
+function connectFleetPositions() {
+    if (fleetPositionsWs && fleetPositionsWs.readyState <= WebSocket.OPEN) return;
+    try {
+        const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const ws = new WebSocket(`${protocol}//${location.host}/api/fleet/positions/ws`);
+        fleetPositionsWs = ws;
+        ws.onopen = () => { ws.send(JSON.stringify({ type: 'auth', token })); };
+        ws.onmessage = (event) => {
+            try {
+                const msg = JSON.parse(event.data);
+                if (msg.type !== 'positions') return;
+                if (msg.snapshot) fleetPositions.clear();
+                msg.positions.forEach(p => {
+                    const key = `${p.kind}:${p.id}`;
+                    if (p.active === false) fleetPositions.delete(key);
+                    else fleetPositions.set(key, p);
+                });
+                renderFleetPositions();
+            } catch {}
+        };
+        ws.onclose = async (event) => {
+            clearInterval(fleetPositionsPing);
+            if (event.code === 4401 && !(await refreshAccessToken())) return;
+            setTimeout(connectFleetPositions, event.code === 4401 ? 0 : 5000);
+        };
+        ws.onerror = () => { ws.close(); };
+
+        clearInterval(fleetPositionsPing);
+        fleetPositionsPing = setInterval(() => {
+            if (ws.readyState === WebSocket.OPEN) {
+                ws.send(JSON.stringify({ type: 'ping' }));
+            }
+        }, 30000);
+    } catch {}
 }
 
 async function loadTechLocations() {
@@ -0,0 +1,6 @@
+"""Benchmark tooling: synthetic data generation and an HTTP load driver.
+
+    python -m bench.generate --projects 2 --tasks 5000 --manifest bench_manifest.json
+    python -m bench.load --manifest bench_manifest.json --duration 60 --output run.json
+    python -m bench.compare baseline.json run.json
+"""
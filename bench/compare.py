@@ -0,0 +1,41 @@
+"""Print per-route deltas between two ``bench.load`` result files."""
+import argparse
+import json
+
+METRICS = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps"]
+
+
+def _delta(old, new):
+    if old is None or new is None:
+        return "n/a"
+    if not old:
+        return f"{new}"
+    return f"{new} ({(new - old) / old * 100:+.1f}%)"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two bench.load JSON results")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        cand = json.load(f)
+
+    print(f"baseline  {base['meta'].get('commit')}")
+    print(f"candidate {cand['meta'].get('commit')}")
+    rows = [("route", *METRICS)]
+    for route in sorted(set(base["routes"]) | set(cand["routes"])):
+        b = base["routes"].get(route, {})
+        c = cand["routes"].get(route, {})
+        rows.append((route, *(_delta(b.get(m), c.get(m)) for m in METRICS)))
+    rows.append(("TOTAL", *(_delta(base["total"].get(m), cand["total"].get(m)) for m in METRICS)))
+    widths = [max(len(str(r[i])) for r in rows) for i in range(len(rows[0]))]
+    for r in rows:
+        print("  ".join(str(v).ljust(w) for v, w in zip(r, widths)))
+
+
+if __name__ == "__main__":
+    main()
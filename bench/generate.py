@@ -0,0 +1,304 @@
+"""Synthesize a benchmark org directly through the ORM models.
+
+Everything is derived from ``--seed`` so two runs with the same arguments
+produce the same shapes and volumes. The ids of the generated rows are
+written to a manifest that ``bench.load`` uses to build its requests.
+"""
+import argparse
+import json
+import math
+import random
+from datetime import datetime, timedelta
+
+from geoalchemy2 import WKTElement
+from sqlalchemy import text
+
+from app.core.auth import hash_password
+from app.db.session import SessionLocal, engine
+from app.models.base import Base
+from app.models.models import (
+    Org, User, OrgMember, Project, WorkPackage, TaskType, Task, TaskStatus, FieldEntry,
+    Crew, CrewMember, DispatchJob, DispatchJobStatus, TimeEntry, CompensationRecord,
+    PayPeriod, PayPeriodType, PayRun, Invoice, InvoiceLineItem, InvoiceStatus,
+)
+
+BENCH_PASSWORD = "bench123"
+CENTER = (-97.7431, 30.2672)
+METERS_PER_DEG_LAT = 111_320.0
+BATCH_SIZE = 1000
+
+TASK_TYPES = [
+    ("Aerial Fiber", "feet", "#3B82F6", "LineString"),
+    ("Underground Conduit", "feet", "#10B981", "LineString"),
+    ("Drop Installation", "count", "#F59E0B", "Point"),
+    ("Splice Point", "count", "#EF4444", "Point"),
+    ("Handhole/Vault", "count", "#8B5CF6", "Point"),
+]
+JOB_TYPES = ["splicing", "aerial", "underground", "drop", "inspection"]
+TASK_STATUS_WEIGHTS = [
+    (TaskStatus.NOT_STARTED, 35), (TaskStatus.IN_PROGRESS, 25), (TaskStatus.SUBMITTED, 10),
+    (TaskStatus.APPROVED, 20), (TaskStatus.BILLED, 5), (TaskStatus.REWORK, 5),
+]
+
+
+def _offset(lon, lat, east_m, north_m):
+    return (
+        lon + east_m / (METERS_PER_DEG_LAT * math.cos(math.radians(lat))),
+        lat + north_m / METERS_PER_DEG_LAT,
+    )
+
+
+def _random_line(rng, origin):
+    """A street-following run: 2-8 vertices, 20-200 m legs, gentle turns."""
+    heading = rng.uniform(0, 2 * math.pi)
+    coords = [origin]
+    for _ in range(rng.randint(1, 7)):
+        heading += rng.uniform(-0.5, 0.5)
+        leg = rng.uniform(20, 200)
+        coords.append(_offset(*coords[-1], leg * math.cos(heading), leg * math.sin(heading)))
+    return coords
+
+
+def _line_length_ft(coords):
+    total = 0.0
+    for (lon1, lat1), (lon2, lat2) in zip(coords, coords[1:]):
+        dx = (lon2 - lon1) * METERS_PER_DEG_LAT * math.cos(math.radians(lat1))
+        dy = (lat2 - lat1) * METERS_PER_DEG_LAT
+        total += math.hypot(dx, dy)
+    return round(total * 3.28084)
+
+
+def _weighted(rng, pairs):
+    return rng.choices([p[0] for p in pairs], weights=[p[1] for p in pairs])[0]
+
+
+def _flush_every(db, i):
+    if i and i % BATCH_SIZE == 0:
+        db.flush()
+
+
+def _task_types(db):
+    existing = {tt.name: tt for tt in db.query(TaskType).all()}
+    result = []
+    for name, unit, color, geom_type in TASK_TYPES:
+        tt = existing.get(name)
+        if tt is None:
+            tt = TaskType(name=name, unit=unit, color=color)
+            db.add(tt)
+        result.append((tt, geom_type))
+    db.flush()
+    return result
+
+
+def generate(db, args) -> dict:
+    rng = random.Random(args.seed)
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    week_start = (now - timedelta(days=now.weekday())).replace(hour=0)
+
+    org = Org(name=f"Bench Org {args.seed}")
+    db.add(org)
+    db.flush()
+    admin = User(email=f"bench-{args.seed}@bench.local", hashed_password=hash_password(BENCH_PASSWORD),
+                 full_name="Bench Admin")
+    db.add(admin)
+    db.flush()
+    db.add(OrgMember(org_id=org.id, user_id=admin.id, role="org_admin"))
+
+    employees = [User(email=f"tech-{args.seed}-{i}@bench.local", hashed_password=admin.hashed_password,
+                      full_name=f"Tech {i}") for i in range(args.employees)]
+    db.add_all(employees)
+    db.flush()
+    db.add_all([OrgMember(org_id=org.id, user_id=u.id, role="crew_member") for u in employees])
+
+    task_types = _task_types(db)
+    projects = []
+    task_ids = []
+    for p in range(args.projects):
+        project = Project(name=f"Bench Project {p + 1}", executing_org_id=org.id, status="active")
+        db.add(project)
+        db.flush()
+        wps = [WorkPackage(project_id=project.id, name=f"Zone {chr(65 + z)}") for z in range(4)]
+        db.add_all(wps)
+        db.flush()
+
+        # Each project sits in its own ~5 km square so bbox pans stay local.
+        p_center = _offset(*CENTER, (p % 4) * 8000, (p // 4) * 8000)
+        half = 2500
+        min_lon, min_lat = _offset(*p_center, -half, -half)
+        max_lon, max_lat = _offset(*p_center, half, half)
+
+        tasks = []
+        for i in range(args.tasks):
+            tt, geom_type = rng.choice(task_types)
+            origin = (rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat))
+            if geom_type == "LineString":
+                coords = _random_line(rng, origin)
+                wkt = "LINESTRING(" + ", ".join(f"{x:.7f} {y:.7f}" for x, y in coords) + ")"
+                planned = _line_length_ft(coords)
+            else:
+                wkt = f"POINT({origin[0]:.7f} {origin[1]:.7f})"
+                planned = 1
+            status = _weighted(rng, TASK_STATUS_WEIGHTS)
+            done = status in (TaskStatus.APPROVED, TaskStatus.BILLED, TaskStatus.SUBMITTED)
+            task = Task(
+                project_id=project.id, work_package_id=rng.choice(wps).id, task_type_id=tt.id,
+                name=f"{tt.name} {p + 1}-{i + 1}", status=status, unit=tt.unit,
+                planned_qty=planned,
+                actual_qty=planned if done else round(planned * rng.uniform(0, 0.8)) if status != TaskStatus.NOT_STARTED else 0,
+                unit_cost=round(rng.uniform(0.5, 12.0), 2),
+                geometry=WKTElement(wkt, srid=4326),
+            )
+            tasks.append((task, origin))
+            db.add(task)
+            _flush_every(db, i)
+        db.flush()
+
+        n_entries = 0
+        for task, (lon, lat) in tasks:
+            for _ in range(rng.randint(0, args.entries_per_task * 2)):
+                gps_lon, gps_lat = _offset(lon, lat, rng.gauss(0, 30), rng.gauss(0, 30))
+                db.add(FieldEntry(
+                    task_id=task.id, user_id=rng.choice(employees).id if employees else admin.id,
+                    qty_delta=round(rng.uniform(1, 200)), labor_hours=round(rng.uniform(0.5, 8), 1),
+                    gps_lat=gps_lat, gps_lon=gps_lon, gps_accuracy=round(rng.uniform(3, 25), 1),
+                    created_at=now - timedelta(hours=rng.randint(1, 24 * 60)),
+                ))
+                n_entries += 1
+                _flush_every(db, n_entries)
+        db.flush()
+
+        projects.append({
+            "id": project.id,
+            "bbox": [min_lon, min_lat, max_lon, max_lat],
+            "task_ids": [t.id for t, _ in tasks[:500]],
+        })
+        task_ids.extend(t.id for t, _ in tasks[:500])
+
+    crews = [Crew(org_id=org.id, name=f"Crew {c + 1}", skills=",".join(rng.sample(JOB_TYPES, 2)),
+                  max_jobs_per_day=rng.randint(3, 6)) for c in range(args.crews)]
+    db.add_all(crews)
+    db.flush()
+    for i, u in enumerate(employees):
+        if crews:
+            db.add(CrewMember(crew_id=crews[i % len(crews)].id, user_id=u.id,
+                              role_in_crew="lead" if i < len(crews) else "member"))
+
+    for j in range(args.jobs):
+        project = rng.choice(projects)
+        lon = rng.uniform(project["bbox"][0], project["bbox"][2])
+        lat = rng.uniform(project["bbox"][1], project["bbox"][3])
+        duration = rng.choice([1, 2, 2, 3, 4, 6, 8])
+        start = week_start + timedelta(days=rng.randint(-14, 27), hours=rng.randint(7, 15))
+        crew = rng.choice(crews) if crews and rng.random() < 0.85 else None
+        if crew is None:
+            status = DispatchJobStatus.UNASSIGNED
+        elif start + timedelta(hours=duration) < now:
+            status = _weighted(rng, [(DispatchJobStatus.COMPLETED, 85), (DispatchJobStatus.CANCELLED, 15)])
+        else:
+            status = DispatchJobStatus.SCHEDULED
+        db.add(DispatchJob(
+            project_id=project["id"], crew_id=crew.id if crew else None, created_by=admin.id,
+            title=f"Job {j + 1}", status=status, priority=rng.choice(["low", "medium", "medium", "high"]),
+            job_type=rng.choice(JOB_TYPES), estimated_duration_hrs=duration,
+            scheduled_start=start if crew else None,
+            scheduled_end=start + timedelta(hours=duration) if crew else None,
+            actual_start=start if status == DispatchJobStatus.COMPLETED else None,
+            completed_at=start + timedelta(hours=duration * rng.uniform(0.8, 1.4)) if status == DispatchJobStatus.COMPLETED else None,
+            assigned_at=start - timedelta(days=2) if crew else None,
+            location_lat=lat, location_lng=lon,
+        ))
+        _flush_every(db, j)
+    db.flush()
+
+    period_start = week_start - timedelta(days=7)
+    period = PayPeriod(org_id=org.id, period_type=PayPeriodType.BIWEEKLY, start_date=period_start,
+                       end_date=period_start + timedelta(days=13, hours=23, minutes=59),
+                       pay_date=period_start + timedelta(days=18))
+    db.add(period)
+    db.flush()
+    pay_run = PayRun(org_id=org.id, pay_period_id=period.id, run_number=f"BENCH-{args.seed}")
+    db.add(pay_run)
+    n_time = 0
+    for u in employees:
+        db.add(CompensationRecord(org_id=org.id, user_id=u.id, pay_type="hourly",
+                                  hourly_rate=round(rng.uniform(22, 48), 2), per_diem=rng.choice([0, 0, 55]),
+                                  effective_date=now - timedelta(days=365), is_current=True))
+        for d in range(args.time_entries):
+            clock_in = period_start + timedelta(days=d % 14, hours=rng.randint(6, 8))
+            hours = round(rng.uniform(7, 11), 2)
+            db.add(TimeEntry(org_id=org.id, user_id=u.id, project_id=rng.choice(projects)["id"],
+                             clock_in=clock_in, clock_out=clock_in + timedelta(hours=hours), total_hours=hours,
+                             approved=True))
+            n_time += 1
+            _flush_every(db, n_time)
+    db.flush()
+
+    for i in range(args.invoices):
+        project = rng.choice(projects)
+        items = [InvoiceLineItem(line_number=n + 1, description=f"Line {n + 1}", work_type=rng.choice(JOB_TYPES),
+                                 unit="feet", quantity=q, unit_rate=r, total_amount=round(q * r, 2))
+                 for n, (q, r) in enumerate((rng.randint(10, 3000), round(rng.uniform(0.5, 9), 2))
+                                            for _ in range(rng.randint(3, 20)))]
+        subtotal = round(sum(li.total_amount for li in items), 2)
+        db.add(Invoice(
+            project_id=project["id"], org_id=org.id, invoice_number=f"BENCH-{args.seed}-{i + 1:05d}",
+            title=f"Progress billing {i + 1}", status=rng.choice(list(InvoiceStatus)),
+            subtotal=subtotal, total_amount=subtotal, balance_due=subtotal, created_by=admin.id,
+            line_items=items,
+        ))
+        _flush_every(db, i)
+
+    db.commit()
+    return {
+        "seed": args.seed,
+        "email": admin.email,
+        "password": BENCH_PASSWORD,
+        "org_id": org.id,
+        "projects": projects,
+        "task_ids": task_ids,
+        "pay_run_id": pay_run.id,
+        "timeline_from": week_start.isoformat(),
+        "timeline_to": (week_start + timedelta(days=7)).isoformat(),
+        "counts": {
+            "projects": args.projects, "tasks_per_project": args.tasks, "jobs": args.jobs,
+            "crews": args.crews, "employees": args.employees, "invoices": args.invoices,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic benchmark org in DATABASE_URL")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--projects", type=int, default=2)
+    parser.add_argument("--tasks", type=int, default=2000, help="tasks per project")
+    parser.add_argument("--entries-per-task", type=int, default=2, help="mean field entries per task")
+    parser.add_argument("--crews", type=int, default=20)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--employees", type=int, default=60)
+    parser.add_argument("--time-entries", type=int, default=10, help="time entries per employee in the pay period")
+    parser.add_argument("--invoices", type=int, default=200)
+    parser.add_argument("--manifest", default="bench_manifest.json")
+    args = parser.parse_args(argv)
+
+    with engine.connect() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+        conn.commit()
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        manifest = generate(db, args)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Generated org {manifest['org_id']} ({args.projects} projects x {args.tasks} tasks); "
+          f"manifest written to {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
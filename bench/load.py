@@ -0,0 +1,254 @@
+"""Replay a weighted mix of core API flows against a running app.
+
+Each worker thread picks a scenario by weight, issues the request and
+records its latency under the route template. At the end the per-route
+p50/p95/p99, throughput and error counts are written as JSON together with
+the git commit, so runs can be diffed with ``bench.compare``.
+"""
+import argparse
+import json
+import math
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from datetime import datetime
+
+EXPORT_PLATFORMS = ["vetro", "esri", "qgis", "googleearth"]
+
+
+class Client:
+    """Shared by all worker threads; renews its access token before it expires, or on a 401."""
+
+    REFRESH_MARGIN_SECONDS = 60
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.token = None
+        self.refresh_token = None
+        self.expires_at = math.inf
+        self._auth_lock = threading.Lock()
+
+    def request(self, method: str, path: str, body: dict | None = None) -> tuple[int, int]:
+        if time.monotonic() >= self.expires_at - self.REFRESH_MARGIN_SECONDS:
+            self.refresh(self.token)
+        sent_with = self.token
+        status, size = self._send(method, path, body)
+        if status == 401 and self.refresh_token:
+            self.refresh(sent_with)
+            status, size = self._send(method, path, body)
+        return status, size
+
+    def _send(self, method: str, path: str, body: dict | None) -> tuple[int, int]:
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header("Accept-Encoding", "gzip, br")
+        if data is not None:
+            req.add_header("Content-Type", "application/json")
+        if self.token:
+            req.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, len(resp.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read())
+
+    def _authenticate(self, path: str, body: dict):
+        req = urllib.request.Request(
+            self.base_url + path, data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            tokens = json.loads(resp.read())
+        self.token, self.refresh_token = tokens["access_token"], tokens.get("refresh_token")
+        self.expires_at = time.monotonic() + tokens.get("expires_in", math.inf)
+
+    def login(self, email: str, password: str):
+        self._authenticate("/api/auth/login", {"email": email, "password": password})
+
+    def refresh(self, stale_token: str | None):
+        """Swap the refresh token for a new pair, unless another thread already replaced ``stale_token``."""
+        with self._auth_lock:
+            if self.token != stale_token:
+                return
+            self._authenticate("/api/auth/refresh", {"refresh_token": self.refresh_token})
+
+
+def _pan_bbox(rng, bbox, span=0.25):
+    """A viewport covering ``span`` of the project extent at a random offset."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    w, h = (max_lon - min_lon) * span, (max_lat - min_lat) * span
+    x = rng.uniform(min_lon, max_lon - w)
+    y = rng.uniform(min_lat, max_lat - h)
+    return f"{x:.6f},{y:.6f},{x + w:.6f},{y + h:.6f}"
+
+
+def build_scenarios(manifest: dict) -> list[tuple[str, int, Callable]]:
+    """(route template, weight, fn(rng) -> (method, path, body))."""
+    projects = manifest["projects"]
+    task_ids = manifest["task_ids"]
+
+    def map_pan(rng):
+        p = rng.choice(projects)
+        return "GET", f"/api/projects/{p['id']}/map-layer?bbox={_pan_bbox(rng, p['bbox'])}", None
+
+    def map_full(rng):
+        return "GET", f"/api/projects/{rng.choice(projects)['id']}/map-layer", None
+
+    def dashboard(rng):
+        return "GET", "/api/dashboard/stats", None
+
+    def field_entry(rng):
+        task_id = rng.choice(task_ids)
+        return "POST", f"/api/tasks/{task_id}/field-entries", {
+            "task_id": task_id, "qty_delta": rng.randint(1, 50), "labor_hours": round(rng.uniform(0.5, 4), 1),
+            "notes": "bench", "offline_client_id": f"bench-{uuid.uuid4()}",
+        }
+
+    def timeline(rng):
+        return "GET", f"/api/dispatch/timeline?date_from={manifest['timeline_from']}&date_to={manifest['timeline_to']}", None
+
+    def payroll(rng):
+        return "POST", "/api/payroll/calculate-payroll", {"pay_run_id": manifest["pay_run_id"]}
+
+    def export(rng):
+        return "GET", f"/api/integrations/{rng.choice(EXPORT_PLATFORMS)}/export?project_id={rng.choice(projects)['id']}", None
+
+    return [
+        ("GET /api/projects/{project_id}/map-layer?bbox", 30, map_pan),
+        ("GET /api/projects/{project_id}/map-layer", 5, map_full),
+        ("GET /api/dashboard/stats", 15, dashboard),
+        ("POST /api/tasks/{task_id}/field-entries", 25, field_entry),
+        ("GET /api/dispatch/timeline", 15, timeline),
+        ("POST /api/payroll/calculate-payroll", 3, payroll),
+        ("GET /api/integrations/{platform}/export", 7, export),
+    ]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    routes = {}
+    for route, rows in sorted(samples.items()):
+        latencies = sorted(ms for ms, _, _ in rows)
+        routes[route] = {
+            "count": len(rows),
+            "errors": sum(1 for _, status, _ in rows if status >= 400 or status == 0),
+            "throughput_rps": round(len(rows) / elapsed, 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2),
+            "mean_bytes": round(sum(b for _, _, b in rows) / len(rows)),
+        }
+    all_latencies = sorted(ms for rows in samples.values() for ms, _, _ in rows)
+    total = {
+        "count": len(all_latencies),
+        "errors": sum(r["errors"] for r in routes.values()),
+        "throughput_rps": round(len(all_latencies) / elapsed, 2) if elapsed else 0,
+        "p50_ms": round(percentile(all_latencies, 50) or 0, 2),
+        "p95_ms": round(percentile(all_latencies, 95) or 0, 2),
+        "p99_ms": round(percentile(all_latencies, 99) or 0, 2),
+    }
+    return {"routes": routes, "total": total}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    scenarios = build_scenarios(manifest)
+    if args.only:
+        scenarios = [s for s in scenarios if any(o in s[0] for o in args.only)]
+    weights = [w for _, w, _ in scenarios]
+
+    client = Client(args.base_url, args.timeout)
+    client.login(manifest["email"], manifest["password"])
+
+    samples: dict[str, list] = {}
+    lock = threading.Lock()
+    deadline = {"warmup": time.monotonic() + args.warmup}
+    deadline["end"] = deadline["warmup"] + args.duration
+
+    def worker(n: int):
+        rng = random.Random(args.seed * 1000 + n)
+        while True:
+            now = time.monotonic()
+            if now >= deadline["end"]:
+                return
+            route, _, build = rng.choices(scenarios, weights=weights)[0]
+            method, path, body = build(rng)
+            start = time.perf_counter()
+            try:
+                status, size = client.request(method, path, body)
+            except (urllib.error.URLError, TimeoutError, ConnectionError):
+                status, size = 0, 0
+            ms = (time.perf_counter() - start) * 1000
+            if now >= deadline["warmup"]:
+                with lock:
+                    samples.setdefault(route, []).append((ms, status, size))
+
+    started_at = datetime.utcnow()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+
+    result = summarize(samples, args.duration)
+    result["meta"] = {
+        "commit": _git_commit(),
+        "started_at": started_at.isoformat(),
+        "base_url": args.base_url,
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "dataset": manifest.get("counts"),
+    }
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test a running app with the bench manifest")
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--manifest", default="bench_manifest.json")
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before measuring")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="*", help="substring filter on route names")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    out = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out)
+        t = result["total"]
+        print(f"{t['count']} requests, {t['throughput_rps']} req/s, p50 {t['p50_ms']} ms, "
+              f"p95 {t['p95_ms']} ms, p99 {t['p99_ms']} ms, {t['errors']} errors -> {args.output}")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Request, Response
+from fastapi import Depends, FastAPI, Request, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
@@ -6,7 +6,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from sqlalchemy import text
 from app.db.session import engine
-from app.core.config import CORS_ORIGINS
+from app.core.config import CORS_ORIGINS, MAPBOX_PUBLIC_TOKEN
+from app.core.compression import CompressionMiddleware
+from app.core.http_cache import NO_STORE, cache_static
+from app.core.responses import FastJSONResponse
+from app.core.static_assets import DIST_DIR, PrecompressedStaticFiles, asset_srcset, asset_url, build_assets, load_manifest
 from app.models.base import Base
 from app.models.models import (
     Org, User, OrgMember, Project, WorkPackage, TaskType, Task,
@@ -30,9 +34,9 @@ from app.api.ai import router as ai_router
 from app.api.integrations import router as integrations_router
 from app.api.admin import router as admin_router
 from app.api.billing import router as billing_router
-from app.api.dispatch import router as dispatch_router
+from app.api.dispatch import router as dispatch_router, manager as dispatch_manager
 from app.api.assets import router as assets_router
-from app.api.fleet import router as fleet_router
+from app.api.fleet import router as fleet_router, positions as fleet_positions
 from app.api.safety import router as safety_router
 from app.api.hr import router as hr_router
 from app.api.accounting import router as accounting_router
@@ -40,17 +44,22 @@ from app.api.payroll import router as payroll_router
 from app.api.onboarding import router as onboarding_router
 from app.api.screening import router as screening_router
 from app.api.crm import router as crm_router
+from app.api.sync import router as sync_router
+from app.services import change_feed
 
-app = FastAPI(title="Elite Technician Management Group", version="0.2.0")
+app = FastAPI(title="Elite Technician Management Group", version="0.2.0", default_response_class=FastJSONResponse)
 
 class NoCacheMiddleware(BaseHTTPMiddleware):
+    """Default API responses to no-store; routes with a cache policy set their own header."""
+
     async def dispatch(self, request: Request, call_next):
         response = await call_next(request)
         if request.url.path.startswith("/api") or request.url.path == "/":
-            response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+            response.headers.setdefault("Cache-Control", NO_STORE)
         return response
 
 app.add_middleware(NoCacheMiddleware)
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
@@ -59,8 +68,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.mount("/static/dist", PrecompressedStaticFiles(directory=DIST_DIR, check_dir=False), name="static-dist")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals.update(asset_url=asset_url, asset_srcset=asset_srcset)
 
 app.include_router(auth.router)
 app.include_router(projects.router)
@@ -92,6 +103,7 @@ app.include_router(payroll_router)
 app.include_router(onboarding_router)
 app.include_router(screening_router)
 app.include_router(crm_router)
+app.include_router(sync_router)
 
 
 @app.on_event("startup")
@@ -102,7 +114,90 @@ def startup():
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
         conn.commit()
     Base.metadata.create_all(bind=engine)
+    _upgrade_schema()
     _seed_defaults()
+    try:
+        build_assets()
+    except OSError as e:
+        # Read-only images ship a prebuilt dist/; fall back to whatever manifest is there.
+        print(f"Asset build skipped: {e}")
+    load_manifest()
+
+
+@app.on_event("startup")
+async def start_dispatch_bus():
+    await dispatch_manager.start()
+    await fleet_positions.start()
+
+
+@app.on_event("shutdown")
+async def stop_dispatch_bus():
+    await dispatch_manager.stop()
+    await fleet_positions.stop()
+
+
+# create_all only creates missing tables; columns and indexes added to
+# existing tables are applied here, and only the ones that are missing:
+# ALTER TABLE takes an ACCESS EXCLUSIVE lock even when IF NOT EXISTS makes it
+# a no-op. Indexes are built CONCURRENTLY after the upgrade transaction, so
+# writes to the table carry on while they build.
+SCHEMA_COLUMNS = [
+    ("attachments", "content_hash", "VARCHAR(64)"),
+    ("document_versions", "content_hash", "VARCHAR(64)"),
+    ("attachments", "thumbnail_sizes", "VARCHAR(100)"),
+    ("task_types", "gps_deviation_m", "DOUBLE PRECISION"),
+    *change_feed.SCHEMA_COLUMNS,
+]
+SCHEMA_INDEXES = {
+    "idx_dispatch_crew_window": "dispatch_jobs (crew_id, scheduled_end, scheduled_start)",
+    "idx_dispatch_unassigned": "dispatch_jobs (project_id, created_at) WHERE crew_id IS NULL",
+    **change_feed.SCHEMA_INDEXES,
+}
+# Run on every boot; each must be idempotent and lock no tables when there is nothing to do.
+SCHEMA_UPGRADES = [
+    *change_feed.SCHEMA_STATEMENTS,
+]
+
+
+def _upgrade_schema():
+    with engine.begin() as conn:
+        # Workers boot together; concurrent CREATE OR REPLACE FUNCTION can fail.
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('schema_upgrades'))"))
+        columns = set(conn.execute(text(
+            "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()"
+        )).all())
+        for table, column, column_type in SCHEMA_COLUMNS:
+            if (table, column) not in columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type}"))
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+    _build_indexes()
+
+
+def _build_indexes():
+    # CONCURRENTLY can't run inside a transaction block.
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # A worker waiting on the lock would hold a snapshot the build has to
+        # wait out, so the others skip it and the first one builds.
+        if not conn.execute(text("SELECT pg_try_advisory_lock(hashtext('schema_indexes'))")).scalar():
+            return
+        try:
+            indexes = dict(conn.execute(text("""
+                SELECT c.relname, i.indisvalid FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = current_schema()
+            """)).all())
+            for name, definition in SCHEMA_INDEXES.items():
+                if indexes.get(name):
+                    continue
+                if name in indexes:
+                    # Left invalid by an interrupted build.
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                print(f"Building index {name}")
+                conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"))
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext('schema_indexes'))"))
 
 
 def _seed_defaults():
@@ -524,10 +619,12 @@ def _seed_defaults():
         db.close()
 
 
-@app.get("/api/config")
+CLIENT_CONFIG = {"mapbox_token": MAPBOX_PUBLIC_TOKEN}
+
+
+@app.get("/api/config", dependencies=[Depends(cache_static(CLIENT_CONFIG, public=True))])
 def get_config():
-    from app.core.config import MAPBOX_PUBLIC_TOKEN
-    return {"mapbox_token": MAPBOX_PUBLIC_TOKEN}
+    return CLIENT_CONFIG
 
 
 @app.get("/", response_class=HTMLResponse)
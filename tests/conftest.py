@@ -0,0 +1,87 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+# The engine is built when app.db.session is first imported, so the test
+# database has to be in place before anything from the app is loaded.
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.chdir(ROOT)
+
+
+@pytest.fixture(scope="session")
+def engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set (needs a PostgreSQL database with PostGIS)")
+    from sqlalchemy import text
+    from app.db.session import engine
+    from app.models.base import Base
+    import app.models.models  # noqa: F401
+
+    with engine.connect() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+        conn.commit()
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def db(engine):
+    from sqlalchemy import text
+    from app.db.session import SessionLocal
+    from app.models.base import Base
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        tables = ", ".join(t.name for t in Base.metadata.sorted_tables)
+        with engine.connect() as conn:
+            conn.execute(text(f"TRUNCATE TABLE {tables} CASCADE"))
+            conn.commit()
+
+
+@pytest.fixture
+def client(engine):
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def count_queries(engine):
+    from sqlalchemy import event
+    from app.core.revocation import revocations
+
+    @contextmanager
+    def _count():
+        # Pull the revocation list up front so a periodic sync doesn't land
+        # inside the counted request.
+        revocations.sync()
+        counter = QueryCounter()
+        event.listen(engine, "before_cursor_execute", counter)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", counter)
+    return _count
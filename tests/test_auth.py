@@ -0,0 +1,97 @@
+"""Tokens: refresh rotation, revocation across workers and claims-based principals."""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from app.core.auth import (Membership, create_access_token, issue_tokens, principal_from_token,
+                           require_org_membership, require_project_access, revoke_user_tokens,
+                           rotate_refresh_token)
+from app.core.revocation import RevocationList
+from app.models.models import RoleName
+
+
+def _user(db, email="tech@example.com"):
+    from app.models.models import User
+
+    user = User(email=email, hashed_password="x", full_name="Tech")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def test_revocations_that_commit_late_are_still_picked_up(db):
+    from app.models.models import TokenRevocation
+
+    early, late = _user(db), _user(db, "late@example.com")
+    worker = RevocationList(sync_seconds=0)
+    now = datetime.utcnow()
+    db.add(TokenRevocation(user_id=early.id, reason="test", revoked_at=now))
+    db.commit()
+    worker.sync()
+    # Stamped before the first row but committed after this worker synced.
+    db.add(TokenRevocation(user_id=late.id, reason="test", revoked_at=now - timedelta(seconds=5)))
+    db.commit()
+    worker.sync()
+    assert worker.is_revoked(late.id, (now - timedelta(minutes=1) - datetime(1970, 1, 1)).total_seconds())
+
+
+def test_principals_come_from_token_claims_alone():
+    token = create_access_token({"sub": "u1", "email": "u1@example.com", "name": "U One",
+                                 "orgs": [{"id": "org-a", "role": "pm"}]})
+    principal = principal_from_token(token, None)
+    assert (principal.id, principal.email, principal.full_name) == ("u1", "u1@example.com", "U One")
+    assert principal.memberships == (Membership("org-a", RoleName.PM),)
+    require_org_membership(principal, "org-a")
+    with pytest.raises(HTTPException) as outsider:
+        require_org_membership(principal, "org-b")
+    assert outsider.value.status_code == 403
+    project = type("P", (), {"executing_org_id": "org-b", "owner_org_id": "org-a"})()
+    require_project_access(principal, project)
+
+
+@pytest.mark.parametrize("claims", [
+    {"sub": "u1"},  # pre-claims token, and no session to look it up with
+    {"sub": "u1", "orgs": [{"id": "org-a", "role": "emperor"}]},
+    {"sub": "u1", "orgs": "org-a"},
+])
+def test_tokens_without_usable_claims_are_rejected(claims):
+    with pytest.raises(HTTPException) as rejected:
+        principal_from_token(create_access_token(claims), None)
+    assert rejected.value.status_code == 401
+
+
+def test_refresh_tokens_rotate_and_reuse_revokes_the_family(db, monkeypatch):
+    monkeypatch.setattr("app.core.auth.REFRESH_REUSE_GRACE_SECONDS", -1)
+    user = _user(db)
+    first = issue_tokens(user, db)
+    db.commit()
+    second = rotate_refresh_token(first["refresh_token"], db)
+    third = rotate_refresh_token(second["refresh_token"], db)
+    assert len({first["refresh_token"], second["refresh_token"], third["refresh_token"]}) == 3
+    assert principal_from_token(third["access_token"], db).id == user.id
+
+    # The first token turns up again: it leaked, so nobody in the family may refresh.
+    for token in (first["refresh_token"], third["refresh_token"]):
+        with pytest.raises(HTTPException) as refused:
+            rotate_refresh_token(token, db)
+        assert refused.value.status_code == 401
+    # Another sign-in starts a family of its own.
+    rotate_refresh_token(issue_tokens(user, db)["refresh_token"], db)
+
+
+def test_revocations_reach_other_workers(db):
+    user = _user(db)
+    issued = create_access_token({"sub": user.id, "orgs": []})
+    other_worker = RevocationList(sync_seconds=0)
+    assert not other_worker.is_revoked(user.id, time.time())
+
+    revoke_user_tokens(db, user.id, "role_change")
+    db.commit()
+    with pytest.raises(HTTPException):
+        principal_from_token(issued, None)  # this worker knows at once
+    iat = jwt.get_unverified_claims(issued)["iat"]
+    assert other_worker.is_revoked(user.id, iat)
+    assert not other_worker.is_revoked(user.id, time.time() + 1)  # tokens issued afterwards still work
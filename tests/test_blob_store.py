@@ -0,0 +1,113 @@
+"""Content-addressed blob storage and reference counting."""
+import asyncio
+import hashlib
+import io
+from datetime import datetime, timedelta
+
+from app.models.models import Blob
+from app.services import blob_store
+from app.services.upload_service import StoredUpload
+
+
+class FakeS3Client:
+    """In-memory stand-in for the subset of boto3's S3 client the backend uses."""
+
+    class NotFound(Exception):
+        response = {"Error": {"Code": "404"}}
+
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self.NotFound()
+        return {}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[(Bucket, Key)] = (Body if isinstance(Body, bytes) else Body.read(), ContentType)
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)][0])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+def _stored(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return StoredUpload(path=str(path), size=len(data), sha256=hashlib.sha256(data).hexdigest())
+
+
+def test_s3_backend_against_stand_in(tmp_path):
+    client = FakeS3Client()
+    backend = blob_store.S3Backend("uploads", prefix="ftth/", client=client)
+    saved = _stored(tmp_path, "a.jpg", b"photo")
+    key = blob_store.blob_key(saved.sha256, "image/jpeg")
+
+    assert not backend.exists(key)
+    backend.put_file(key, saved.path, "image/jpeg")
+    assert backend.exists(key)
+    assert client.objects[("uploads", f"ftth/{key}")] == (b"photo", "image/jpeg")
+    assert not (tmp_path / "a.jpg").exists()
+    assert backend.local_path(key) is None
+    assert backend.url(key).startswith(f"https://s3.test/uploads/ftth/{key}")
+    assert blob_store.S3Backend("b", client=client, public_url="https://cdn.test/").url(key) == f"https://cdn.test/{key}"
+
+    backend.delete(key)
+    assert not backend.exists(key)
+
+
+def test_rows_keep_blob_refs_and_links_are_made_on_read(monkeypatch):
+    backend = blob_store.S3Backend("uploads", client=FakeS3Client())
+    monkeypatch.setattr(blob_store, "backend", backend)
+    ref = blob_store.blob_ref("ab/cd/abcd.jpg")
+    assert ref == "blob:ab/cd/abcd.jpg"
+    assert blob_store.file_url(ref) == backend.url("ab/cd/abcd.jpg")
+    assert blob_store.file_url("/static/uploads/legacy.jpg") == "/static/uploads/legacy.jpg"
+    assert blob_store.file_url(None) is None
+
+
+def test_local_backend_layout(tmp_path):
+    backend = blob_store.LocalBackend(root=str(tmp_path / "blobs"))
+    saved = _stored(tmp_path, "doc.pdf", b"%PDF-1.7")
+    key = blob_store.blob_key(saved.sha256, "application/pdf")
+    assert key == f"{saved.sha256[:2]}/{saved.sha256[2:4]}/{saved.sha256}.pdf"
+
+    backend.put_file(key, saved.path)
+    assert open(backend.local_path(key), "rb").read() == b"%PDF-1.7"
+    assert backend.url(key) == f"/static/uploads/blobs/{key}"
+    backend.delete(key)
+    backend.delete(key)
+    assert not backend.exists(key)
+
+
+def test_refcounts_share_one_object_and_gc_after_grace(db, tmp_path, monkeypatch):
+    client = FakeS3Client()
+    monkeypatch.setattr(blob_store, "backend", blob_store.S3Backend("uploads", client=client))
+    data = b"same photo"
+
+    first = asyncio.run(blob_store.adopt(db, _stored(tmp_path, "1.jpg", data), "image/jpeg"))
+    second = asyncio.run(blob_store.adopt(db, _stored(tmp_path, "2.jpg", data), "image/jpeg"))
+    db.commit()
+    assert first == second
+    assert len(client.objects) == 1
+    sha = hashlib.sha256(data).hexdigest()
+    assert db.get(Blob, sha).ref_count == 2
+
+    assert blob_store.release(db, sha)
+    assert blob_store.release(db, sha)
+    assert not blob_store.release(db, "0" * 64)
+    db.commit()
+    db.expire_all()
+    assert db.get(Blob, sha).ref_count == 0
+
+    assert blob_store.collect_garbage(db, grace_seconds=3600) == 0
+    db.get(Blob, sha).updated_at = datetime.utcnow() - timedelta(hours=2)
+    db.commit()
+    assert blob_store.collect_garbage(db, grace_seconds=3600) == 1
+    assert client.objects == {}
+    assert db.get(Blob, sha) is None
@@ -0,0 +1,72 @@
+"""Delta-sync change feed."""
+import pytest
+from sqlalchemy import text
+
+from app.core.auth import access_claims_for, create_access_token
+from app.models.models import FieldEntry, Org, OrgMember, Project, Task, User
+from app.services import change_feed
+
+
+@pytest.fixture
+def feed_client(client, db, engine):
+    with engine.begin() as conn:
+        for statement in change_feed.SCHEMA_STATEMENTS:
+            conn.execute(text(statement))
+    org = Org(name="Feed Org")
+    db.add(org)
+    db.flush()
+    user = User(email=f"feed-{org.id}@example.com", hashed_password="x", full_name="Feed User")
+    db.add(user)
+    db.flush()
+    db.add(OrgMember(org_id=org.id, user_id=user.id, role="field_lead"))
+    project = Project(name="Feed Project", executing_org_id=org.id)
+    db.add(project)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(access_claims_for(user))}"}
+
+    def changes(cursor=None, limit=500, expect=200):
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        resp = client.get(f"/api/projects/{project.id}/changes", params=params, headers=headers)
+        assert resp.status_code == expect, resp.text
+        return resp.json()
+
+    return changes, project, user
+
+
+def _ids(page, entity):
+    block = page["changes"].get(entity)
+    return [row[block["columns"].index("id")] for row in block["rows"]] if block else []
+
+
+def test_pages_then_returns_only_new_changes_and_tombstones(feed_client, db):
+    changes, project, user = feed_client
+    tasks = [Task(project_id=project.id, name=f"Span {i}") for i in range(3)]
+    db.add_all(tasks)
+    db.commit()
+    db.add(FieldEntry(task_id=tasks[0].id, user_id=user.id, qty_delta=10))
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        page = changes(cursor, limit=2)
+        seen += _ids(page, "tasks") + _ids(page, "field_entries")
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert len(seen) == 4 and len(set(seen)) == 4
+
+    assert changes(cursor)["changes"] == {}
+
+    tasks[1].name = "Span 1 (rerouted)"
+    db.delete(tasks[2])
+    db.commit()
+    page = changes(cursor)
+    assert _ids(page, "tasks") == [tasks[1].id]
+    assert page["deleted"] == {"tasks": [tasks[2].id]}
+
+
+def test_bad_and_expired_cursors(feed_client):
+    changes, _, _ = feed_client
+    txid, seq, _ = changes()["cursor"].split(".")
+    changes("garbage", expect=400)
+    changes(f"{txid}.{seq}.0", expect=410)
@@ -0,0 +1,63 @@
+"""Response compression middleware."""
+import gzip
+import json
+
+from fastapi import Depends, FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware, skip_compression
+
+FEATURES = [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [i, i]}} for i in range(2000)]
+
+
+def _client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/layer")
+    def layer():
+        return {"type": "FeatureCollection", "features": FEATURES}
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/export")
+    def export():
+        return StreamingResponse((f"{i},row\n".encode() for i in range(5000)), media_type="text/csv")
+
+    @app.get("/photo")
+    def photo():
+        return Response(b"\xff\xd8" + b"0" * 4096, media_type="image/jpeg")
+
+    @app.get("/raw", dependencies=[Depends(skip_compression)])
+    def raw():
+        return {"features": FEATURES}
+
+    return TestClient(app)
+
+
+def test_large_json_is_compressed_with_length():
+    resp = _client().get("/layer", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert int(resp.headers["content-length"]) < len(json.dumps(resp.json()))
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert resp.json()["features"] == FEATURES
+
+
+def test_streaming_body_is_compressed_without_length():
+    client = _client()
+    with client.stream("GET", "/export", headers={"Accept-Encoding": "gzip"}) as resp:
+        raw = b"".join(resp.iter_raw())
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "content-length" not in resp.headers
+    assert gzip.decompress(raw).count(b"\n") == 5000
+
+
+def test_pass_through_cases():
+    client = _client()
+    headers = {"Accept-Encoding": "gzip, br"}
+    for path in ("/small", "/photo", "/raw"):
+        assert "content-encoding" not in client.get(path, headers=headers).headers, path
+    assert "content-encoding" not in client.get("/layer", headers={"Accept-Encoding": "identity"}).headers
@@ -0,0 +1,80 @@
+"""Bulk dispatch operations: one transaction, one event, a fixed number of queries."""
+from datetime import datetime, timedelta
+
+from app.core.auth import access_claims_for, create_access_token
+from app.models.models import Crew, DispatchJob, DispatchJobStatus, Org, OrgMember, Project, User
+
+DAY = datetime(2026, 3, 2)
+
+
+def _seed(db, n):
+    org = Org(name="Bulk Org")
+    user = User(email=f"bulk-{n}@example.com", hashed_password="x", full_name="Bulk")
+    db.add_all([org, user])
+    db.flush()
+    db.add(OrgMember(org_id=org.id, user_id=user.id, role="org_admin"))
+    project = Project(name="P", executing_org_id=org.id)
+    sick, cover = Crew(org_id=org.id, name="Sick", max_jobs_per_day=n), Crew(org_id=org.id, name="Cover",
+                                                                           max_jobs_per_day=n)
+    db.add_all([project, sick, cover])
+    db.flush()
+    jobs = [DispatchJob(project_id=project.id, crew_id=sick.id, title=f"Job {i}", created_by=user.id,
+                        status=DispatchJobStatus.SCHEDULED, scheduled_start=DAY + timedelta(days=i),
+                        scheduled_end=DAY + timedelta(days=i, hours=2)) for i in range(n)]
+    db.add_all(jobs)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(access_claims_for(user))}"}
+    return headers, sick, cover, jobs
+
+
+def test_a_crews_jobs_move_in_one_go(client, db, count_queries):
+    counts = []
+    for n in (5, 50):
+        headers, sick, cover, jobs = _seed(db, n)
+        operations = [{"job_id": j.id, "crew_id": cover.id} for j in jobs]
+        with count_queries() as counter:
+            resp = client.post("/api/dispatch/jobs/bulk", json={"operations": operations}, headers=headers)
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["updated"] == n
+        counts.append(counter.count)
+        db.expire_all()
+        assert {j.crew_id for j in db.query(DispatchJob).filter(DispatchJob.project_id == jobs[0].project_id)} \
+            == {cover.id}
+    assert counts[0] == counts[1]
+
+
+def test_a_conflict_fails_the_whole_batch(client, db):
+    headers, sick, cover, jobs = _seed(db, 3)
+    clash = {"job_id": jobs[1].id, "crew_id": cover.id, "scheduled_start": jobs[0].scheduled_start.isoformat(),
+             "scheduled_end": jobs[0].scheduled_end.isoformat()}
+    operations = [{"job_id": jobs[0].id, "crew_id": cover.id}, clash, {"job_id": jobs[2].id, "status": "completed"}]
+    resp = client.post("/api/dispatch/jobs/bulk", json={"operations": operations}, headers=headers)
+    assert resp.status_code == 409
+    assert resp.json()["detail"]["conflicts"][0]["type"] == "overlap"
+    db.expire_all()
+    assert {j.crew_id for j in db.query(DispatchJob)} == {sick.id}
+
+    resp = client.post("/api/dispatch/jobs/bulk", json={"operations": operations, "force": True}, headers=headers)
+    assert resp.status_code == 200
+    assert [j["status"] for j in resp.json()["jobs"]] == ["scheduled", "scheduled", "completed"]
+
+
+def test_events_reach_the_projects_owner_and_executing_orgs(client, db, monkeypatch):
+    from app.api import dispatch
+
+    published = []
+
+    async def record(db, events):
+        published.extend((org_id, message["type"], len(message.get("jobs", ()))) for org_id, message, _, _ in events)
+
+    monkeypatch.setattr(dispatch.manager, "broadcast_many", record)
+    headers, sick, cover, jobs = _seed(db, 2)
+    owner = Org(name="Owner Org")
+    db.add(owner)
+    db.flush()
+    db.get(Project, jobs[0].project_id).owner_org_id = owner.id
+    db.commit()
+
+    operations = [{"job_id": j.id, "crew_id": cover.id} for j in jobs]
+    assert client.post("/api/dispatch/jobs/bulk", json={"operations": operations}, headers=headers).status_code == 200
+    assert sorted(published) == sorted([(owner.id, "jobs_updated", 2), (sick.org_id, "jobs_updated", 2)])
@@ -0,0 +1,115 @@
+"""Cross-worker dispatch event bus."""
+import asyncio
+import json
+
+import anyio
+
+from app.services import dispatch_bus
+
+
+def _collect(bus, publish, expected):
+    async def run():
+        received = []
+        done = asyncio.Event()
+
+        async def deliver(event, frame):
+            assert json.loads(frame) == event
+            received.append(event)
+            if len(received) == expected:
+                done.set()
+
+        await bus.start(deliver)
+        try:
+            await publish()
+            await asyncio.wait_for(done.wait(), timeout=5)
+        finally:
+            await bus.stop()
+        return received
+    return asyncio.run(run())
+
+
+def test_memory_bus_numbers_events_per_org():
+    bus = dispatch_bus.MemoryBus()
+
+    async def publish():
+        await bus.publish(None, "org-a", {"type": "job_deleted", "job_id": "j1"})
+        await bus.publish(None, "org-b", {"type": "job_deleted", "job_id": "j2"})
+        await bus.publish(None, "org-a", {"type": "job_deleted", "job_id": "j3"})
+
+    received = _collect(bus, publish, 3)
+    assert [(e["org_id"], e["seq"], e["job_id"]) for e in received] == [
+        ("org-a", 1, "j1"), ("org-b", 1, "j2"), ("org-a", 2, "j3")]
+
+
+def test_worker_threads_publish_without_awaiting():
+    bus = dispatch_bus.MemoryBus()
+
+    async def publish():
+        await anyio.to_thread.run_sync(bus.publish_blocking, None, [
+            ("org-a", {"type": "job_deleted", "job_id": "j1"}), ("org-b", {"type": "job_deleted", "job_id": "j2"})])
+
+    received = _collect(bus, publish, 2)
+    assert [(e["org_id"], e["seq"]) for e in received] == [("org-a", 1), ("org-b", 1)]
+
+
+def test_oversized_events_drop_the_job_body():
+    event = {"type": "job_updated", "job": {"id": "j1", "notes": "x" * 10000}}
+    assert dispatch_bus._encode(event) == '{"type":"job_updated","job_id":"j1"}'
+    small = {"type": "job_updated", "job": {"id": "j1", "notes": "short"}}
+    assert dispatch_bus._encode(small) == '{"type":"job_updated","job":{"id":"j1","notes":"short"}}'
+
+
+def test_postgres_bus_delivers_through_notify(db):
+    from app.models.models import Org
+
+    org = Org(name="Bus Org")
+    db.add(org)
+    db.commit()
+    bus = dispatch_bus.PostgresBus()
+
+    async def publish():
+        # Give the listener time to connect and LISTEN before notifying.
+        for _ in range(50):
+            if bus.listening:
+                break
+            await asyncio.sleep(0.1)
+        await bus.publish(db, org.id, {"type": "job_deleted", "job_id": "j1"})
+        await bus.publish_many(db, [(org.id, {"type": "job_deleted", "job_id": "j2"}),
+                                    (other.id, {"type": "job_deleted", "job_id": "j3"})])
+
+    other = Org(name="Other Bus Org")
+    db.add(other)
+    db.commit()
+    received = _collect(bus, publish, 3)
+    assert [(e["org_id"], e["seq"], e["job_id"]) for e in received] == [
+        (org.id, 1, "j1"), (org.id, 2, "j2"), (other.id, 1, "j3")]
+
+
+def test_oversized_bulk_events_keep_only_job_ids():
+    jobs = [{"id": f"j{i}", "crew_id": "c1", "notes": "x" * 200} for i in range(50)]
+    payload = json.loads(dispatch_bus._encode({"type": "jobs_updated", "jobs": jobs}))
+    assert payload == {"type": "jobs_updated", "job_ids": [f"j{i}" for i in range(50)]}
+
+
+def test_unsequenced_buses_leave_events_unnumbered():
+    bus = dispatch_bus.MemoryBus(sequenced=False)
+
+    async def publish():
+        await bus.publish(None, "org-a", {"type": "positions", "positions": []})
+
+    [event] = _collect(bus, publish, 1)
+    assert event == {"type": "positions", "positions": [], "org_id": "org-a"}
+
+
+def test_events_too_large_even_as_ids_become_an_org_resync():
+    import uuid
+
+    bus = dispatch_bus.MemoryBus()
+    jobs = [{"id": str(uuid.uuid4()), "crew_id": str(uuid.uuid4())} for _ in range(500)]
+    event = {"type": "jobs_updated", "jobs": jobs, "crew_ids": [j["crew_id"] for j in jobs]}
+
+    async def publish():
+        await bus.publish(None, "org-a", event)
+
+    [received] = _collect(bus, publish, 1)
+    assert received == {"type": "resync", "org_id": "org-a", "seq": 1}
@@ -0,0 +1,81 @@
+"""Crew double-booking and over-capacity detection."""
+import random
+from datetime import datetime, timedelta
+
+from app.models.models import Crew, DispatchJob, DispatchJobStatus, Org, Project, User
+from app.services.dispatch_conflicts import Booking, check_booking, conflicts_in_range, describe, find_conflicts
+
+DAY = datetime(2026, 3, 2)
+
+
+def _at(hour, minutes=0, day=0):
+    return DAY + timedelta(days=day, hours=hour, minutes=minutes)
+
+
+def _pairs(conflicts):
+    return {frozenset(c["job_ids"]) for c in conflicts if c["type"] == "overlap"}
+
+
+def test_overlaps_are_found_per_crew_and_touching_jobs_are_fine():
+    bookings = [
+        Booking("a", "c1", _at(8), _at(12)),
+        Booking("b", "c1", _at(10), _at(11)),
+        Booking("c", "c1", _at(11, 30), _at(14)),
+        Booking("d", "c1", _at(14), _at(15)),  # starts as c ends
+        Booking("e", "c2", _at(8), _at(12)),  # another crew
+        Booking("f", "c1", _at(9), None),  # no end: only counts toward the day
+    ]
+    assert _pairs(find_conflicts(bookings, {})) == {frozenset("ab"), frozenset("ac")}
+
+
+def test_over_full_days_are_reported():
+    bookings = [Booking(f"j{i}", "c1", _at(8 + i), _at(8 + i, 30)) for i in range(4)]
+    bookings.append(Booking("next", "c1", _at(8, day=1), _at(9, day=1)))
+    [conflict] = find_conflicts(bookings, {"c1": 3})
+    assert (conflict["type"], conflict["date"], len(conflict["job_ids"])) == ("over_capacity", "2026-03-02", 4)
+    assert "limited to 3 jobs" in describe([conflict])
+
+
+def test_the_sweep_agrees_with_checking_every_pair():
+    rng = random.Random(3)
+    bookings = []
+    for i in range(300):
+        start = _at(6) + timedelta(minutes=rng.randrange(0, 7 * 24 * 60, 15))
+        bookings.append(Booking(f"j{i}", f"c{i % 4}", start, start + timedelta(minutes=rng.randrange(30, 300, 15))))
+    expected = {frozenset((a.id, b.id)) for a in bookings for b in bookings
+                if a.id < b.id and a.crew_id == b.crew_id and a.start < b.end and b.start < a.end}
+    assert _pairs(find_conflicts(bookings, {})) == expected
+
+
+def _crew_with_jobs(db, max_jobs_per_day=5):
+    org = Org(name="Conflict Org")
+    user = User(email="conflicts@example.com", hashed_password="x", full_name="Conflicts")
+    db.add_all([org, user])
+    db.flush()
+    project = Project(name="P", executing_org_id=org.id)
+    crew = Crew(org_id=org.id, name="Crew", max_jobs_per_day=max_jobs_per_day)
+    db.add_all([project, crew])
+    db.flush()
+    for title, start, end, status in [("Morning", _at(8), _at(12), DispatchJobStatus.SCHEDULED),
+                                      ("Cancelled", _at(12), _at(16), DispatchJobStatus.CANCELLED)]:
+        db.add(DispatchJob(project_id=project.id, crew_id=crew.id, title=title, created_by=user.id,
+                           scheduled_start=start, scheduled_end=end, status=status))
+    db.commit()
+    return org, crew
+
+
+def test_bookings_are_checked_against_the_crews_other_jobs(db):
+    org, crew = _crew_with_jobs(db, max_jobs_per_day=2)
+    [overlap] = check_booking(db, crew.id, "new", _at(11), _at(13))
+    assert overlap["titles"][0] == "Morning"
+    assert (overlap["start"], overlap["end"]) == (_at(11).isoformat(), _at(12).isoformat())
+    assert check_booking(db, crew.id, "new", _at(12), _at(16)) == []  # the clashing job is cancelled
+    db.rollback()
+
+    crew.max_jobs_per_day = 1
+    db.commit()
+    [full] = check_booking(db, crew.id, "new", _at(13), _at(14))
+    assert full["type"] == "over_capacity"
+    db.rollback()
+
+    assert len(conflicts_in_range(db, org.id, DAY, DAY + timedelta(days=1))) == 0
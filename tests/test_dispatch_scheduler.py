@@ -0,0 +1,150 @@
+"""Auto-scheduling unassigned dispatch jobs onto crews."""
+from datetime import date, datetime, time
+from types import SimpleNamespace
+
+from app.services.dispatch_scheduler import CrewSpec, JobSpec, Stop, job_spec, parse_skills, parse_workday, solve
+from app.services.travel import haversine_km, travel_minutes
+
+DAY = date(2026, 3, 2)
+WORKDAY = (time(8), time(17))
+DEPOT = (40.0, -105.0)
+
+
+def _job(job_id, hours=2, job_type="splicing", priority="medium", location=DEPOT, **window):
+    return JobSpec(job_id, job_type, hours * 60, priority, location, **window)
+
+
+def _crew(crew_id, skills="splicing", max_jobs=5, origin=DEPOT, busy=()):
+    return CrewSpec(crew_id, parse_skills(skills), max_jobs, origin, list(busy))
+
+
+def _check(schedule, crews):
+    """No overlaps, room for travel between consecutive stops, and inside the day."""
+    for crew in crews:
+        mine = sorted(crew.busy + [Stop(p.job_id, p.start, p.end, None, False)
+                                   for p in schedule.placements if p.crew_id == crew.id], key=lambda s: s.start)
+        for a, b in zip(mine, mine[1:]):
+            assert a.end <= b.start
+    for p in schedule.placements:
+        assert time(8) <= p.start.time() and p.end.time() <= time(17)
+
+
+def test_haversine_matches_a_known_distance():
+    # Denver to Boulder is about 38.8 km as the crow flies.
+    assert abs(haversine_km((39.7392, -104.9903), (40.0150, -105.2705)) - 38.8) < 0.5
+    assert travel_minutes(None, DEPOT) == 0
+
+
+def test_skills_are_matched_loosely_and_empty_skills_mean_any_job():
+    crews = [_crew("fusion", "Fusion Splicing, aerial"), _crew("any", "")]
+    jobs = [_job("j1", job_type="fusion-splicing"), _job("j2", job_type="Underground Boring")]
+    schedule = solve(jobs, crews, [DAY], WORKDAY)
+    crews_for = {p.job_id: p.crew_id for p in schedule.placements}
+    assert crews_for["j2"] == "any"
+    assert crews_for["j1"] in {"fusion", "any"}
+
+    schedule = solve(jobs, crews[:1], [DAY], WORKDAY)
+    assert "skill" in schedule.unassigned["j2"]
+
+
+def test_capacity_and_existing_bookings_are_respected():
+    booked = Stop("b1", datetime(2026, 3, 2, 8), datetime(2026, 3, 2, 12), DEPOT, fixed=True)
+    crews = [_crew("c1", max_jobs=3, busy=[booked])]
+    jobs = [_job(f"j{i}", hours=1) for i in range(4)]
+    schedule = solve(jobs, crews, [DAY], WORKDAY)
+    assert len(schedule.placements) == 2  # max 3 a day, one already booked
+    assert len(schedule.unassigned) == 2
+    assert all(p.start >= booked.end for p in schedule.placements)
+    _check(schedule, crews)
+
+
+def test_crews_without_a_daily_limit_take_any_number_of_jobs():
+    for limit in (None, 0):
+        crews = [_crew("c1", max_jobs=limit)]
+        schedule = solve([_job(f"j{i}", hours=1) for i in range(6)], crews, [DAY], WORKDAY)
+        assert len(schedule.placements) == 6 and not schedule.unassigned
+        _check(schedule, crews)
+
+
+def test_travel_time_is_left_between_jobs():
+    far = (40.5, -105.0)  # ~56 km north, ~87 minutes' drive
+    crews = [_crew("c1")]
+    schedule = solve([_job("near", priority="high"), _job("far", location=far)], crews, [DAY], WORKDAY)
+    near, far_job = sorted(schedule.placements, key=lambda p: p.start)
+    assert (far_job.start - near.end).total_seconds() / 60 >= travel_minutes(DEPOT, far)
+    assert schedule.travel_minutes > 80
+    _check(schedule, crews)
+
+
+def test_priority_decides_who_waits_when_a_day_is_full():
+    crews = [_crew("c1", max_jobs=1)]
+    jobs = [_job("low", priority="low"), _job("critical", priority="critical")]
+    schedule = solve(jobs, crews, [DAY, date(2026, 3, 3)], WORKDAY)
+    start = {p.job_id: p.start for p in schedule.placements}
+    assert start["critical"].date() == DAY
+    assert start["low"].date() == date(2026, 3, 3)
+
+
+def test_jobs_go_to_the_nearer_crew():
+    north, south = (41.0, -105.0), (39.0, -105.0)
+    crews = [_crew("north", origin=north), _crew("south", origin=south)]
+    jobs = [_job("n1", location=(40.9, -105.0)), _job("s1", location=(39.1, -105.0)),
+            _job("n2", location=(40.95, -105.05))]
+    schedule = solve(jobs, crews, [DAY], WORKDAY)
+    assert {p.job_id: p.crew_id for p in schedule.placements} == {"n1": "north", "n2": "north", "s1": "south"}
+
+
+def test_time_windows_and_large_inputs_stay_feasible():
+    crews = [_crew(f"c{i}", origin=(40 + i / 10, -105.0)) for i in range(5)]
+    jobs = [_job(f"j{i}", hours=1 + i % 3, location=(40 + (i * 7 % 13) / 20, -105 + (i * 5 % 11) / 20))
+            for i in range(60)]
+    jobs.append(_job("pinned", hours=1, window_start=datetime(2026, 3, 2, 14), window_end=datetime(2026, 3, 2, 15)))
+    schedule = solve(jobs, crews, [DAY, date(2026, 3, 3)], WORKDAY, budget_seconds=1.0)
+    assert schedule.elapsed_ms < 3000
+    assert len(schedule.placements) + len(schedule.unassigned) == len(jobs)
+    pinned = next(p for p in schedule.placements if p.job_id == "pinned")
+    assert (pinned.start, pinned.end) == (datetime(2026, 3, 2, 14), datetime(2026, 3, 2, 15))
+    _check(schedule, crews)
+
+
+def test_job_specs_and_workdays():
+    job = SimpleNamespace(id="j1", job_type="aerial", estimated_duration_hrs=None, priority=None,
+                          location_lat=40.0, location_lng=None, scheduled_start=None, scheduled_end=None)
+    spec = job_spec(job)
+    assert (spec.duration_min, spec.priority, spec.location, spec.window_start) == (120, "medium", None, None)
+    assert parse_workday("06:30 - 15:00") == (time(6, 30), time(15))
+
+
+def test_committing_drops_placements_overtaken_while_solving(db):
+    from app.api.dispatch import _commit_schedule
+    from app.models.models import Crew, DispatchJob, DispatchJobStatus, Org, Project, User
+    from app.services.dispatch_scheduler import Placement
+
+    org = Org(name="Planner Org")
+    user = User(email="planner@example.com", hashed_password="x", full_name="Planner")
+    db.add_all([org, user])
+    db.flush()
+    project = Project(name="P", executing_org_id=org.id)
+    crew = Crew(org_id=org.id, name="Crew")
+    db.add_all([project, crew])
+    db.flush()
+
+    def at(hour):
+        return datetime.combine(DAY, time(hour))
+
+    free, clashing, taken = (DispatchJob(project_id=project.id, title=t, created_by=user.id,
+                                         status=DispatchJobStatus.UNASSIGNED) for t in ("free", "clashing", "taken"))
+    db.add_all([free, clashing, taken])
+    db.flush()
+    # Booked by a dispatcher while the plan was being solved.
+    taken.crew_id, taken.status = crew.id, DispatchJobStatus.SCHEDULED
+    taken.scheduled_start, taken.scheduled_end = at(13), at(15)
+    db.commit()
+
+    placements = [Placement(free.id, crew.id, at(8), at(10), 0), Placement(clashing.id, crew.id, at(12), at(14), 0),
+                  Placement(taken.id, crew.id, at(15), at(16), 0)]
+    kept, dropped, scheduled = _commit_schedule(db, org.id, placements)
+    assert [p.job_id for p in kept] == [free.id] and [j["id"] for j in scheduled] == [free.id]
+    assert set(dropped) == {clashing.id, taken.id}
+    db.expire_all()
+    assert (db.get(DispatchJob, clashing.id).crew_id, db.get(DispatchJob, free.id).crew_id) == (None, crew.id)
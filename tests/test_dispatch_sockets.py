@@ -0,0 +1,190 @@
+"""Dispatch board WebSockets: auth, topic routing and slow-client queues."""
+import asyncio
+import json
+import time
+from contextlib import ExitStack
+
+import pytest
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.core.auth import Membership, Principal, create_access_token
+from app.core.config import ALGORITHM, SECRET_KEY
+from app.models.models import RoleName
+from app.services.dispatch_bus import RESYNC, MemoryBus
+from app.services.dispatch_sockets import Connection, DispatchConnectionManager
+
+
+def _token(user_id="u1", orgs=("org-a",), **claims):
+    return create_access_token({"sub": user_id, "orgs": [{"id": o, "role": "pm"} for o in orgs], **claims})
+
+
+@pytest.fixture
+def board():
+    manager = DispatchConnectionManager(bus=MemoryBus())
+    app = FastAPI()
+    app.state.manager = manager
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await manager.serve(websocket)
+
+    @app.post("/publish")
+    async def publish(body: dict):
+        return await manager.broadcast(None, body["org_id"], body["event"], project_id=body.get("project_id"),
+                                       crew_ids=body.get("crew_ids", []))
+
+    with TestClient(app) as client:
+        yield client
+
+
+def _open(client, stack, **auth):
+    ws = stack.enter_context(client.websocket_connect("/ws"))
+    ws.send_json({"type": "auth", **auth})
+    _assert_idle(ws)
+    return ws
+
+
+def _assert_idle(ws):
+    """Nothing queued: a ping is answered straight away."""
+    ws.send_json({"type": "ping"})
+    assert ws.receive_json() == {"type": "pong"}
+
+
+def test_unauthenticated_sockets_are_closed(board):
+    with board.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "ping"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    assert closed.value.code == 4401
+
+    with board.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "auth", "token": "not-a-jwt"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    assert closed.value.code == 4401
+
+
+def test_events_reach_only_subscribed_sockets(board):
+    with ExitStack() as stack:
+        whole_org = _open(board, stack, token=_token())
+        one_project = _open(board, stack, token=_token(), projects=["p1"])
+        one_crew = _open(board, stack, token=_token(), crews=["c1"])
+        other_org = _open(board, stack, token=_token("u2", orgs=("org-b",)))
+
+        event = {"type": "job_updated", "job": {"id": "j1"}}
+        board.post("/publish", json={"org_id": "org-a", "event": event, "project_id": "p2", "crew_ids": ["c1"]})
+        first = whole_org.receive_json()
+        assert (first["seq"], first["project_id"], first["crew_ids"]) == (1, "p2", ["c1"])
+        assert one_crew.receive_json() == first
+        _assert_idle(one_project)
+        _assert_idle(other_org)
+
+        board.post("/publish", json={"org_id": "org-a", "event": event, "project_id": "p1"})
+        assert whole_org.receive_json()["seq"] == 2
+        assert one_project.receive_json()["seq"] == 2
+        _assert_idle(one_crew)
+
+        one_project.send_json({"type": "subscribe"})
+        board.post("/publish", json={"org_id": "org-a", "event": event, "project_id": "p3"})
+        assert one_project.receive_json()["seq"] == 3
+
+        # Too large to send even as ids: every board of the org reloads, whatever it is narrowed to.
+        huge = {"type": "jobs_scheduled", "job_ids": [f"job-{i:040d}" for i in range(300)]}
+        board.post("/publish", json={"org_id": "org-a", "event": huge, "project_id": "p9"})
+        assert one_crew.receive_json() == {"type": "resync", "org_id": "org-a", "seq": 4}
+        _assert_idle(other_org)
+
+
+def test_expired_tokens_close_the_socket(board):
+    expiring = jwt.encode({"sub": "u1", "typ": "access", "iat": time.time(), "exp": int(time.time()) + 1,
+                           "orgs": [{"id": "org-a", "role": "pm"}]}, SECRET_KEY, algorithm=ALGORITHM)
+    with board.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "auth", "token": expiring})
+        _assert_idle(ws)
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    assert closed.value.code == 4401
+
+    with board.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "auth", "token": _token()})
+        ws.send_json({"type": "auth", "token": _token("someone-else")})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    assert closed.value.code == 4401
+
+
+def test_reconnecting_boards_get_only_missed_events(board):
+    def publish(n):
+        for _ in range(n):
+            event = {"type": "job_status_changed", "job_id": "j1", "status": "in_progress"}
+            board.post("/publish", json={"org_id": "org-a", "event": event})
+
+    publish(3)
+
+    with ExitStack() as stack:
+        ws = stack.enter_context(board.websocket_connect("/ws"))
+        ws.send_json({"type": "auth", "token": _token(), "resume": {"org-a": 1, "org-b": 0}})
+        assert [ws.receive_json()["seq"] for _ in range(2)] == [2, 3]
+        _assert_idle(ws)
+
+        up_to_date = _open(board, stack, token=_token(), resume={"org-a": 3})
+        publish(1)
+        assert up_to_date.receive_json()["seq"] == 4
+
+    board.app.state.manager.history.size = 2
+    board.app.state.manager.history.clear()
+    publish(3)
+    with board.websocket_connect("/ws") as ws:
+        # Seqs 5-7 happened but only 6 and 7 are still held.
+        ws.send_json({"type": "auth", "token": _token(), "resume": {"org-a": 4}})
+        assert ws.receive_text() == RESYNC
+    with board.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "auth", "token": _token(), "resume": {"org-a": 99}})
+        assert ws.receive_text() == RESYNC
+
+
+def _connection(max_queue=3):
+    principal = Principal(id="u1", email=None, full_name=None,
+                          memberships=(Membership(org_id="org-a", role=RoleName.PM),))
+    return Connection(websocket=None, principal=principal, max_queue=max_queue)
+
+
+def _frame(event):
+    return json.dumps(event)
+
+
+def test_full_state_events_replace_queued_ones_for_the_same_job():
+    conn = _connection()
+    events = [
+        {"type": "job_assigned", "job_id": "j1", "crew_id": "c1"},
+        {"type": "job_status_changed", "job_id": "j2", "status": "in_progress"},
+        {"type": "job_updated", "job": {"id": "j1", "crew_id": "c2"}},
+    ]
+    for event in events:
+        conn.offer(event, _frame(event))
+    assert conn.pending() == [_frame(events[1]), _frame(events[2])]
+
+
+def test_overflow_collapses_to_a_single_resync():
+    conn = _connection(max_queue=3)
+    for i in range(5):
+        event = {"type": "job_status_changed", "job_id": f"j{i}", "status": "scheduled"}
+        conn.offer(event, _frame(event))
+    assert conn.pending() == [RESYNC]
+
+
+# Orgs the user doesn't belong to can't be subscribed to; the socket keeps its own.
+@pytest.mark.parametrize("subscription, delivered", [({}, 2), ({"projects": ["p1"]}, 1), ({"orgs": ["org-b"]}, 2)])
+def test_broadcast_frames_are_shared_not_reencoded(subscription, delivered):
+    manager = DispatchConnectionManager(bus=MemoryBus())
+    conns = [_connection(), _connection()]
+    conns[1].subscribe(subscription)
+    for conn in conns:
+        manager._register(conn)
+    asyncio.run(manager.broadcast(None, "org-a", {"type": "job_deleted", "job_id": "j1"}, project_id="p2"))
+    frames = conns[0].pending() + conns[1].pending()
+    assert len(frames) == delivered
+    if delivered == 2:
+        assert frames[0] is frames[1]
@@ -0,0 +1,73 @@
+"""Dispatch stats: org scoping, SQL aggregates and cache invalidation."""
+import asyncio
+from datetime import datetime, timedelta
+
+from app.models.models import Crew, DispatchJob, DispatchJobStatus, Org, Project, User
+from app.services.dispatch_bus import MemoryBus
+from app.services.dispatch_sockets import DispatchConnectionManager
+from app.services.dispatch_stats import StatsCache, compute_stats
+
+NOW = datetime(2026, 3, 4, 12)  # a Wednesday
+
+
+def test_job_events_drop_the_orgs_cached_stats():
+    cache = StatsCache(ttl=60)
+    manager = DispatchConnectionManager(bus=MemoryBus())
+    manager.listeners.append(cache.on_event)
+    cache.put("org-a", {"total_jobs": 1})
+    cache.put("org-b", {"total_jobs": 2})
+
+    asyncio.run(manager.broadcast(None, "org-a", {"type": "job_deleted", "job_id": "j1"}))
+    assert cache.get("org-a") is None
+    assert cache.get("org-b") == {"total_jobs": 2}
+
+    asyncio.run(manager.deliver({"type": "resync"}, '{"type":"resync"}'))
+    assert cache.get("org-b") is None
+
+
+def test_cached_stats_expire():
+    cache = StatsCache(ttl=0)
+    cache.put("org-a", {})
+    assert cache.get("org-a") is None
+
+
+def _seed(db):
+    org, other = Org(name="Stats Org"), Org(name="Other Org")
+    user = User(email="stats@example.com", hashed_password="x", full_name="Stats")
+    db.add_all([org, other, user])
+    db.flush()
+    project = Project(name="Mine", executing_org_id=org.id)
+    foreign = Project(name="Theirs", executing_org_id=other.id)
+    crew = Crew(org_id=org.id, name="Crew A")
+    db.add_all([project, foreign, crew])
+    db.flush()
+    monday = datetime(2026, 3, 2, 8)
+
+    def job(project, **fields):
+        db.add(DispatchJob(project_id=project.id, title="Job", created_by=user.id, **fields))
+
+    # Finished in 2h, on time.
+    job(project, crew_id=crew.id, status=DispatchJobStatus.COMPLETED, scheduled_start=monday,
+        scheduled_end=monday + timedelta(hours=4), actual_start=monday, completed_at=monday + timedelta(hours=2))
+    # Finished in 6h, late.
+    job(project, crew_id=crew.id, status=DispatchJobStatus.COMPLETED, scheduled_start=monday,
+        scheduled_end=monday + timedelta(hours=4), actual_start=monday, completed_at=monday + timedelta(hours=6))
+    job(project, crew_id=crew.id, status=DispatchJobStatus.SCHEDULED, scheduled_start=NOW,
+        scheduled_end=NOW + timedelta(hours=2))
+    job(project)
+    job(foreign, status=DispatchJobStatus.COMPLETED, actual_start=monday, completed_at=monday + timedelta(hours=50))
+    db.commit()
+    return org, crew
+
+
+def test_stats_are_scoped_to_the_org_and_aggregated_in_sql(db):
+    org, crew = _seed(db)
+    stats = compute_stats(db, org.id, now=NOW)
+    assert stats["total_jobs"] == 4
+    assert stats["by_status"] == {"completed": 2, "scheduled": 1, "unassigned": 1}
+    assert (stats["jobs_today"], stats["jobs_this_week"]) == (1, 3)
+    assert stats["avg_completion_time"] == 4.0
+    assert stats["on_time_rate"] == 0.5
+    [utilization] = stats["crew_utilization"]
+    assert (utilization["crew_id"], utilization["job_count"]) == (crew.id, 3)
+    assert utilization["scheduled_hours_week"] == 10.0
@@ -0,0 +1,71 @@
+"""Batch offline field-entry sync."""
+import json
+
+from app.core.auth import access_claims_for, create_access_token
+from app.models.models import FieldEntry, Org, OrgMember, Project, Task, User
+
+
+def _setup(db, n_tasks=2):
+    org = Org(name="Sync Org")
+    db.add(org)
+    db.flush()
+    user = User(email=f"sync-{org.id}@example.com", hashed_password="x", full_name="Sync User")
+    db.add(user)
+    db.flush()
+    db.add(OrgMember(org_id=org.id, user_id=user.id, role="field_lead"))
+    project = Project(name="Sync Project", executing_org_id=org.id)
+    db.add(project)
+    db.flush()
+    tasks = [Task(project_id=project.id, name=f"Span {i}", planned_qty=100, actual_qty=0) for i in range(n_tasks)]
+    db.add_all(tasks)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(access_claims_for(user))}"}
+    return headers, tasks
+
+
+def test_sync_applies_aggregated_deltas_and_is_idempotent(client, db):
+    headers, (span_a, span_b) = _setup(db)
+    entries = [
+        {"task_id": span_a.id, "qty_delta": 60, "offline_client_id": "dev1-1"},
+        {"task_id": span_a.id, "qty_delta": 60, "offline_client_id": "dev1-2"},
+        {"task_id": span_b.id, "qty_delta": 5, "offline_client_id": "dev1-3"},
+        {"task_id": span_b.id, "qty_delta": 5, "offline_client_id": "dev1-3"},
+        {"task_id": "00000000-0000-0000-0000-000000000000", "qty_delta": 1},
+        {"task_id": "not-a-uuid", "qty_delta": 1},
+    ]
+    resp = client.post("/api/field-entries/sync", json={"entries": entries}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert (body["created"], body["duplicates"], body["errors"]) == (3, 1, 2)
+    statuses = [r["status"] for r in body["results"]]
+    assert statuses == ["created", "created", "created", "duplicate", "error", "error"]
+    assert body["results"][3]["entry"]["id"] == body["results"][2]["entry"]["id"]
+    # The second entry pushes span A to 120% of plan; the first, at 60%, doesn't.
+    assert body["results"][0]["entry"]["deviation_flags"] is None
+    assert "qty_threshold_exceeded" in json.loads(body["results"][1]["entry"]["deviation_flags"])
+
+    db.expire_all()
+    assert db.get(Task, span_a.id).actual_qty == 120
+    assert db.get(Task, span_b.id).actual_qty == 5
+
+    retry = client.post("/api/field-entries/sync", json={"entries": entries[:4]}, headers=headers).json()
+    assert [r["status"] for r in retry["results"]] == ["duplicate"] * 4
+    db.expire_all()
+    assert db.get(Task, span_a.id).actual_qty == 120
+    assert db.query(FieldEntry).count() == 3
+
+
+def test_sync_query_count_does_not_grow_with_batch_size(client, db, count_queries):
+    counts = []
+    for n in (5, 50):
+        headers, tasks = _setup(db, n_tasks=5)
+        entries = [
+            {"task_id": tasks[i % 5].id, "qty_delta": 1, "gps_lat": 40.0, "gps_lon": -75.0,
+             "offline_client_id": f"batch{n}-{i}"}
+            for i in range(n)
+        ]
+        with count_queries() as counter:
+            resp = client.post("/api/field-entries/sync", json={"entries": entries}, headers=headers)
+        assert resp.status_code == 200, resp.text
+        counts.append(counter.count)
+    assert counts[0] == counts[1], counts
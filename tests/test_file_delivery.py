@@ -0,0 +1,72 @@
+"""Document download serving: conditional requests, ranges and offload."""
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core import file_delivery
+
+ETAG = '"abc123"'
+
+
+def _client(path):
+    app = FastAPI()
+
+    @app.get("/download")
+    def download(request: Request):
+        return file_delivery.file_response(request, str(path), ETAG, "Plan Set 1.pdf", "application/pdf")
+
+    return TestClient(app)
+
+
+def _pdf(tmp_path):
+    path = tmp_path / "plans.pdf"
+    path.write_bytes(bytes(range(256)) * 40)
+    return path
+
+
+def test_full_download_and_revalidation(tmp_path):
+    client = _client(_pdf(tmp_path))
+    resp = client.get("/download")
+    assert resp.status_code == 200
+    assert resp.headers["etag"] == ETAG
+    assert resp.headers["accept-ranges"] == "bytes"
+    assert resp.headers["content-disposition"] == "attachment; filename*=utf-8''Plan%20Set%201.pdf"
+    assert len(resp.content) == 10240
+
+    assert client.get("/download", headers={"If-None-Match": ETAG}).status_code == 304
+    assert client.get("/download", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_byte_ranges_resume_only_for_the_same_version(tmp_path):
+    path = _pdf(tmp_path)
+    client = _client(path)
+    resp = client.get("/download", headers={"Range": "bytes=1000-1099", "If-Range": ETAG})
+    assert resp.status_code == 206
+    assert resp.headers["content-range"] == "bytes 1000-1099/10240"
+    assert resp.content == path.read_bytes()[1000:1100]
+
+    stale = client.get("/download", headers={"Range": "bytes=1000-1099", "If-Range": '"old-version"'})
+    assert stale.status_code == 200
+    assert len(stale.content) == 10240
+
+
+def test_offload_hands_uploads_to_the_proxy(tmp_path, monkeypatch):
+    uploads = tmp_path / "uploads"
+    (uploads / "blobs" / "ab").mkdir(parents=True)
+    path = uploads / "blobs" / "ab" / "file.pdf"
+    path.write_bytes(b"%PDF")
+    monkeypatch.setattr(file_delivery, "UPLOAD_ROOT", str(uploads))
+
+    monkeypatch.setattr(file_delivery, "DOWNLOAD_OFFLOAD", "x-accel")
+    resp = _client(path).get("/download")
+    assert resp.headers["x-accel-redirect"] == "/_protected/uploads/blobs/ab/file.pdf"
+    assert resp.headers["etag"] == ETAG
+    assert resp.content == b""
+
+    monkeypatch.setattr(file_delivery, "DOWNLOAD_OFFLOAD", "x-sendfile")
+    assert _client(path).get("/download").headers["x-sendfile"] == str(path)
+
+    outside = tmp_path / "elsewhere.pdf"
+    outside.write_bytes(b"%PDF")
+    resp = _client(outside).get("/download")
+    assert "x-sendfile" not in resp.headers
+    assert resp.content == b"%PDF"
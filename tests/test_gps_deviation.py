@@ -0,0 +1,103 @@
+"""GPS deviation distances and thresholds."""
+import math
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from geoalchemy2.shape import from_shape
+from shapely.geometry import LineString, Point
+
+from app.services import gps_deviation
+
+
+def _vincenty_m(lon1, lat1, lon2, lat2):
+    """Inverse Vincenty on WGS84, as the geodesic reference."""
+    a, f = 6378137.0, 1 / 298.257223563
+    b = a * (1 - f)
+    big_l = math.radians(lon2 - lon1)
+    u1 = math.atan((1 - f) * math.tan(math.radians(lat1)))
+    u2 = math.atan((1 - f) * math.tan(math.radians(lat2)))
+    lam = big_l
+    for _ in range(200):
+        sin_sigma = math.hypot(math.cos(u2) * math.sin(lam),
+                               math.cos(u1) * math.sin(u2) - math.sin(u1) * math.cos(u2) * math.cos(lam))
+        cos_sigma = math.sin(u1) * math.sin(u2) + math.cos(u1) * math.cos(u2) * math.cos(lam)
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = math.cos(u1) * math.cos(u2) * math.sin(lam) / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sm = cos_sigma - 2 * math.sin(u1) * math.sin(u2) / cos2_alpha if cos2_alpha else 0.0
+        c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        prev, lam = lam, big_l + (1 - c) * f * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sm + c * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+        if abs(lam - prev) < 1e-12:
+            break
+    u_sq = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (cos_2sm + big_b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sm ** 2) - big_b / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)))
+    return b * big_a * (sigma - delta_sigma)
+
+
+def _task(geometry, gps_deviation_m=None, task_id="t1"):
+    task_type = SimpleNamespace(gps_deviation_m=gps_deviation_m)
+    return SimpleNamespace(id=task_id, updated_at=datetime(2026, 1, 1), task_type=task_type,
+                           geometry=from_shape(geometry, srid=4326) if geometry is not None else None)
+
+
+def test_point_distance_matches_the_geodesic():
+    for lat in (0.0, 40.0, 62.0):
+        pole = Point(-75.0, lat)
+        for dlon, dlat in ((0.002, 0.0), (0.0, 0.002), (0.01, -0.01)):
+            got = gps_deviation.local_distance_m(pole, -75.0 + dlon, lat + dlat)
+            expected = _vincenty_m(-75.0, lat, -75.0 + dlon, lat + dlat)
+            assert math.isclose(got, expected, rel_tol=1e-3), (lat, dlon, dlat, got, expected)
+
+
+def test_line_distance_and_antimeridian():
+    # A fix 0.001° north of an east-west span is ~111 m off it, not ~145 m as in web mercator at 40°N.
+    span = LineString([(-75.01, 40.0), (-74.99, 40.0)])
+    assert math.isclose(gps_deviation.local_distance_m(span, -75.0, 40.001), 111.04, abs_tol=0.5)
+    assert gps_deviation.local_distance_m(span, -75.0, 40.0) < 1e-6
+
+    dateline = Point(179.9995, 0.0)
+    assert math.isclose(gps_deviation.local_distance_m(dateline, -179.9995, 0.0),
+                        _vincenty_m(179.9995, 0.0, -179.9995, 0.0), rel_tol=1e-3)
+
+
+def test_thresholds_allow_for_accuracy_and_task_type_override():
+    task = _task(Point(-75.0, 40.0))
+    distance = gps_deviation.task_distance_m(task, -75.0, 40.0015)  # ~167 m
+    assert gps_deviation.exceeds_threshold(task, distance, None)
+    assert not gps_deviation.exceeds_threshold(task, distance, 80)
+    assert not gps_deviation.exceeds_threshold(task, None, None)
+    # An implausible accuracy radius only stretches the allowance to twice the threshold.
+    assert gps_deviation.exceeds_threshold(task, 2.5 * gps_deviation.threshold_m(task), 1e9)
+
+    wide = _task(Point(-75.0, 40.0), gps_deviation_m=500, task_id="t2")
+    assert gps_deviation.threshold_m(wide) == 500
+    assert not gps_deviation.exceeds_threshold(wide, distance, None)
+
+    no_type = SimpleNamespace(task_type=None)
+    assert gps_deviation.threshold_m(no_type) == gps_deviation.GPS_DEVIATION_METERS
+    assert gps_deviation.task_distance_m(_task(None), -75.0, 40.0) is None
+
+
+def test_task_shapes_are_cached_until_the_geometry_changes():
+    task = _task(Point(-75.0, 40.0), task_id="cached")
+    first = gps_deviation._task_shape(task)
+    task.updated_at = datetime(2026, 2, 1)  # progress logged against the task
+    assert gps_deviation._task_shape(task) is first
+    task.geometry = from_shape(Point(-75.1, 40.0), srid=4326)
+    assert gps_deviation._task_shape(task) is not first
+
+
+def test_task_type_thresholds_must_be_positive():
+    from pydantic import ValidationError
+    from app.schemas.schemas import TaskTypeCreate, TaskTypeUpdate
+
+    for schema in (TaskTypeCreate, TaskTypeUpdate):
+        for bad in (0, -5):
+            with pytest.raises(ValidationError):
+                schema(name="Splice", gps_deviation_m=bad)
+        assert schema(name="Splice", gps_deviation_m=None).gps_deviation_m is None
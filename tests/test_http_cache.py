@@ -0,0 +1,46 @@
+"""ETag/304 handling for cached reference routes."""
+from app.core.auth import access_claims_for, create_access_token
+from app.models.models import Org, User, OrgMember, TaskType
+
+
+def _auth_headers(db):
+    org = Org(name="Cache Org")
+    db.add(org)
+    db.flush()
+    user = User(email=f"cache-{org.id}@example.com", hashed_password="x", full_name="Cache User")
+    db.add(user)
+    db.flush()
+    db.add(OrgMember(org_id=org.id, user_id=user.id, role="org_admin"))
+    db.commit()
+    return {"Authorization": f"Bearer {create_access_token(access_claims_for(user))}"}
+
+
+def test_table_version_etag_revalidates_until_write(client, db):
+    headers = _auth_headers(db)
+    first = client.get("/api/task-types", headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    again = client.get("/api/task-types", headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    db.add(TaskType(name="Splicing", unit="each"))
+    db.commit()
+    changed = client.get("/api/task-types", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [t["name"] for t in changed.json()] == ["Splicing"]
+
+
+def test_cached_route_still_requires_auth(client, db):
+    etag = client.get("/api/admin/roles", headers=_auth_headers(db)).headers["etag"]
+    resp = client.get("/api/admin/roles", headers={"If-None-Match": etag})
+    assert resp.status_code == 401
+
+
+def test_uncached_routes_stay_no_store(client, db):
+    resp = client.get("/api/orgs", headers=_auth_headers(db))
+    assert resp.headers["cache-control"] == "no-cache, no-store, must-revalidate"
+    assert "etag" not in resp.headers
@@ -0,0 +1,167 @@
+"""Live position stream: thinning, the in-memory index and batched socket updates."""
+import asyncio
+import threading
+
+import anyio
+import pytest
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from app.core.auth import create_access_token
+from app.services.dispatch_bus import MemoryBus
+from app.services.live_positions import (PositionHub, PositionIndex, PositionSocket, _chunks, checked_out,
+                                         should_publish)
+
+# About 11 m per 0.0001 degree of latitude.
+HOME = (30.2672, -97.7431)
+
+
+def _tech(user_id="u1", lat=HOME[0], lng=HOME[1]):
+    return {"kind": "tech", "id": user_id, "name": user_id, "lat": lat, "lng": lng, "active": True}
+
+
+def _token(user_id="viewer", orgs=("org-a",)):
+    return create_access_token({"sub": user_id, "orgs": [{"id": o, "role": "pm"} for o in orgs]})
+
+
+def test_updates_are_thinned_by_distance_interval_and_heartbeat():
+    last = (_tech(), 100.0)
+    moved = _tech(lat=HOME[0] + 0.0005)  # ~55 m
+    nudged = _tech(lat=HOME[0] + 0.0001)  # ~11 m
+    assert should_publish(None, nudged, 100.0)
+    assert not should_publish(last, moved, 102.0)  # too soon, however far
+    assert should_publish(last, moved, 106.0)
+    assert not should_publish(last, nudged, 106.0)
+    assert should_publish(last, nudged, 161.0)  # heartbeat
+    assert should_publish(last, checked_out("u1"), 100.5)
+
+
+def test_stored_positions_never_replace_published_ones():
+    index = PositionIndex()
+    live = _tech(lat=1.0)
+    index.apply("org-a", live, 1.0)
+    index.load("org-a", [_tech(lat=0.0), _tech("u2")], 2.0)
+    assert {p["id"]: p["lat"] for p in index.snapshot("org-a")} == {"u1": 1.0, "u2": HOME[0]}
+    index.apply("org-a", checked_out("u2"), 3.0)
+    assert index.snapshot("org-a") == [live]
+    assert index.loaded == {"org-a"}
+
+
+def test_large_publishes_are_split_to_fit_a_notify():
+    positions = [{**_tech(f"user-{i}"), "name": "x" * 200} for i in range(100)]
+    chunks = list(_chunks(positions))
+    assert len(chunks) > 1
+    assert [p for chunk in chunks for p in chunk] == positions
+
+
+def test_the_hub_publishes_only_what_passes_thinning():
+    hub = PositionHub(bus=MemoryBus(sequenced=False), loader=lambda org_id: [])
+
+    async def run():
+        first = await hub.publish(None, "org-a", [_tech()])
+        again = await hub.publish(None, "org-a", [_tech(lat=HOME[0] + 0.001)])
+        gone = await hub.publish(None, "org-a", [checked_out("u1")])
+        await hub.stop()
+        return first, again, gone
+
+    first, again, gone = asyncio.run(run())
+    assert (len(first), len(again), len(gone)) == (1, 0, 1)
+    assert hub.index.snapshot("org-a") == []
+
+
+def test_sync_endpoints_notify_from_their_own_thread():
+    class RecordingBus(MemoryBus):
+        def publish_blocking(self, db, events):
+            threads.append(threading.get_ident())
+            return super().publish_blocking(db, events)
+
+    threads = []
+    hub = PositionHub(bus=RecordingBus(sequenced=False), loader=lambda org_id: [])
+
+    async def run():
+        loop_thread = threading.get_ident()
+        due = await anyio.to_thread.run_sync(hub.publish_from_thread, None, "org-a", [_tech()])
+        await hub.stop()
+        return loop_thread, due
+
+    loop_thread, due = asyncio.run(run())
+    assert len(due) == 1 and hub.index.snapshot("org-a") == due
+    assert threads and loop_thread not in threads
+
+
+def test_a_slow_socket_gets_one_snapshot_instead_of_a_backlog():
+    sent = []
+
+    class FakeSocket:
+        async def send_text(self, frame):
+            sent.append(frame)
+
+    async def run():
+        sock = PositionSocket(FakeSocket(), None, {"org-a"}, lambda orgs: "snapshot", max_batches=2)
+        for i in range(5):
+            sock.offer(f"batch-{i}")
+        sender = asyncio.create_task(sock.run_sender())
+        await asyncio.sleep(0)
+        sender.cancel()
+
+    asyncio.run(run())
+    assert sent == ["snapshot"]
+
+
+@pytest.fixture
+def stream():
+    loads = []
+
+    def loader(org_id):
+        loads.append(org_id)
+        return [_tech("stored")]
+
+    hub = PositionHub(bus=MemoryBus(sequenced=False), push_interval=0.01, loader=loader)
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await hub.serve(websocket)
+
+    @app.post("/publish")
+    def publish(body: dict):  # like the fleet endpoints, from the threadpool
+        return hub.publish_from_thread(None, body["org_id"], body["positions"])
+
+    with TestClient(app) as client:
+        yield client, loads
+
+
+def test_sockets_get_a_snapshot_then_batched_updates(stream):
+    client, loads = stream
+    with client.websocket_connect("/ws") as ws, client.websocket_connect("/ws") as other:
+        ws.send_json({"type": "auth", "token": _token()})
+        snapshot = ws.receive_json()
+        assert snapshot["snapshot"] and [p["id"] for p in snapshot["positions"]] == ["stored"]
+        other.send_json({"type": "auth", "token": _token("other", orgs=("org-b",))})
+        assert other.receive_json()["positions"] == [_tech("stored")]
+
+        client.post("/publish", json={"org_id": "org-a", "positions": [_tech("u1"), _tech("u2")]})
+        client.post("/publish", json={"org_id": "org-a", "positions": [checked_out("u2")]})
+        client.post("/publish", json={"org_id": "org-b", "positions": [_tech("u3")]})
+        updates = {}
+        while updates.get("u2") is not False:  # the check-out may land in a later batch
+            frame = ws.receive_json()
+            assert "snapshot" not in frame
+            updates.update({p["id"]: p["active"] for p in frame["positions"]})
+        assert updates == {"u1": True, "u2": False}
+        assert [p["id"] for p in other.receive_json()["positions"]] == ["u3"]
+
+    # A second socket for the org is served from memory.
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "auth", "token": _token()})
+        assert {p["id"] for p in ws.receive_json()["positions"]} == {"stored", "u1"}
+    assert sorted(loads) == ["org-a", "org-b"]
+
+
+def test_unauthenticated_position_sockets_are_closed(stream):
+    client, _ = stream
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "auth", "token": "nonsense"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    assert closed.value.code == 4401
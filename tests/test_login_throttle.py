@@ -0,0 +1,76 @@
+"""Sign-in throttling and password hashing."""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.core import auth
+from app.core.rate_limit import LoginThrottle, SlidingWindowCounter, client_ip
+
+
+def _request(peer="10.0.0.1", forwarded=()):
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+
+def test_the_client_ip_ignores_forwarded_entries_the_client_wrote():
+    spoofed = _request(forwarded=["1.2.3.4, 203.0.113.7"])
+    assert client_ip(spoofed, hops=0) == "10.0.0.1"
+    assert client_ip(spoofed, hops=1) == "203.0.113.7"
+    assert client_ip(_request(forwarded=["1.2.3.4", "203.0.113.7, 10.1.1.1"]), hops=2) == "203.0.113.7"
+    # Fewer entries than proxies: the request didn't come through them.
+    assert client_ip(_request(), hops=1) == "10.0.0.1"
+
+
+def test_counters_forget_the_least_recently_hit_key():
+    counter = SlidingWindowCounter(limit=2, window_seconds=60, max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        counter.hit(key)
+    assert list(counter._events) == ["a", "c"]
+    assert counter.retry_after("b") == 0
+    counter.hit("a")
+    counter.hit("a")
+    assert len(counter._events["a"]) == 2 and counter.retry_after("a") > 0
+
+
+def test_repeated_failures_are_throttled_with_429():
+    throttle = LoginThrottle()
+    for _ in range(throttle.by_account.limit):
+        throttle.check("Tech@Example.com", "10.0.0.1")
+        throttle.record_failure("Tech@Example.com")
+    with pytest.raises(HTTPException) as throttled:
+        throttle.check("tech@example.com ", "10.0.0.2")
+    assert throttled.value.status_code == 429 and int(throttled.value.headers["Retry-After"]) > 0
+    throttle.record_success("tech@example.com")
+    throttle.check("tech@example.com", "10.0.0.2")
+
+
+def test_sign_ins_are_shed_with_503_when_the_hashing_pool_is_full(monkeypatch):
+    monkeypatch.setattr(auth, "_hash_slots", asyncio.Semaphore(0))
+    with pytest.raises(HTTPException) as shed:
+        asyncio.run(auth.verify_password_async("secret", None))
+    assert shed.value.status_code == 503 and shed.value.headers["Retry-After"] == "1"
+
+
+def test_outdated_hashes_still_verify_and_need_a_rehash():
+    legacy = "salt$" + auth._pbkdf2("secret", "salt", auth.LEGACY_PBKDF2_ITERATIONS)
+    cheaper = f"{auth.PBKDF2_SCHEME}$1000$salt${auth._pbkdf2('secret', 'salt', 1000)}"
+    for hashed in (legacy, cheaper):
+        assert auth.verify_password("secret", hashed) and not auth.verify_password("wrong", hashed)
+        assert auth.password_needs_rehash(hashed)
+    assert not auth.password_needs_rehash(auth.hash_password("secret"))
+
+
+def test_signing_in_rewrites_an_outdated_hash(client, db):
+    from app.models.models import User
+
+    user = User(email="legacy@example.com", full_name="Legacy",
+                hashed_password="salt$" + auth._pbkdf2("secret", "salt", auth.LEGACY_PBKDF2_ITERATIONS))
+    db.add(user)
+    db.commit()
+    response = client.post("/api/auth/login", json={"email": "legacy@example.com", "password": "secret"})
+    assert response.status_code == 200
+    db.refresh(user)
+    assert not auth.password_needs_rehash(user.hashed_password)
+    assert auth.verify_password("secret", user.hashed_password)
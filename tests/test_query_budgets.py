@@ -0,0 +1,159 @@
+"""Query-count budgets for list endpoints.
+
+Every route is requested twice, once against an org seeded with N rows and
+once against an org seeded with 10N rows. The number of SQL statements must
+not grow with the row count and must stay within the budget recorded in
+``query_budgets.json``. A lazy relationship touched from a serializer shows
+up here as a failure instead of as a slow page in production.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from app.core.auth import access_claims_for, create_access_token
+from app.models.models import (
+    Org, User, OrgMember, Project, Crew, CrewMember, DispatchJob, DispatchJobStatus,
+    AssetCategory, Asset, AssetAllocation, AssetIncident, AssetMaintenance,
+    OnboardingWorkflowTemplate, OnboardingWorkflowStep,
+    OnboardingWorkflowInstance, OnboardingWorkflowStepInstance,
+)
+
+BUDGETS = json.loads((Path(__file__).parent / "query_budgets.json").read_text())
+N = int(os.environ.get("QUERY_BUDGET_N", "5"))
+WINDOW_START = datetime(2025, 3, 3)
+
+
+def _org_with_user(db):
+    org = Org(name="Budget Org")
+    db.add(org)
+    db.flush()
+    user = User(email=f"budget-{org.id}@example.com", hashed_password="x", full_name="Budget User")
+    db.add(user)
+    db.flush()
+    db.add(OrgMember(org_id=org.id, user_id=user.id, role="org_admin"))
+    return org, user
+
+
+def _users(db, n, org):
+    users = [User(email=f"u{i}-{org.id}@example.com", hashed_password="x", full_name=f"User {i}") for i in range(n)]
+    db.add_all(users)
+    db.flush()
+    return users
+
+
+def _crews(db, n, org, users):
+    crews = [Crew(org_id=org.id, name=f"Crew {i}") for i in range(n)]
+    db.add_all(crews)
+    db.flush()
+    db.add_all([CrewMember(crew_id=c.id, user_id=u.id) for c, u in zip(crews, users)])
+    return crews
+
+
+def _project(db, org):
+    project = Project(name="Budget Project", executing_org_id=org.id)
+    db.add(project)
+    db.flush()
+    return project
+
+
+def seed_assets(db, n):
+    org, user = _org_with_user(db)
+    users = _users(db, n, org)
+    crews = _crews(db, n, org, users)
+    project = _project(db, org)
+    category = AssetCategory(org_id=org.id, name="Tools")
+    db.add(category)
+    db.flush()
+    for i in range(n):
+        asset = Asset(org_id=org.id, category_id=category.id, name=f"Asset {i}",
+                      assigned_to_user_id=users[i].id, assigned_to_crew_id=crews[i].id,
+                      assigned_to_project_id=project.id)
+        db.add(asset)
+        db.flush()
+        db.add(AssetAllocation(asset_id=asset.id, assigned_to_user_id=users[i].id))
+        db.add(AssetIncident(asset_id=asset.id, incident_type="damage", title="Cracked housing"))
+        db.add(AssetMaintenance(asset_id=asset.id, maintenance_type="inspection", title="Annual check"))
+    return user, {}
+
+
+def seed_crews(db, n):
+    org, user = _org_with_user(db)
+    _crews(db, n, org, _users(db, n, org))
+    return user, {}
+
+
+def seed_jobs(db, n):
+    org, user = _org_with_user(db)
+    crews = _crews(db, n, org, _users(db, n, org))
+    project = _project(db, org)
+    for i, crew in enumerate(crews):
+        start = WINDOW_START + timedelta(hours=8 + i % 8)
+        db.add(DispatchJob(project_id=project.id, crew_id=crew.id, title=f"Job {i}", created_by=user.id,
+                           status=DispatchJobStatus.SCHEDULED,
+                           scheduled_start=start, scheduled_end=start + timedelta(hours=2)))
+        db.add(DispatchJob(project_id=project.id, title=f"Unassigned {i}", created_by=user.id))
+    return user, {"date_from": WINDOW_START.isoformat(), "date_to": (WINDOW_START + timedelta(days=7)).isoformat()}
+
+
+def seed_jobs_columnar(db, n):
+    user, params = seed_jobs(db, n)
+    return user, {**params, "format": "columnar"}
+
+
+def seed_onboarding(db, n):
+    org, user = _org_with_user(db)
+    users = _users(db, n, org)
+    template = OnboardingWorkflowTemplate(org_id=org.id, name="Technician", created_by=user.id)
+    db.add(template)
+    db.flush()
+    steps = [OnboardingWorkflowStep(template_id=template.id, step_number=i, title=f"Step {i}") for i in range(3)]
+    db.add_all(steps)
+    db.flush()
+    for employee in users:
+        inst = OnboardingWorkflowInstance(org_id=org.id, template_id=template.id,
+                                          user_id=employee.id, assigned_to=user.id)
+        db.add(inst)
+        db.flush()
+        db.add_all([OnboardingWorkflowStepInstance(instance_id=inst.id, step_id=s.id,
+                                                   status="completed" if s.step_number == 0 else "pending")
+                    for s in steps])
+    return user, {}
+
+
+SEEDERS = {
+    "GET /api/assets": seed_assets,
+    "GET /api/dispatch/crews": seed_crews,
+    "GET /api/dispatch/jobs": seed_jobs,
+    "GET /api/dispatch/timeline": seed_jobs,
+    "GET /api/dispatch/timeline?format=columnar": seed_jobs_columnar,
+    "GET /api/onboarding/instances": seed_onboarding,
+}
+
+
+def test_every_budget_has_a_seeder():
+    assert set(BUDGETS) == set(SEEDERS)
+
+
+@pytest.mark.parametrize("route", sorted(BUDGETS))
+def test_query_count_is_constant(route, client, db, count_queries):
+    method, path = route.split(" ", 1)
+    path = path.split("?", 1)[0]  # seeders supply the query string
+    counts = []
+    for n in (N, 10 * N):
+        user, params = SEEDERS[route](db, n)
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(access_claims_for(user))}"}
+        with count_queries() as counter:
+            resp = client.request(method, path, headers=headers, params=params)
+        assert resp.status_code == 200, resp.text
+        counts.append(counter.count)
+
+    assert counts[0] == counts[1], (
+        f"{route} issued {counts[0]} queries for {N} rows but {counts[1]} for {10 * N} rows"
+    )
+    assert counts[1] <= BUDGETS[route], (
+        f"{route} issued {counts[1]} queries, budget is {BUDGETS[route]}"
+    )
@@ -0,0 +1,22 @@
+"""Fast JSON response encoding."""
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from app.core.responses import FastJSONResponse, json_bytes, raw_json
+
+
+def test_raw_geojson_is_embedded_verbatim():
+    geometry = '{"type":"LineString","coordinates":[[-97.74,30.26],[-97.73,30.27]]}'
+    body = json_bytes({"type": "Feature", "geometry": raw_json(geometry)})
+    assert json.loads(body)["geometry"] == json.loads(geometry)
+
+
+def test_encodes_types_the_app_returns():
+    body = FastJSONResponse({"at": datetime(2025, 3, 3, 8, 30), "amount": Decimal("12.50"), 7: "x"}).body
+    assert json.loads(body) == {"at": "2025-03-03T08:30:00", "amount": 12.5, "7": "x"}
+
+
+def test_pre_encoded_bytes_pass_through():
+    payload = json_bytes({"platforms": []})
+    assert FastJSONResponse(payload).body == payload
@@ -0,0 +1,98 @@
+"""Visiting order for a crew's day."""
+import itertools
+import random
+from datetime import datetime
+
+from app.services.route_optimizer import RouteStop, _cost, _matrix, evaluate, optimize
+
+BEGIN = datetime(2026, 3, 2, 8)
+DEPOT = (40.0, -105.0)
+
+
+def _stop(stop_id, lat, lng, minutes=30, **window):
+    return RouteStop(stop_id, (lat, lng), minutes, **window)
+
+
+def test_a_zigzag_day_is_straightened_out():
+    # Four jobs along a line north of the depot, scheduled out of order.
+    stops = [_stop("c", 40.3, -105.0), _stop("a", 40.1, -105.0), _stop("d", 40.4, -105.0), _stop("b", 40.2, -105.0)]
+    route = optimize(DEPOT, stops, BEGIN)
+    assert [v.stop.id for v in route.visits] == ["a", "b", "c", "d"]
+    assert route.travel_minutes < evaluate(DEPOT, stops, BEGIN).travel_minutes
+    for prev, nxt in zip(route.visits, route.visits[1:]):
+        assert nxt.arrival >= prev.end and nxt.start >= nxt.arrival
+
+
+def test_time_windows_beat_drive_time():
+    stops = [_stop("near", 40.05, -105.0), _stop("far", 40.3, -105.0, latest=datetime(2026, 3, 2, 9, 30)),
+             _stop("late", 39.95, -105.0, earliest=datetime(2026, 3, 2, 12))]
+    route = optimize(DEPOT, stops, BEGIN)
+    assert [v.stop.id for v in route.visits] == ["far", "near", "late"]
+    assert route.late_minutes == 0
+    assert route.visits[-1].start == datetime(2026, 3, 2, 12)
+
+
+def test_large_days_are_close_to_optimal_and_never_worse_than_today():
+    rng = random.Random(7)
+    stops = [_stop(f"s{i}", 40 + rng.random() / 2, -105 + rng.random() / 2, minutes=20) for i in range(14)]
+    route = optimize(DEPOT, stops, BEGIN, budget_seconds=2)
+    assert sorted(v.stop.id for v in route.visits) == sorted(s.id for s in stops)
+    assert route.travel_minutes <= evaluate(DEPOT, stops, BEGIN).travel_minutes
+
+    # Against brute force on a subset small enough to enumerate but past the exact limit.
+    subset = stops[:8]
+    matrix = _matrix(DEPOT, subset)
+    best = min(_cost(list(o), subset, matrix, BEGIN)[1] for o in itertools.permutations(range(8)))
+    assert optimize(DEPOT, subset, BEGIN).travel_minutes <= round(best, 1) * 1.05 + 0.5
+
+
+def test_an_unknown_start_means_the_first_leg_is_free():
+    stops = [_stop("a", 40.1, -105.0), _stop("b", 40.2, -105.0)]
+    route = optimize(None, stops, BEGIN)
+    assert route.visits[0].travel_minutes == 0
+    assert route.visits[0].start == BEGIN
+
+
+def test_applying_a_route_rechecks_the_crews_day(db):
+    import pytest
+    from fastapi import HTTPException
+
+    from app.api.dispatch import _apply_route
+    from app.models.models import Crew, DispatchJob, DispatchJobStatus, Org, Project, User
+    from app.services.route_optimizer import Visit
+
+    org = Org(name="Route Org")
+    user = User(email="router@example.com", hashed_password="x", full_name="Router")
+    db.add_all([org, user])
+    db.flush()
+    project = Project(name="P", executing_org_id=org.id)
+    crew = Crew(org_id=org.id, name="Crew")
+    db.add_all([project, crew])
+    db.flush()
+
+    def at(hour):
+        return BEGIN.replace(hour=hour)
+
+    routed, booked = (DispatchJob(project_id=project.id, title=t, created_by=user.id, crew_id=crew.id,
+                                  status=DispatchJobStatus.SCHEDULED, scheduled_start=at(h), scheduled_end=at(h + 1))
+                      for t, h in (("routed", 8), ("booked", 11)))
+    db.add_all([routed, booked])
+    db.commit()
+    planned_from = {routed.id: at(8)}
+
+    def visit(hour):
+        return [Visit(_stop(routed.id, *DEPOT, minutes=60), 0, at(hour), at(hour), at(hour + 1))]
+
+    with pytest.raises(HTTPException) as clash:
+        _apply_route(db, org.id, crew.id, BEGIN.date(), visit(11), planned_from, False)
+    assert clash.value.status_code == 409 and clash.value.detail["conflicts"]
+
+    assert [j["id"] for j in _apply_route(db, org.id, crew.id, BEGIN.date(), visit(9), planned_from, False)] \
+        == [routed.id]
+    db.expire_all()
+    assert db.get(DispatchJob, routed.id).scheduled_start == at(9)
+
+    # The job moved since the route was optimized.
+    with pytest.raises(HTTPException) as stale:
+        _apply_route(db, org.id, crew.id, BEGIN.date(), visit(10), planned_from, False)
+    assert stale.value.detail["job_ids"] == [routed.id]
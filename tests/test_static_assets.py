@@ -0,0 +1,43 @@
+"""Fingerprinted asset build and precompressed serving."""
+import gzip
+
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from app.core import static_assets
+
+
+def _build(tmp_path):
+    src, dist = tmp_path / "static", tmp_path / "dist"
+    (src / "js").mkdir(parents=True)
+    (src / "js" / "app.js").write_text("console.log('hello');\n" * 200)
+    manifest = static_assets.build_assets(src, dist)
+    return dist, manifest
+
+
+def test_build_is_content_addressed_and_precompressed(tmp_path):
+    dist, manifest = _build(tmp_path)
+    name = manifest["files"]["js/app.js"]
+    assert name.startswith("js/app.") and name.endswith(".js") and name != "js/app.js"
+    assert gzip.decompress((dist / f"{name}.gz").read_bytes()) == (dist / name).read_bytes()
+
+    (tmp_path / "static" / "js" / "app.js").write_text("console.log('changed');\n")
+    assert static_assets.build_assets(tmp_path / "static", dist)["files"]["js/app.js"] != name
+
+
+def test_serves_negotiated_encoding_with_immutable_caching(tmp_path):
+    dist, manifest = _build(tmp_path)
+    app = Starlette(routes=[Mount("/dist", static_assets.PrecompressedStaticFiles(directory=dist))])
+    client = TestClient(app)
+    url = f"/dist/{manifest['files']['js/app.js']}"
+
+    resp = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["content-type"].startswith("text/javascript")
+    assert resp.headers["cache-control"] == static_assets.IMMUTABLE
+    assert resp.headers["vary"] == "Accept-Encoding"
+
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.text == resp.text
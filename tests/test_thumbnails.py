@@ -0,0 +1,62 @@
+"""Attachment thumbnail generation."""
+import hashlib
+import io
+
+from PIL import Image
+
+from app.core.config import THUMBNAIL_SIZES
+from app.models.models import Attachment, Blob, Org, User
+from app.services import blob_store, thumbnails
+
+
+def _photo(width=1600, height=1200, orientation=None) -> bytes:
+    image = Image.new("RGB", (width, height), (200, 40, 40))
+    exif = Image.Exif()
+    exif[0x0110] = "Field Phone"  # Model
+    if orientation:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    image.save(out, "JPEG", exif=exif)
+    return out.getvalue()
+
+
+def test_thumbnails_are_rotated_and_stripped():
+    rendered = thumbnails.render_thumbnails(_photo(orientation=6), "image/jpeg")
+    assert sorted(rendered) == sorted(THUMBNAIL_SIZES)
+    for size, data in rendered.items():
+        thumb = Image.open(io.BytesIO(data))
+        assert thumb.format == "WEBP"
+        assert thumb.height == size and thumb.width < size  # 90° rotation turned landscape into portrait
+        assert not thumb.getexif()
+
+
+def test_small_images_are_not_upscaled_and_bad_files_are_skipped():
+    rendered = thumbnails.render_thumbnails(_photo(100, 50), "image/png")
+    assert all(Image.open(io.BytesIO(d)).size == (100, 50) for d in rendered.values())
+    assert thumbnails.render_thumbnails(b"not an image", "image/jpeg") == {}
+
+
+def test_process_records_sizes_once_per_blob(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "backend", blob_store.LocalBackend(root=str(tmp_path)))
+    data = _photo()
+    sha = hashlib.sha256(data).hexdigest()
+    key = blob_store.blob_key(sha, "image/jpeg")
+    blob_store.backend.put_bytes(key, data)
+
+    org = Org(name="Thumb Org")
+    user = User(email="thumbs@example.com", hashed_password="x", full_name="Thumbs")
+    db.add_all([org, user, Blob(sha256=sha, key=key, size=len(data), content_type="image/jpeg", ref_count=2)])
+    db.flush()
+    attachments = [
+        Attachment(filename=f"{i}.jpg", file_path=blob_store.blob_ref(key), file_type="image/jpeg",
+                   content_hash=sha, uploaded_by=user.id)
+        for i in range(2)
+    ]
+    db.add_all(attachments)
+    db.commit()
+
+    assert thumbnails.process(db, attachments) == 2
+    urls = thumbnails.thumbnail_urls(attachments[0])
+    assert sorted(urls, key=int) == [str(s) for s in THUMBNAIL_SIZES]
+    for size in THUMBNAIL_SIZES:
+        assert blob_store.backend.exists(blob_store.thumbnail_key(sha, size))
@@ -0,0 +1,39 @@
+"""Chunked upload writes."""
+import hashlib
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.services import upload_service
+
+
+def _client(tmp_path, max_size):
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(files: list[UploadFile] = File(...)):
+        stored = await upload_service.save_uploads(
+            [(f, str(tmp_path / f.filename)) for f in files], max_size, "too large",
+        )
+        return [{"size": s.size, "sha256": s.sha256} for s in stored]
+
+    return TestClient(app)
+
+
+def test_writes_and_hashes_each_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_service, "CHUNK_SIZE", 1000)
+    payloads = {f"photo{i}.jpg": bytes([i]) * (5000 + i) for i in range(4)}
+    resp = _client(tmp_path, 10_000).post("/upload", files=[("files", (n, d, "image/jpeg")) for n, d in payloads.items()])
+    assert resp.status_code == 200
+    assert [r["sha256"] for r in resp.json()] == [hashlib.sha256(d).hexdigest() for d in payloads.values()]
+    for name, data in payloads.items():
+        assert (tmp_path / name).read_bytes() == data
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_oversized_file_rejects_the_batch_and_cleans_up(tmp_path):
+    files = [("files", ("ok.jpg", b"x" * 100, "image/jpeg")), ("files", ("big.jpg", b"x" * 2000, "image/jpeg"))]
+    resp = _client(tmp_path, 1000).post("/upload", files=files)
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "too large"
+    assert list(tmp_path.iterdir()) == []